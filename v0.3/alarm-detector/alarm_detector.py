@@ -0,0 +1,934 @@
+#!/usr/bin/env python2
+
+#   Copyright 2015 Adamo Ferro
+#
+#   This file is part of SLightliMon.
+#
+#   SLightliMon is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   SLightliMon is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import time
+import copy
+import importlib
+import multiprocessing
+import processing
+import data_io
+
+
+SAMPLING_INT=1				# minutes, fixed. TODO: make it a parameter and handle everywhere in the rest of the code
+
+
+#~ TODO: put in a JSON configuration file
+ERROR_CODES=dict()
+ERROR_CODES["arg_parse"]="Problem during argument parsing"
+ERROR_CODES["import_io_txt"]="Cannot import text reader"
+ERROR_CODES["import_io_rrd"]="Cannot import RRD reader"
+ERROR_CODES["import_io_csv"]="Cannot import CSV reader"
+ERROR_CODES["import_io_sqlite"]="Cannot import SQLite reader"
+ERROR_CODES["sqlite_database"]="SQLite input requires the database file to be given as cabinet file"
+ERROR_CODES["import_io_memory"]="Cannot import in-memory reader"
+ERROR_CODES["config_missing"]="Missing parameter: "
+ERROR_CODES["in_file_format"]="More than one input format set"
+ERROR_CODES["cabinet_file_format"]="Cabinet file not supported for CSV input"
+ERROR_CODES["period_general"]="Inconsistent period: end timestamp precedes start timestamp"
+ERROR_CODES["delta_t"]="Base analysis time interval not valid"
+ERROR_CODES["delta_t_large"]="Base analysis time interval longer than analyzed period"
+ERROR_CODES["avg_t"]="Average interval not valid"
+ERROR_CODES["p_off"]="Maximum power consumption during off state not valid for phase "
+ERROR_CODES["v_thrs"]="Minimum and/or maximum allowed voltage values not valid"
+ERROR_CODES["v_dt"]="Maximum total time of non-acceptable voltage not valid"
+ERROR_CODES["cosphi_min"]="Minimum acceptable cosphi not valid"
+ERROR_CODES["cosphi_dt"]="Maximum total time of non-acceptable cosphi not valid"
+ERROR_CODES["data_min_avail"]="Minimum data availability in % for running the whole algorithm not valid"
+ERROR_CODES["ref_days"]="Number of reference days not valid"
+ERROR_CODES["anomaly_abs_p_shift"]="Minimum absolute power shift for detecting an anomaly not valid"
+ERROR_CODES["anomaly_rel_p_shift"]="Minimum relative power shift for detecting an anomaly in % not valid"
+ERROR_CODES["anomaly_min_dt"]="Minimum duration of an anomaly state not valid"
+ERROR_CODES["anomaly_guard_dt"]="Minimum time distance allowed from an on/off event to an anomaly not valid"
+ERROR_CODES["energy_rel_shift"]="Minimum relative power consumption offset is not valid"
+ERROR_CODES["ref_min_avail"]="Minimum data reliability for running the whole algorithm in % not valid"
+ERROR_CODES["data_length"]="Input data have different lengths"
+ERROR_CODES["result_cache_size"]="Maximum size of the result cache not valid"
+
+#~ reader module of each input format, and code of the error given if it cannot be imported
+READERS=dict()
+READERS["rrd"]=("data_io.data_reader_rrd","import_io_rrd")
+READERS["txt"]=("data_io.data_reader_txt","import_io_txt")
+READERS["csv"]=("data_io.data_reader_csv","import_io_csv")
+READERS["sqlite"]=("data_io.data_reader_sqlite","import_io_sqlite")
+READERS["memory"]=("data_io.data_reader_memory","import_io_memory")
+
+WARNING_CODES=dict()
+WARNING_CODES["avg_t"]="Average interval incremented by 1 minute to get an odd number"
+WARNING_CODES["ref_state"]="Cannot save reference state"
+WARNING_CODES["night_store"]="Cannot save night in night store"
+WARNING_CODES["night_incomplete"]="Night not saved in night store: input data do not reach its end yet"
+WARNING_CODES["result_cache"]="Cannot save results in result cache"
+
+#~ parameters the products kept in the night store depend on (see data_io.night_store), besides input format and period length
+NIGHT_STORE_PARAMETERS=("rrd_function","float32")
+
+#~ parameters the results do not depend on, left out of the keys of the result cache (see data_io.result_cache)
+RESULT_CACHE_IGNORED=("no_cache","ref_state","night_store","result_cache","result_cache_size","metrics","debug")
+
+
+class config():
+	
+	#~ Parameters of the analysis, named as the long command line arguments of the alarm detector and expressed in the same units.
+	#~ Each field has its type and its default value (None for the required ones)
+	FIELDS=(
+		#~ period to be analyzed
+		("t_start",int,None),
+		("t_end",int,None),
+		
+		#~ input files and format
+		("power_data_ph1",str,None),
+		("power_data_ph2",str,""),
+		("power_data_ph3",str,""),
+		("voltage_data_ph1",str,None),
+		("voltage_data_ph2",str,""),
+		("voltage_data_ph3",str,""),
+		("energy_data",str,""),
+		("cosphi_data",str,""),
+		("cabinet_file",str,""),
+		("cabinet_id",str,""),
+		("no_one_read_meas",bool,False),
+		("rrd_function",str,"AVERAGE"),
+		("text",bool,False),
+		("csv",bool,False),
+		("sqlite",bool,False),
+		("no_cache",bool,False),
+		("float32",bool,False),
+		
+		#~ base algorithm parameters
+		("delta_t",int,5),
+		("avg_t",int,5),
+		("poff_ph1",int,100),
+		("poff_ph2",int,100),
+		("poff_ph3",int,100),
+		("v_min",float,210.),
+		("v_max",float,250.),
+		("v_dt",int,3),
+		("cosphi_min",float,0.9),
+		("cosphi_dt",int,3),
+		("data_min_avail",float,70.),
+		
+		#~ comparison with reference parameters
+		("ref_days",int,0),
+		("anomaly_abs_p_shift",int,200),
+		("anomaly_rel_p_shift",float,2.),
+		("anomaly_min_dt",int,7),
+		("anomaly_guard_dt",int,10),
+		("energy_rel_shift",float,15.),
+		("ref_min_avail",float,70.),
+		("ref_state",str,""),
+		("night_store",str,""),
+		
+		#~ other parameters
+		("result_cache",str,""),
+		("result_cache_size",int,64),
+		("metrics",bool,False),
+		("debug",bool,False),
+	)
+	
+	def __init__(self,**parameters):
+		for name,field_type,default in self.FIELDS:
+			setattr(self,name,default)
+		self.set(**parameters)
+	
+	
+	def set(self,**parameters):
+		#~ sets the given parameters, converting them to the type of their field. Raises TypeError for unknown parameters
+		#~ and ValueError for values that cannot be converted
+		field_types=dict((name,field_type) for name,field_type,default in self.FIELDS)
+		for name,value in parameters.iteritems():
+			if name not in field_types:
+				raise TypeError("unknown parameter: "+name)
+			if value is not None:
+				if field_types[name] is str and isinstance(value,unicode):
+					value=value.encode("utf-8")
+				value=field_types[name](value)
+			setattr(self,name,value)
+	
+	
+	def missing(self):
+		#~ names of the required parameters that are not set
+		return [name for name,field_type,default in self.FIELDS if default is None and getattr(self,name) is None]
+
+
+def input_format(cfg,arrays=None):
+	#~ input format set by cfg ("rrd", "txt", "csv" or "sqlite"), or "memory" if arrays are given.
+	#~ Returns also the list of errors of inconsistent format parameters
+	errors=list()
+	in_file_format=""
+	if arrays is not None:
+		in_file_format="memory"
+	elif [cfg.text,cfg.csv,cfg.sqlite].count(True)>1:
+		errors.append(ERROR_CODES["in_file_format"])
+	elif cfg.sqlite:
+		in_file_format="sqlite"
+		if cfg.cabinet_file=="":
+			errors.append(ERROR_CODES["sqlite_database"])
+	elif cfg.csv:
+		in_file_format="csv"
+		if cfg.cabinet_file!="":
+			errors.append(ERROR_CODES["cabinet_file_format"])
+	elif cfg.text:
+		in_file_format="txt"
+	else:
+		in_file_format="rrd"
+	return in_file_format,errors
+
+
+def run(cfg,arrays=None,cache=None):
+	#~ analyzes the data of one power cabinet with the parameters given by cfg (a config object).
+	#~ Data are read from the input files given by cfg or, if arrays is given, taken from it: arrays maps the channel names
+	#~ given by cfg (cfg.power_data_ph1, ...) to (data, ref_data) pairs, data having one value per data point and ref_data
+	#~ one row per reference day, oldest first (or None if no reference days are used).
+	#~ If cache (a data_io.reader_cache.reader_cache object) is given, data read from files are kept in it and reused by later runs.
+	#~ Returns the output as a dictionary with errors, warnings and, if no errors occurred, results (and metrics, if requested)
+
+	output_json=dict()
+	output_json["errors"]=list()
+	output_json["warnings"]=list()
+	output_json_results=None
+
+	for name in cfg.missing():
+		output_json["errors"].append(ERROR_CODES["config_missing"]+name)
+	if len(output_json["errors"])>0:
+		return output_json
+
+	#~ ********** ARGUMENT DETAILED PARSING **********
+	
+	DEBUG=cfg.debug
+	
+	#~ --- PERIOD TO BE ANALYZED ---
+	TS_START=cfg.t_start
+	TS_END=cfg.t_end
+	ANALYSIS_PERIOD=TS_END-TS_START
+	if ANALYSIS_PERIOD<=0:
+		output_json["errors"].append(ERROR_CODES["period_general"])
+		ANALYSIS_PERIOD=0
+
+
+	#~ --- INPUT FILES AND FORMAT ---
+	P_DATA_FILENAMES=list()
+	P_DATA_FILENAMES.append(cfg.power_data_ph1)
+	V_DATA_FILENAMES=list()
+	V_DATA_FILENAMES.append(cfg.voltage_data_ph1)
+	if (cfg.power_data_ph2 != "" and
+		cfg.power_data_ph3 != "" and
+		cfg.voltage_data_ph2 != "" and
+		cfg.voltage_data_ph3 != ""):
+		P_DATA_FILENAMES.append(cfg.power_data_ph2)
+		P_DATA_FILENAMES.append(cfg.power_data_ph3)
+		V_DATA_FILENAMES.append(cfg.voltage_data_ph2)
+		V_DATA_FILENAMES.append(cfg.voltage_data_ph3)
+	N_PHASES=len(P_DATA_FILENAMES)
+		
+	E_DATA_FILENAME=cfg.energy_data
+	C_DATA_FILENAME=cfg.cosphi_data
+	
+	#~ if all the channels are in the same file, the file names given above are data source names
+	CABINET_FILENAME=cfg.cabinet_file
+	CABINET_ID=cfg.cabinet_id
+
+	NO_ONE_READ_MEAS=False
+	if cfg.no_one_read_meas:
+		NO_ONE_READ_MEAS=True
+
+	RRD_FUNCTION=cfg.rrd_function
+	
+	USE_CACHE=not cfg.no_cache
+	
+	DATA_TYPE="float64"
+	if cfg.float32:
+		DATA_TYPE="float32"
+
+	#~ readers are imported later, after all the parameters have been validated
+	IN_FILE_FORMAT,format_errors=input_format(cfg,arrays)
+	output_json["errors"].extend(format_errors)
+
+
+	#~ --- BASE ALGORITHM PARAMETERS ---		
+	DELTA_T=cfg.delta_t     # minutes, used to detect power shifts
+	if DELTA_T<=0:
+		output_json["errors"].append(ERROR_CODES["delta_t"])
+	elif DELTA_T>=ANALYSIS_PERIOD and ANALYSIS_PERIOD>0:
+		output_json["errors"].append(ERROR_CODES["delta_t_large"])
+		
+	AVG_INTERVAL=cfg.avg_t
+	if AVG_INTERVAL<=0:
+		output_json["errors"].append(ERROR_CODES["avg_t"])
+	else:
+		if AVG_INTERVAL % 2 ==0:
+			AVG_INTERVAL+=1
+			output_json["warnings"].append(WARNING_CODES["avg_t"])
+
+	P_OFF_MAXS=list()
+	P_OFF_MAXS.append(cfg.poff_ph1)
+	if N_PHASES>1:
+		P_OFF_MAXS.append(cfg.poff_ph2)
+		P_OFF_MAXS.append(cfg.poff_ph3)
+	for i_ph in xrange(0,N_PHASES):
+		if P_OFF_MAXS[i_ph] <= 0:
+			output_json["errors"].append(ERROR_CODES["p_off"]+str(i_ph+1))
+	
+	V_MIN=cfg.v_min
+	V_MAX=cfg.v_max
+	if V_MIN>=V_MAX or V_MIN<=0 or V_MAX<=0:
+		output_json["errors"].append(ERROR_CODES["v_thrs"])
+
+	V_DT_MAX=cfg.v_dt*60                # given in hours by the user, converted in minutes
+	if V_DT_MAX<=0:
+		output_json["errors"].append(ERROR_CODES["v_dt"])
+	
+	COSPHI_MIN=cfg.cosphi_min         
+	if COSPHI_MIN<=0:
+		output_json["errors"].append(ERROR_CODES["cosphi_min"])
+		
+	COSPHI_DT_MAX=cfg.cosphi_dt*60		# given in hours by the user, converted in minutes
+	if COSPHI_DT_MAX<=0:
+		output_json["errors"].append(ERROR_CODES["cosphi_dt"])
+
+	MIN_OVERALL_DATA_AVAILABILITY=cfg.data_min_avail/100.
+	if MIN_OVERALL_DATA_AVAILABILITY<=0:
+		output_json["errors"].append(ERROR_CODES["data_min_avail"])
+
+
+
+	#~ --- COMPARISON TO REFERENCE PARAMETERS ---
+	N_REF_DAYS=cfg.ref_days
+	if N_REF_DAYS<0:
+		output_json["errors"].append(ERROR_CODES["ref_days"])
+	
+	
+	ANOMALY_DELTA_P=cfg.anomaly_abs_p_shift
+	if ANOMALY_DELTA_P<=0:
+		output_json["errors"].append(ERROR_CODES["anomaly_abs_p_shift"])
+
+		
+	ANOMALY_DELTA_P_REL=cfg.anomaly_rel_p_shift/100.
+	if ANOMALY_DELTA_P_REL<=0:
+		output_json["errors"].append(ERROR_CODES["anomaly_rel_p_shift"])
+
+
+	ANOMALY_MIN_DELTA_T=cfg.anomaly_min_dt
+	if ANOMALY_MIN_DELTA_T<=0:
+		output_json["errors"].append(ERROR_CODES["anomaly_min_dt"])
+
+	
+	ANOMALY_FILTER_DELTA_T=cfg.anomaly_guard_dt
+	if ANOMALY_FILTER_DELTA_T<=0:
+		output_json["errors"].append(ERROR_CODES["anomaly_guard_dt"])
+
+		
+	ENERGY_REL_OFFSET=cfg.energy_rel_shift/100.
+	if ENERGY_REL_OFFSET<=0:
+		output_json["errors"].append(ERROR_CODES["energy_rel_shift"])
+
+		
+	MIN_OVERALL_REF_AVAILABILITY=cfg.ref_min_avail/100.
+	if MIN_OVERALL_REF_AVAILABILITY<=0:
+		output_json["errors"].append(ERROR_CODES["ref_min_avail"])
+	
+	#~ file keeping the sorted reference days between runs, used only with reference days
+	REF_STATE=cfg.ref_state
+	if N_REF_DAYS==0:
+		REF_STATE=""
+	
+	#~ directory keeping the data and the products of the analyzed nights, used only with timestamped input data
+	NIGHT_STORE=cfg.night_store
+	if IN_FILE_FORMAT not in ("rrd","csv","sqlite"):
+		NIGHT_STORE=""
+	
+	#~ directory keeping the results of previous runs, bounded to the given size
+	RESULT_CACHE=cfg.result_cache
+	RESULT_CACHE_BYTES=cfg.result_cache_size*1024*1024		# given in MB by the user
+	if RESULT_CACHE!="" and RESULT_CACHE_BYTES<=0:
+		output_json["errors"].append(ERROR_CODES["result_cache_size"])
+
+
+
+	if len(output_json["errors"])==0:
+		
+		#~ import the reader and only the processing stages that will be used
+		t_import_start=time.time()
+		try:
+			io_dr=importlib.import_module(READERS[IN_FILE_FORMAT][0])
+		except:
+			output_json["errors"].append(ERROR_CODES[READERS[IN_FILE_FORMAT][1]])
+		else:
+			importlib.import_module("processing.profile_analyzer")
+			importlib.import_module("processing.metrics")
+			if N_REF_DAYS>0:
+				importlib.import_module("processing.profile_merger")
+				if REF_STATE!="":
+					importlib.import_module("processing.rolling_merger")
+					importlib.import_module("data_io.reference_state")
+				importlib.import_module("processing.anomaly_detector")
+			if E_DATA_FILENAME!="":
+				importlib.import_module("processing.energy_analyzer")
+			if C_DATA_FILENAME!="":
+				importlib.import_module("processing.cosphi_analyzer")
+			if cache is not None:
+				importlib.import_module("data_io.reader_cache")
+			importlib.import_module("data_io.prefetcher")
+			if NIGHT_STORE!="":
+				importlib.import_module("data_io.night_store")
+			if RESULT_CACHE!="":
+				importlib.import_module("data_io.result_cache")
+			if NO_ONE_READ_MEAS and N_PHASES>1:
+				importlib.import_module("multiprocessing.pool")
+		
+		if DEBUG:
+			print "Import time [s]:			",time.time()-t_import_start
+
+
+	if len(output_json["errors"])==0:			# if no errors
+		
+		#~ wall and CPU time of the stages of the analysis and counters of the processed items, given in the output if requested
+		mt=processing.metrics.DISABLED
+		if cfg.metrics:
+			mt=processing.metrics.metrics()
+		started_total=mt.start()
+
+		#~ create data reader. Its extra parameter depends on the input format
+		reader_extra=RRD_FUNCTION
+		if IN_FILE_FORMAT=="sqlite":
+			reader_extra=CABINET_ID
+		elif IN_FILE_FORMAT=="memory":
+			reader_extra=arrays
+		#~ the reader reports its errors separately for each channel through the prefetcher
+		read_errors=list()
+		dr=io_dr.data_reader(filename=CABINET_FILENAME,ts_start=TS_START,ts_end=TS_END,n_ref_days=N_REF_DAYS,s_int=SAMPLING_INT,err=read_errors,extra=reader_extra,dtype=DATA_TYPE)
+		dr.DEBUG=DEBUG
+		dr.USE_CACHE=USE_CACHE
+		if cache is not None and IN_FILE_FORMAT!="memory":
+			dr=data_io.reader_cache.cached_reader(dr,cache,reader_extra)
+		
+		#~ channels are read in the same order they are analyzed, in a background thread, so that reading the next channels
+		#~ overlaps with the analysis of the previous ones. Each channel is a file name, a data source name of the cabinet file
+		#~ or the name of an in-memory array
+		channels=list()
+		for i_phase in xrange(0,N_PHASES):
+			channels.append((P_DATA_FILENAMES[i_phase],N_REF_DAYS))
+			channels.append((V_DATA_FILENAMES[i_phase],N_REF_DAYS))
+		if E_DATA_FILENAME!="":
+			channels.append((E_DATA_FILENAME,N_REF_DAYS))
+		if C_DATA_FILENAME!="":
+			channels.append((C_DATA_FILENAME,0))
+		
+		#~ reference days already analyzed by previous runs are taken from the night store instead of being read.
+		#~ Power and voltage reference days are their stored data, energy reference days their stored energy offsets.
+		#~ Only these are stored: the reference profile is merged from the data of the reference days, normalized wrt the actual
+		#~ voltage, so that the analysis products of the reference days alone cannot be reused
+		ns=None
+		stored_refs=dict()
+		night_products=dict()
+		if NIGHT_STORE!="":
+			cabinet=""
+			if CABINET_FILENAME!="":
+				cabinet=os.path.abspath(CABINET_FILENAME)+(":"+CABINET_ID if CABINET_ID!="" else "")
+			parameters=[(name,getattr(cfg,name)) for name in NIGHT_STORE_PARAMETERS]+[("format",IN_FILE_FORMAT),("period",TS_END-TS_START)]
+			ns=data_io.night_store.night_store(NIGHT_STORE,cabinet,parameters)
+			ns.DEBUG=DEBUG
+			channel_keys=[(channel if CABINET_FILENAME!="" else os.path.abspath(channel)) for channel,n_ref_days in channels]
+			
+			for i_channel,(channel,n_ref_days) in enumerate(channels):
+				if n_ref_days>0:
+					names=["data"]
+					if i_channel==2*N_PHASES:
+						names=["offset","availability"]
+					stored_refs[i_channel]=ns.load_days(channel_keys[i_channel],TS_START,n_ref_days,names)
+					if stored_refs[i_channel] is not None:
+						channels[i_channel]=(channel,0)
+					else:
+						del stored_refs[i_channel]
+		
+		if CABINET_FILENAME!="":
+			channels=[("",channel,n_ref_days) for channel,n_ref_days in channels]
+		else:
+			channels=[(channel,"",n_ref_days) for channel,n_ref_days in channels]
+		pf=data_io.prefetcher.prefetcher(dr,read_errors,channels,metrics=mt)
+		
+		def read_channel():
+			i_channel=pf.i_next
+			data,ref_data=pf.next(output_json["errors"])
+			if ns is not None and len(output_json["errors"])==0 and i_channel<2*N_PHASES:
+				night_products[i_channel]={"data":data}
+				if i_channel in stored_refs:
+					ref_data=ns.stack(stored_refs[i_channel],"data")
+			return data,ref_data
+
+		def night_complete():
+			#~ True if the input data of all the channels of the night reach its end
+			for i_channel in night_products:
+				fn,ds,n_ref_days=channels[i_channel]
+				try:
+					last_update=dr.last_update(fn,ds)
+				except Exception:
+					return False
+				if last_update is None or last_update<TS_END:
+					return False
+			return True
+
+		rc=None
+		if RESULT_CACHE!="":
+			rc=data_io.result_cache.result_cache(RESULT_CACHE,RESULT_CACHE_BYTES)
+			rc.DEBUG=DEBUG
+		
+		def result_key():
+			#~ key of the results in the result cache, made of the parameters and of all the inputs of the analysis, or None
+			#~ if any channel cannot be read. Reference days taken from the night store are part of the inputs as well
+			inputs=list()
+			for i_channel,(data,ref_data,read_errors) in enumerate(pf.fetch_all()):
+				if isinstance(read_errors,Exception) or len(read_errors)>0:
+					return None
+				if i_channel in stored_refs and i_channel<2*N_PHASES:
+					inputs.extend([data,ns.stack(stored_refs[i_channel],"data")])
+				elif i_channel in stored_refs:
+					inputs.extend([data,ns.stack(stored_refs[i_channel],"offset"),ns.stack(stored_refs[i_channel],"availability")])
+				else:
+					inputs.extend([data,ref_data])
+			parameters=[(name,getattr(cfg,name)) for name,field_type,default in config.FIELDS if name not in RESULT_CACHE_IGNORED]
+			return data_io.result_cache.key(parameters+[("format",IN_FILE_FORMAT)],inputs)
+
+		def create_analyzers():
+			pa_data=processing.profile_analyzer.profile_analyzer(TS_START,SAMPLING_INT,DELTA_T,AVG_INTERVAL,ANOMALY_FILTER_DELTA_T,V_MIN,V_MAX)
+			pa_data.DEBUG=DEBUG
+			pa_data.metrics=mt
+			pa_ref=processing.profile_analyzer.profile_analyzer(TS_START,SAMPLING_INT,DELTA_T,AVG_INTERVAL,ANOMALY_FILTER_DELTA_T,V_MIN,V_MAX)
+			pa_ref.DEBUG=DEBUG
+			pa_ref.metrics=mt
+
+			#~ if necessary, create the anomaly detector
+			ad=None
+			if N_REF_DAYS>0:
+				ad=processing.anomaly_detector.anomaly_detector(TS_START,SAMPLING_INT,DELTA_T,ANOMALY_DELTA_P,ANOMALY_DELTA_P_REL,ANOMALY_MIN_DELTA_T)
+				ad.DEBUG=DEBUG
+			return pa_data,pa_ref,ad
+
+		#~ prepare outputs and working variables
+		output_json_results=dict()
+		output_json_results["phases"]=dict()
+		n_data_points=int((TS_END-TS_START)/60/SAMPLING_INT)+1	
+		ctrl_data=dict()
+		
+		#~ state shared by consecutive phases: availabilities and the flags used to skip calculations when data and/or
+		#~ reference data have low reliability
+		def new_state():
+			state=dict()
+			state["data_availability"]=0
+			state["ref_availability"]=0
+			state["avoid_calcs"]=False
+			state["ref_avoid_calcs"]=False
+			state["ref_states_changed"]=False
+			return state
+		state=new_state()
+		
+		#~ reference states of the phases, updated by each run instead of sorting all the reference days again
+		ref_states=None
+		if REF_STATE!="":
+			ref_states=data_io.reference_state.load(REF_STATE)
+		
+		
+		def analyze_phase(i_phase,data_p,data_p_ref,data_v,data_v_ref,analyzers,state):
+			#~ state is read and updated by the analysis of the phase
+			pa_data,pa_ref,ad=analyzers
+			phase_data=dict()
+			
+			#~ use the profile analyzer to estimate data availability.
+			#~ If three-phase data are collected at the same time for all the phases (e.g. with one single query)
+			#~ availability is the same for all the phases, so it's calculated only for the first one.
+			pa_data.set_data(data_p,data_v,P_OFF_MAXS[i_phase],(not NO_ONE_READ_MEAS))
+			if i_phase==0 or NO_ONE_READ_MEAS:
+				state["data_availability"]=pa_data.estimate_availability()
+			data_availability=state["data_availability"]
+			phase_data["availability"]=data_availability
+
+			if data_availability>=MIN_OVERALL_DATA_AVAILABILITY:
+				
+				#~ analyze data to get the averaged power profile, switch on/off markers and voltage anomalies
+				data_p_avg,data_switch_markers,ctrl_data[i_phase],n_high_v_points,n_low_v_points=pa_data.analyze_profile()
+
+				phase_data["switch_markers"]=data_switch_markers
+				phase_data["v"]=dict()
+				phase_data["v"]["high_dt"]=n_high_v_points
+				phase_data["v"]["low_dt"]=n_low_v_points
+				phase_data["v"]["alarm"]=(1 if n_high_v_points+n_low_v_points>V_DT_MAX else 0)
+
+
+				if N_REF_DAYS>0:
+					phase_data["reference"]=dict()
+					if not state["ref_avoid_calcs"]:
+						
+						#~ merge the reference power profile into an unique "median" profile and calculates reference data availability.
+						#~ Reference power is normalized wrt the actual voltage, after the profile analyzer filled its short gaps
+						if ref_states is not None:
+							pm=processing.rolling_merger.rolling_merger(data_p_ref,data_v_ref,pa_data.data_v,ref_states.get(i_phase))
+						else:
+							pm=processing.profile_merger.profile_merger(data_p_ref,data_v_ref,pa_data.data_v)
+						pm.DEBUG=DEBUG
+						started=mt.start()
+						ref_p, ref_v, ref_availability = pm.merge()
+						mt.stop("merge",started)
+						if ref_states is not None and pm.state_changed:
+							ref_states[i_phase]=pm.state
+							state["ref_states_changed"]=True
+						state["ref_availability"]=ref_availability
+						phase_data["reference"]["availability"]=ref_availability
+						
+						if ref_availability>=MIN_OVERALL_REF_AVAILABILITY:
+							
+							#~ use the same processing steps of actual data in order to analyze the reference profile and get
+							#~ the information necessary to detect power anomalies
+							pa_ref.set_data(ref_p,ref_v,P_OFF_MAXS[i_phase],(not NO_ONE_READ_MEAS))
+							if i_phase==0 or NO_ONE_READ_MEAS:
+								pa_ref.estimate_availability()		# used only to find NaN intervals
+							
+							ref_p_avg,_,ctrl_ref,_,_=pa_ref.analyze_profile()
+							
+							#~ detect anomalies using the averaged power profiles (actual and reference)
+							ad.set_data(data_p_avg,ctrl_data[i_phase],ref_p_avg,ctrl_ref)
+							started=mt.start()
+							anomaly_markers=ad.detect()
+							mt.stop("anomaly_detection",started)
+							mt.count("anomaly_events",len(anomaly_markers["on"]["t"])+len(anomaly_markers["off"]["t"]))
+
+							phase_data["reference"]["anomaly_markers"]=anomaly_markers
+						
+						else:		# low reference availability
+							phase_data["reference"]["anomaly_markers"]={}
+							state["ref_avoid_calcs"]=True and (not NO_ONE_READ_MEAS)
+					else:
+						phase_data["reference"]["availability"]=state["ref_availability"]
+						phase_data["reference"]["anomaly_markers"]={}
+
+			else:		# low data availability
+				phase_data["switch_markers"]={}
+				phase_data["v"]={}
+				state["avoid_calcs"]=True and (not NO_ONE_READ_MEAS)
+			
+			return phase_data
+		
+		
+		try:
+			#~ with the result cache, all the channels are read before the analysis, so that the results of inputs
+			#~ already analyzed with the same parameters are taken from the cache
+			key=None
+			if rc is not None:
+				key=result_key()
+				if key is not None:
+					cached_results=rc.get(key)
+					if cached_results is not None:
+						output_json["result_cache"]="hit"
+						output_json["results"]=cached_results
+						return output_json
+				output_json["result_cache"]="miss"
+			
+			pa_data,pa_ref,ad=analyzers=create_analyzers()
+			
+			#~ POWER ANALYSIS, for each phase
+			if NO_ONE_READ_MEAS and N_PHASES>1:
+				
+				#~ phases are independent: each one is analyzed with its own processing stages and state as soon as its data
+				#~ are read, while the data of the next phases are being read. Phase states are merged once the phases are done
+				pool=multiprocessing.pool.ThreadPool(N_PHASES)
+				try:
+					phase_results=dict()
+					phase_states=dict()
+					for i_phase in xrange(0,N_PHASES):
+						data_p,data_p_ref=read_channel()
+						if len(output_json["errors"])>0:
+							break	# errors while reading input data, block everything
+						data_v,data_v_ref=read_channel()
+						if len(output_json["errors"])>0:
+							break
+						phase_states[i_phase]=new_state()
+						phase_results[i_phase]=pool.apply_async(analyze_phase,(i_phase,data_p,data_p_ref,data_v,data_v_ref,
+							(analyzers if i_phase==0 else create_analyzers()),phase_states[i_phase]))
+					for i_phase in sorted(phase_results):
+						output_json_results["phases"][i_phase]=phase_results[i_phase].get()
+						state["data_availability"]=phase_states[i_phase]["data_availability"]
+						state["avoid_calcs"]=state["avoid_calcs"] or phase_states[i_phase]["avoid_calcs"]
+						state["ref_states_changed"]=state["ref_states_changed"] or phase_states[i_phase]["ref_states_changed"]
+				finally:
+					pool.close()
+					pool.join()
+			else:
+				for i_phase in xrange(0,N_PHASES):
+					
+					if DEBUG:
+						print "\n\n********** PHASE",(i_phase+1),"**********"
+					
+					if not state["avoid_calcs"]:
+						
+						#~ read power data and reference power data
+						data_p,data_p_ref=read_channel()
+						if len(output_json["errors"])>0:
+							break	# errors while reading input data, block everything
+						
+						#~ read voltage data and reference voltage data	
+						data_v,data_v_ref=read_channel()
+						if len(output_json["errors"])>0:
+							break
+						
+						output_json_results["phases"][i_phase]=analyze_phase(i_phase,data_p,data_p_ref,data_v,data_v_ref,analyzers,state)
+					else:
+						phase_data=dict()
+						output_json_results["phases"][i_phase]=phase_data
+						phase_data["availability"]=state["data_availability"]
+						phase_data["switch_markers"]={}
+						phase_data["v"]={}
+			
+			data_availability=state["data_availability"]
+			avoid_calcs=state["avoid_calcs"]
+			
+			if state["ref_states_changed"] and len(output_json["errors"])==0:
+				try:
+					data_io.reference_state.save(REF_STATE,ref_states)
+				except (IOError,OSError):
+					output_json["warnings"].append(WARNING_CODES["ref_state"])
+			
+			
+			#~ ENERGY ANALYSIS
+			if E_DATA_FILENAME != "":
+				output_json_results["energy"]=dict()
+				if not avoid_calcs:
+					
+					#~ read energy data, skipping the phase channels left unread
+					pf.skip_to(2*N_PHASES)
+					data_e,data_e_ref=read_channel()
+					if len(output_json["errors"])==0:
+						
+						#~ energy consumption of the analyzed period and, if requested, comparison with the median consumption of the reference days
+						ea=processing.energy_analyzer.energy_analyzer(MIN_OVERALL_DATA_AVAILABILITY,MIN_OVERALL_REF_AVAILABILITY,ENERGY_REL_OFFSET)
+						ea.DEBUG=DEBUG
+						ea.set_data(data_e,(data_e_ref if N_REF_DAYS>0 else None))
+						if 2*N_PHASES in stored_refs:
+							ea.set_ref_offsets(ns.stack(stored_refs[2*N_PHASES],"offset"),ns.stack(stored_refs[2*N_PHASES],"availability"))
+						started=mt.start()
+						output_json_results["energy"].update(ea.analyze())
+						mt.stop("energy",started)
+						if ns is not None:
+							night_products[2*N_PHASES]={"offset":ea.data_e_offset,"availability":ea.data_e_availability}
+			
+
+			#~ COS(PHI) ANALYSIS
+			if C_DATA_FILENAME != "":
+				output_json_results["cosphi"]=dict()
+				if not avoid_calcs:
+
+					#~ read cosphi data
+					pf.skip_to(len(channels)-1)
+					data_c,_=read_channel()
+					if len(output_json["errors"])==0:
+						
+						#~ cosphi data availability is supposed to be the same of power data. If it's not the case (NO_ONE_READ_MEAS = True)
+						#~ then it's estimated separately from data
+						c_availability=data_availability
+						if NO_ONE_READ_MEAS:
+							pa_data.set_data(data_c,None,0,False)
+							c_availability=pa_data.estimate_availability()
+						
+						output_json_results["cosphi"]["availability"]=c_availability
+						
+						#~ low cosphi is searched within the intersection of the ON periods of the available phases. Phases not analyzed
+						#~ for their low availability (analyzed separately with NO_ONE_READ_MEAS) are never in ON state
+						ca=processing.cosphi_analyzer.cosphi_analyzer(SAMPLING_INT,COSPHI_MIN,COSPHI_DT_MAX)
+						ca.DEBUG=DEBUG
+						ca.set_data(data_c,[ctrl_data.get(i_phase,[0]*n_data_points) for i_phase in xrange(0,N_PHASES)])
+						started=mt.start()
+						output_json_results["cosphi"].update(ca.analyze())
+						mt.stop("cosphi",started)
+			
+			#~ the night is stored only if analyzed without errors, and once all its data are available: stored nights are never
+			#~ read again from the input files, so data still to come would be missed by the following runs
+			if ns is not None and len(output_json["errors"])==0:
+				if night_complete():
+					try:
+						for i_channel,products in night_products.iteritems():
+							ns.save(channel_keys[i_channel],TS_START,products)
+					except (IOError,OSError):
+						output_json["warnings"].append(WARNING_CODES["night_store"])
+				else:
+					output_json["warnings"].append(WARNING_CODES["night_incomplete"])
+			
+			if key is not None and len(output_json["errors"])==0:
+				try:
+					rc.put(key,output_json_results)
+				except (IOError,OSError):
+					output_json["warnings"].append(WARNING_CODES["result_cache"])
+		finally:
+			pf.close()
+			if cfg.metrics:
+				mt.stop("total",started_total)
+				output_json["metrics"]=mt.output()
+						
+
+				
+	if len(output_json["errors"])==0:
+		output_json["results"]=output_json_results
+
+	return output_json
+
+
+def backfill_nights(cfg,n_nights):
+	#~ inputs of the analysis of n_nights consecutive nights with the parameters given by cfg, cfg.t_start and cfg.t_end
+	#~ giving the first night. Each channel is read once, from the first reference day of the first night to the end of the
+	#~ last night, and the data and reference data of each night are then views of this buffer, sliding by one day.
+	#~ Yields, for each night, its config and the arrays to be given to run, or None if the night has to be read from files.
+	#~ Either way, the output of run is the same of a separate run for the night
+	
+	SECONDS_PER_DAY=24*60*60
+	
+	night_cfgs=list()
+	for i_night in xrange(0,n_nights):
+		night_cfg=copy.copy(cfg)
+		night_cfg.t_start=cfg.t_start+i_night*SECONDS_PER_DAY
+		night_cfg.t_end=cfg.t_end+i_night*SECONDS_PER_DAY
+		night_cfgs.append(night_cfg)
+	
+	#~ nights are read separately when the buffer cannot be used: parameters with errors, text files (that have no
+	#~ timestamps, see data_reader_txt) or data that cannot be read at full resolution for the whole span
+	buffers=None
+	in_file_format,errors=input_format(cfg)
+	if not (n_nights<=1 or len(cfg.missing())>0 or len(errors)>0 or in_file_format=="txt" or
+		cfg.t_end<=cfg.t_start or cfg.ref_days<0):
+		buffers=read_span(cfg,in_file_format,cfg.t_start-cfg.ref_days*SECONDS_PER_DAY,night_cfgs[-1].t_end)
+	
+	if buffers is None:
+		for night_cfg in night_cfgs:
+			yield night_cfg,None
+		return
+	
+	import numpy
+	
+	day_points=SECONDS_PER_DAY//(SAMPLING_INT*60)
+	n_data_points=int((cfg.t_end-cfg.t_start)/60/SAMPLING_INT)+1
+	for i_night in xrange(0,n_nights):
+		
+		#~ the night starts after its reference days; reference days are seen as a (ref_days x n_data_points) array, oldest first
+		i_start=(i_night+cfg.ref_days)*day_points
+		arrays=dict()
+		for channel,buffer in buffers.iteritems():
+			ref_data=None
+			if cfg.ref_days>0:
+				ref_data=numpy.lib.stride_tricks.as_strided(buffer[i_night*day_points:],shape=(cfg.ref_days,n_data_points),
+					strides=(day_points*buffer.strides[0],buffer.strides[0]),writeable=False)
+			arrays[channel]=(buffer[i_start:i_start+n_data_points],ref_data)
+		yield night_cfgs[i_night],arrays
+
+
+def read_span(cfg,in_file_format,ts_start,ts_end):
+	#~ data of all the channels used by the analysis (see run) between ts_start and ts_end, as a dictionary mapping
+	#~ the channel names to arrays with one value per data point. Returns None if any channel cannot be read
+	
+	try:
+		io_dr=importlib.import_module(READERS[in_file_format][0])
+	except:
+		return None
+	
+	reader_extra=cfg.rrd_function
+	if in_file_format=="sqlite":
+		reader_extra=cfg.cabinet_id
+	errors=list()
+	dr=io_dr.data_reader(filename=cfg.cabinet_file,ts_start=ts_start,ts_end=ts_end,n_ref_days=0,s_int=SAMPLING_INT,err=errors,
+		extra=reader_extra,dtype=("float32" if cfg.float32 else "float64"))
+	dr.DEBUG=cfg.debug
+	
+	#~ phases 2 and 3 are analyzed only if all their channels are given
+	channels=[cfg.power_data_ph1,cfg.voltage_data_ph1]
+	phase_channels=[cfg.power_data_ph2,cfg.power_data_ph3,cfg.voltage_data_ph2,cfg.voltage_data_ph3]
+	if "" not in phase_channels:
+		channels.extend(phase_channels)
+	channels.extend([channel for channel in (cfg.energy_data,cfg.cosphi_data) if channel!=""])
+	
+	buffers=dict()
+	for channel in channels:
+		if channel not in buffers:
+			if cfg.cabinet_file!="":
+				dr.read("",channel)
+			else:
+				dr.read(channel)
+			if len(errors)>0:
+				return None
+			buffers[channel]=dr.data
+	
+	if cfg.debug:
+		print "Span # data points:			",dr.n_data_points
+	
+	return buffers
+
+
+def reference_profiles(cfg):
+	#~ reference profiles used by the streaming detector (see processing.stream_detector) for the period cfg.t_start-cfg.t_end,
+	#~ as a list with, for each phase, the averaged power and the ON/OFF state of the merged reference days given by
+	#~ the profile analyzer, and the reference availability. Power is not normalized wrt the actual voltage, which is not
+	#~ known in advance. Phases with low reference availability have no averaged power and ON/OFF state.
+	#~ Returns also the list of errors. cfg.avg_t is expected to be odd
+	
+	errors=list()
+	in_file_format,format_errors=input_format(cfg)
+	errors.extend(format_errors)
+	if len(errors)>0:
+		return None,errors
+	try:
+		io_dr=importlib.import_module(READERS[in_file_format][0])
+	except:
+		return None,[ERROR_CODES[READERS[in_file_format][1]]]
+	importlib.import_module("processing.profile_merger")
+	importlib.import_module("processing.profile_analyzer")
+	
+	reader_extra=cfg.rrd_function
+	if in_file_format=="sqlite":
+		reader_extra=cfg.cabinet_id
+	dr=io_dr.data_reader(filename=cfg.cabinet_file,ts_start=cfg.t_start,ts_end=cfg.t_end,n_ref_days=cfg.ref_days,s_int=SAMPLING_INT,
+		err=errors,extra=reader_extra,dtype=("float32" if cfg.float32 else "float64"))
+	dr.DEBUG=cfg.debug
+	dr.USE_CACHE=not cfg.no_cache
+	
+	#~ phases 2 and 3 are analyzed only if all their channels are given
+	phase_channels=[(cfg.power_data_ph1,cfg.voltage_data_ph1,cfg.poff_ph1)]
+	if "" not in (cfg.power_data_ph2,cfg.power_data_ph3,cfg.voltage_data_ph2,cfg.voltage_data_ph3):
+		phase_channels.append((cfg.power_data_ph2,cfg.voltage_data_ph2,cfg.poff_ph2))
+		phase_channels.append((cfg.power_data_ph3,cfg.voltage_data_ph3,cfg.poff_ph3))
+	
+	profiles=list()
+	for p_channel,v_channel,p_off_max in phase_channels:
+		ref_data=list()
+		for channel in (p_channel,v_channel):
+			if cfg.cabinet_file!="":
+				dr.read("",channel)
+			else:
+				dr.read(channel)
+			if len(errors)>0:
+				return None,errors
+			ref_data.append(dr.ref_data)
+		
+		pm=processing.profile_merger.profile_merger(ref_data[0],ref_data[1])
+		pm.DEBUG=cfg.debug
+		ref_p,ref_v,ref_availability=pm.merge()
+		profile={"availability":ref_availability,"p_avg":None,"ctrl":None}
+		if ref_availability>=cfg.ref_min_avail/100.:
+			pa_ref=processing.profile_analyzer.profile_analyzer(cfg.t_start,SAMPLING_INT,cfg.delta_t,cfg.avg_t,cfg.anomaly_guard_dt,cfg.v_min,cfg.v_max)
+			pa_ref.DEBUG=cfg.debug
+			pa_ref.set_data(ref_p,ref_v,p_off_max,False)
+			pa_ref.estimate_availability()
+			profile["p_avg"],_,profile["ctrl"],_,_=pa_ref.analyze_profile()
+		profiles.append(profile)
+	
+	return profiles,errors
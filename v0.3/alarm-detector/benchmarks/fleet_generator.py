@@ -0,0 +1,216 @@
+#   Copyright 2015 Adamo Ferro
+#
+#   This file is part of SLightliMon.
+#
+#   SLightliMon is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   SLightliMon is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
+
+
+import sys, os, argparse
+import json
+import numpy
+
+
+SECONDS_PER_DAY=24*60*60
+MINUTES_PER_DAY=24*60
+
+#~ parameters of the synthetic fleet. Rates are per day, durations in minutes
+DEFAULTS=dict()
+DEFAULTS["lamps"]=(10,40)					# number of lamps per phase, min and max
+DEFAULTS["lamp_power"]=(70.,150.)			# watts per lamp, min and max
+DEFAULTS["standby_power"]=20.				# watts per phase while lamps are OFF
+DEFAULTS["switch_jitter"]=4.				# standard deviation of the dusk/dawn switching time of the twilight sensor
+DEFAULTS["v_nominal"]=230.
+DEFAULTS["v_noise"]=1.5						# standard deviation of the minute-by-minute voltage noise
+DEFAULTS["brownout_rate"]=0.2
+DEFAULTS["brownout_duration"]=(5,90)
+DEFAULTS["brownout_voltage"]=(185.,205.)
+DEFAULTS["failure_rate"]=0.3				# failed lamps per phase
+DEFAULTS["repair_days"]=(1,5)
+DEFAULTS["low_cosphi_rate"]=0.1
+DEFAULTS["low_cosphi_duration"]=(30,300)
+DEFAULTS["gap_length"]=(1,180)				# NaN bursts, from single missing samples to long outages
+DEFAULTS["gap_density"]=0.02				# average fraction of missing samples
+
+
+def twilight(days):
+	#~ minute of the day (UTC) of dusk and dawn for each day number (days since the epoch), for a mid-latitude site
+	#~ on the Greenwich meridian: nights are about 15 hours long in winter and 9 hours long in summer
+	season=numpy.cos(2*numpy.pi*((days%365.25)-172)/365.25)
+	return 17.5*60+150*season,6.5*60-150*season
+
+
+def bursts(random,n_points,rate,duration):
+	#~ start and end (excluded) of random events over n_points minutes: rate events per day on average,
+	#~ with durations uniformly distributed between the given bounds
+	n_events=random.poisson(rate*n_points/float(MINUTES_PER_DAY))
+	starts=random.randint(0,max(n_points,1),n_events)
+	lengths=random.randint(duration[0],duration[1]+1,n_events)
+	return starts,numpy.minimum(starts+lengths,n_points)
+
+
+def mask(n_points,starts,ends):
+	events=numpy.zeros(n_points+1,dtype=int)
+	numpy.add.at(events,starts,1)
+	numpy.add.at(events,ends,-1)
+	return numpy.cumsum(events[:-1])>0
+
+
+def cabinet(seed,ts_first,n_points,n_phases=3,gap_density=None,**parameters):
+	#~ synthetic data of one power cabinet, one value per minute from ts_first: returns a dictionary mapping the channel
+	#~ names (p1, v1, ..., e, c) to float arrays with NaN for no data values, and the description of the cabinet.
+	#~ The same seed always gives the same data
+	
+	prm=dict(DEFAULTS)
+	prm.update(parameters)
+	if gap_density is not None:
+		prm["gap_density"]=gap_density
+	random=numpy.random.RandomState(seed)
+	
+	#~ lamps switch ON at dusk and OFF at dawn, with some jitter from day to day
+	ts=ts_first+60*numpy.arange(n_points)
+	day=ts//SECONDS_PER_DAY
+	minute=(ts%SECONDS_PER_DAY)//60
+	first_day=day[0] if n_points>0 else 0
+	n_days=(day[-1]-first_day+1) if n_points>0 else 0
+	dusk,dawn=twilight(numpy.arange(first_day,first_day+n_days))
+	dusk=dusk+random.normal(0,prm["switch_jitter"],n_days)
+	dawn=dawn+random.normal(0,prm["switch_jitter"],n_days)
+	lamps_on=(minute>=dusk[day-first_day]) | (minute<dawn[day-first_day])
+	
+	series=dict()
+	description={"seed":seed,"n_phases":n_phases,"phases":list()}
+	total_p=numpy.zeros(n_points)
+	for i_phase in xrange(0,n_phases):
+		n_lamps=random.randint(prm["lamps"][0],prm["lamps"][1]+1)
+		lamp_power=random.uniform(*prm["lamp_power"])
+		
+		#~ voltage: slow daily oscillation, noise and brownouts
+		v=prm["v_nominal"]+2*numpy.sin(2*numpy.pi*minute/MINUTES_PER_DAY+random.uniform(0,2*numpy.pi))
+		v+=random.normal(0,prm["v_noise"],n_points)
+		starts,ends=bursts(random,n_points,prm["brownout_rate"],prm["brownout_duration"])
+		for i_start,i_end in zip(starts,ends):
+			v[i_start:i_end]=random.uniform(*prm["brownout_voltage"])+random.normal(0,prm["v_noise"],i_end-i_start)
+		
+		#~ failed lamps stay OFF until repaired
+		working_lamps=numpy.empty(n_points)
+		working_lamps.fill(n_lamps)
+		starts,ends=bursts(random,n_points,prm["failure_rate"],(prm["repair_days"][0]*MINUTES_PER_DAY,prm["repair_days"][1]*MINUTES_PER_DAY))
+		for i_start,i_end in zip(starts,ends):
+			working_lamps[i_start:i_end]-=1
+		working_lamps=numpy.maximum(working_lamps,0)
+		
+		#~ lamp power follows the square of the voltage
+		p=numpy.where(lamps_on,working_lamps*lamp_power*(v/prm["v_nominal"])**2,prm["standby_power"])
+		p*=1+random.normal(0,0.01,n_points)
+		total_p+=p
+		
+		series["p%d" %(i_phase+1)]=p
+		series["v%d" %(i_phase+1)]=v
+		description["phases"].append({"lamps":n_lamps,"lamp_power":lamp_power,"poff":int(prm["standby_power"]+lamp_power)})
+	
+	#~ cumulative energy counter [kWh] and cosphi, lower while some capacitors are failing
+	series["e"]=1000.*random.uniform(0,1)+numpy.cumsum(total_p)/60./1000.
+	c=0.95+random.normal(0,0.01,n_points)
+	starts,ends=bursts(random,n_points,prm["low_cosphi_rate"],prm["low_cosphi_duration"])
+	c[mask(n_points,starts,ends)]-=0.15
+	series["c"]=numpy.where(lamps_on,numpy.minimum(c,1.),0.5+random.normal(0,0.05,n_points))
+	
+	#~ NaN bursts, the same for all the channels (read with a single query). Their rate gives the requested density
+	#~ on average, given the average burst length
+	mean_gap=(prm["gap_length"][0]+prm["gap_length"][1])/2.
+	starts,ends=bursts(random,n_points,prm["gap_density"]*MINUTES_PER_DAY/mean_gap,prm["gap_length"])
+	missing=mask(n_points,starts,ends)
+	for channel in series:
+		series[channel][missing]=numpy.nan
+	
+	return series,description
+
+
+def fleet(seed,n_cabinets,ts_first,n_points,gap_density=None):
+	#~ synthetic data of n_cabinets cabinets, alternating three-phase and single-phase ones
+	return [cabinet(seed*1000+i_cabinet,ts_first,n_points,(3 if i_cabinet%4!=3 else 1),gap_density) for i_cabinet in xrange(0,n_cabinets)]
+
+
+def write_text(series,directory,ts_first,ts_start,ts_end,n_ref_days):
+	#~ writes one text file per channel in the alarm detector text format, holding the data of the period from ts_start
+	#~ to ts_end followed by the data of its n_ref_days reference days, oldest first
+	if not os.path.isdir(directory):
+		os.makedirs(directory)
+	n_data_points=(ts_end-ts_start)//60+1
+	i_start=(ts_start-ts_first)//60
+	if i_start-n_ref_days*MINUTES_PER_DAY<0:
+		raise ValueError("reference days precede the generated data")
+	for channel,values in series.iteritems():
+		rows=[values[i_start:i_start+n_data_points]]
+		for i_ref_day in xrange(n_ref_days,0,-1):
+			i_ref_start=i_start-i_ref_day*MINUTES_PER_DAY
+			rows.append(values[i_ref_start:i_ref_start+n_data_points])
+		numpy.savetxt(os.path.join(directory,channel+".txt"),numpy.concatenate(rows),fmt="%.3f")
+
+
+def write_rrd(series,directory,ts_first):
+	#~ writes one RRD file per channel, with a single full resolution archive holding all the generated data
+	import rrdtool
+	
+	if not os.path.isdir(directory):
+		os.makedirs(directory)
+	for channel,values in series.iteritems():
+		filename=os.path.join(directory,channel+".rrd")
+		rrdtool.create(filename,"--start",str(ts_first-60),"--step","60","DS:value:GAUGE:120:U:U","RRA:AVERAGE:0.5:1:%d" %(len(values)+1))
+		updates=["%d:%s" %(ts_first+60*i_data,("U" if numpy.isnan(value) else "%.3f" %value)) for i_data,value in enumerate(values)]
+		for i_update in xrange(0,len(updates),1000):
+			rrdtool.update(filename,*updates[i_update:i_update+1000])
+
+
+def main(argv):
+
+	def parse_args():
+		parser=argparse.ArgumentParser(description='SLightliMon FLEET GENERATOR - Writes synthetic power cabinet data for benchmarking the alarm detector: dusk/dawn switching, per-phase loads, voltage noise, brownouts, failed lamps, low cosphi and NaN bursts. The same seed always gives the same data.')
+		parser.add_argument('-o','--output',required=True,type=str,help='output directory: each cabinet is written into its own subdirectory, and the fleet is described in fleet.json.')
+		parser.add_argument('-n','--cabinets',type=int,help='number of cabinets. Default is 4.',default='4')
+		parser.add_argument('-ts','--t_start',required=True,type=int,help='start UNIX epoch timestamp of the period to be analyzed [seconds]')
+		parser.add_argument('-te','--t_end',required=True,type=int,help='end UNIX epoch timestamp of the period to be analyzed [seconds]')
+		parser.add_argument('-rd','--ref_days',type=int,help='number of reference days before the period. Default is 7.',default='7')
+		parser.add_argument('-g','--gap_density',type=float,help='average fraction of missing samples. Default is 0.02.',default=str(DEFAULTS["gap_density"]))
+		parser.add_argument('-s','--seed',type=int,help='random seed. Default is 1.',default='1')
+		parser.add_argument('-txt','--text',dest='text',action='store_true',help='write text files for the given period and reference days.')
+		parser.add_argument('-rrd','--rrd',dest='rrd',action='store_true',help='write RRD files holding the period and its reference days.')
+		parser.set_defaults(text=False)
+		parser.set_defaults(rrd=False)
+		return parser.parse_args(argv[1:])
+
+	args=parse_args()
+	if args.t_end<=args.t_start or args.ref_days<0 or args.cabinets<=0 or not (args.text or args.rrd):
+		sys.exit("Inconsistent parameters: a period, a positive number of cabinets and at least one output format are needed")
+	
+	ts_first=args.t_start-args.ref_days*SECONDS_PER_DAY
+	n_points=(args.t_end-ts_first)//60+1
+	description=list()
+	for i_cabinet,(series,cabinet_description) in enumerate(fleet(args.seed,args.cabinets,ts_first,n_points,args.gap_density)):
+		directory=os.path.join(args.output,"cabinet%03d" %i_cabinet)
+		if args.text:
+			write_text(series,directory,ts_first,args.t_start,args.t_end,args.ref_days)
+		if args.rrd:
+			write_rrd(series,directory,ts_first)
+		cabinet_description["directory"]=directory
+		description.append(cabinet_description)
+	
+	with open(os.path.join(args.output,"fleet.json"),"w") as fleet_file:
+		json.dump({"t_start":args.t_start,"t_end":args.t_end,"ref_days":args.ref_days,"cabinets":description},fleet_file,indent=1)
+
+
+
+
+if __name__ == "__main__":
+	main(sys.argv)
@@ -0,0 +1,361 @@
+#   Copyright 2015 Adamo Ferro
+#
+#   This file is part of SLightliMon.
+#
+#   SLightliMon is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   SLightliMon is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
+
+
+import sys, os, argparse
+import json
+import platform
+import shutil
+import subprocess
+import tempfile
+import timeit
+import importlib
+import numpy
+
+#~ the alarm detector modules are in the parent directory
+ALARM_DETECTOR_DIR=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,ALARM_DETECTOR_DIR)
+
+import fleet_generator
+import alarm_detector
+import processing.profile_analyzer
+import processing.profile_merger
+import processing.anomaly_detector
+import processing.energy_analyzer
+import processing.cosphi_analyzer
+
+
+#~ analyzed nights are centred on this midsummer midnight (UTC), so that the default window holds both switches
+TS_MIDNIGHT=1434844800
+
+#~ each benchmark is run at the default point and then scaling one parameter at a time. The window is in minutes
+DEFAULT_POINT=(("window",960),("ref_days",7),("avg_t",5),("gap_density",0.02))
+AXES=(
+	("window",(480,960,1440)),
+	("ref_days",(0,7,30)),
+	("avg_t",(1,5,15)),
+	("gap_density",(0.,0.02,0.1)),
+)
+CABINETS=(1,4,16)
+
+#~ minimum data and reference availability [percent], low enough for gappy synthetic nights to go through the whole analysis
+MIN_AVAIL=1
+
+#~ minimum duration of each run of the module benchmarks, for stable timings of short calls [seconds]
+MIN_RUN_TIME=0.05
+
+FORMAT_VERSION=1
+
+
+def best_time(function,repeats,min_run_time=0.):
+	#~ shortest wall time of a call of function over repeats runs [seconds]. Fast functions are called
+	#~ repeatedly in each run, until it lasts at least min_run_time
+	n_calls=1
+	while True:
+		t_start=timeit.default_timer()
+		for i_call in xrange(0,n_calls):
+			function()
+		run_time=timeit.default_timer()-t_start
+		if run_time>=min_run_time:
+			break
+		n_calls*=2
+	times=[run_time]
+	for i_repeat in xrange(1,repeats):
+		t_start=timeit.default_timer()
+		for i_call in xrange(0,n_calls):
+			function()
+		times.append(timeit.default_timer()-t_start)
+	return min(times)/n_calls
+
+
+def period(window):
+	ts_start=TS_MIDNIGHT-(window//2)*60
+	return ts_start,ts_start+(window-1)*60
+
+
+class bench_fleet():
+
+	#~ synthetic fleets, one per gap density, covering the longest analyzed period and its reference days.
+	#~ Input files are written on demand into the working directory and reused
+	
+	def __init__(self,directory,seed,n_cabinets,input_format):
+		self.directory=directory
+		self.seed=seed
+		self.n_cabinets=n_cabinets
+		self.input_format=input_format
+		max_window=max(AXES[0][1])
+		max_ref_days=max(AXES[1][1])
+		self.ts_first=period(max_window)[0]-max_ref_days*fleet_generator.SECONDS_PER_DAY
+		self.n_points=(period(max_window)[1]-self.ts_first)//60+1
+		self.fleets=dict()
+		self.written=set()
+
+
+	def cabinets(self,gap_density):
+		if gap_density not in self.fleets:
+			self.fleets[gap_density]=fleet_generator.fleet(self.seed,self.n_cabinets,self.ts_first,self.n_points,gap_density)
+		return self.fleets[gap_density]
+
+
+	def slice(self,gap_density,i_cabinet,point):
+		#~ data and reference data (oldest first) of a cabinet for the period of point, as given to alarm_detector.run
+		series,description=self.cabinets(gap_density)[i_cabinet]
+		ts_start,ts_end=period(point["window"])
+		n_data_points=point["window"]
+		i_start=(ts_start-self.ts_first)//60
+		arrays=dict()
+		for channel,values in series.iteritems():
+			ref_data=None
+			if point["ref_days"]>0:
+				ref_data=numpy.array([values[i_start-i_ref_day*fleet_generator.MINUTES_PER_DAY:][:n_data_points] for i_ref_day in xrange(point["ref_days"],0,-1)])
+			arrays[channel]=(values[i_start:i_start+n_data_points],ref_data)
+		return arrays,description
+
+
+	def files(self,i_cabinet,point):
+		#~ directory holding the input files of a cabinet for point, in the benchmark input format
+		series,description=self.cabinets(point["gap_density"])[i_cabinet]
+		if self.input_format=="rrd":
+			directory=os.path.join(self.directory,"rrd","g%s" %point["gap_density"],"cabinet%03d" %i_cabinet)
+			if directory not in self.written:
+				fleet_generator.write_rrd(series,directory,self.ts_first)
+		else:
+			#~ text files hold the period and the reference days of point only
+			directory=os.path.join(self.directory,"txt","w%d_rd%d_g%s" %(point["window"],point["ref_days"],point["gap_density"]),"cabinet%03d" %i_cabinet)
+			if directory not in self.written:
+				ts_start,ts_end=period(point["window"])
+				fleet_generator.write_text(series,directory,self.ts_first,ts_start,ts_end,point["ref_days"])
+		self.written.add(directory)
+		return directory
+
+
+def cli_arguments(fleet,i_cabinet,point):
+	series,description=fleet.cabinets(point["gap_density"])[i_cabinet]
+	directory=fleet.files(i_cabinet,point)
+	ts_start,ts_end=period(point["window"])
+	arguments=["-ts",str(ts_start),"-te",str(ts_end),"-rd",str(point["ref_days"]),"-at",str(point["avg_t"]),"-da",str(MIN_AVAIL),"-ra",str(MIN_AVAIL)]
+	extension="."+fleet.input_format
+	for i_phase,phase in enumerate(description["phases"]):
+		arguments+=["-p%d" %(i_phase+1),os.path.join(directory,"p%d%s" %(i_phase+1,extension)),
+			"-v%d" %(i_phase+1),os.path.join(directory,"v%d%s" %(i_phase+1,extension)),"-po%d" %(i_phase+1),str(phase["poff"])]
+	arguments+=["-e",os.path.join(directory,"e"+extension),"-c",os.path.join(directory,"c"+extension)]
+	if fleet.input_format=="txt":
+		arguments+=["-txt","-nc"]
+	return arguments
+
+
+def module_benchmarks(fleet,point,repeats):
+	#~ wall time of each processing module and of the reader on the first cabinet (three-phase), and of the whole
+	#~ in-memory analysis. Inputs are prepared outside the timed calls
+	arrays,description=fleet.slice(point["gap_density"],0,point)
+	cfg=alarm_detector.config(t_start=period(point["window"])[0],t_end=period(point["window"])[1],power_data_ph1="p1",
+		voltage_data_ph1="v1",power_data_ph2="p2",voltage_data_ph2="v2",power_data_ph3="p3",voltage_data_ph3="v3",
+		energy_data="e",cosphi_data="c",ref_days=point["ref_days"],avg_t=point["avg_t"],
+		data_min_avail=MIN_AVAIL,ref_min_avail=MIN_AVAIL)
+	phases=[(arrays["p%d" %(i_phase+1)],arrays["v%d" %(i_phase+1)],phase["poff"]) for i_phase,phase in enumerate(description["phases"])]
+	
+	def analyzer():
+		return processing.profile_analyzer.profile_analyzer(cfg.t_start,alarm_detector.SAMPLING_INT,cfg.delta_t,cfg.avg_t,cfg.anomaly_guard_dt,cfg.v_min,cfg.v_max)
+	
+	def analyze_profiles(profiles):
+		products=list()
+		for p,v,poff in profiles:
+			pa=analyzer()
+			pa.set_data(p,v,poff,False)
+			pa.estimate_availability()
+			p_avg,_,ctrl,_,_=pa.analyze_profile()
+			products.append((p_avg,ctrl))
+		return products
+	
+	results=dict()
+	results["profile_analyzer"]=best_time(lambda: analyze_profiles([(p[0],v[0],poff) for p,v,poff in phases]),repeats,MIN_RUN_TIME)
+	
+	if point["ref_days"]>0:
+		def merge():
+			return [processing.profile_merger.profile_merger(p[1],v[1],v[0]).merge() for p,v,poff in phases]
+		results["profile_merger"]=best_time(merge,repeats,MIN_RUN_TIME)
+		
+		data_products=analyze_profiles([(p[0],v[0],poff) for p,v,poff in phases])
+		ref_products=analyze_profiles([(ref_p,ref_v,poff) for (ref_p,ref_v,ref_availability),(p,v,poff) in zip(merge(),phases)])
+		def detect():
+			for (p_avg,ctrl),(ref_p_avg,ref_ctrl) in zip(data_products,ref_products):
+				ad=processing.anomaly_detector.anomaly_detector(cfg.t_start,alarm_detector.SAMPLING_INT,cfg.delta_t,
+					cfg.anomaly_abs_p_shift,cfg.anomaly_rel_p_shift/100.,cfg.anomaly_min_dt)
+				ad.set_data(p_avg,ctrl,ref_p_avg,ref_ctrl)
+				ad.detect()
+		results["anomaly_detector"]=best_time(detect,repeats,MIN_RUN_TIME)
+	
+	def energy():
+		ea=processing.energy_analyzer.energy_analyzer(cfg.data_min_avail/100.,cfg.ref_min_avail/100.,cfg.energy_rel_shift/100.)
+		ea.set_data(arrays["e"][0],arrays["e"][1])
+		ea.analyze()
+	results["energy_analyzer"]=best_time(energy,repeats,MIN_RUN_TIME)
+	
+	ctrl_data=[ctrl for p_avg,ctrl in analyze_profiles([(p[0],v[0],poff) for p,v,poff in phases])]
+	def cosphi():
+		ca=processing.cosphi_analyzer.cosphi_analyzer(alarm_detector.SAMPLING_INT,cfg.cosphi_min,cfg.cosphi_dt*60)
+		ca.set_data(arrays["c"][0],ctrl_data)
+		ca.analyze()
+	results["cosphi_analyzer"]=best_time(cosphi,repeats,MIN_RUN_TIME)
+	
+	results["run"]=best_time(lambda: alarm_detector.run(cfg,arrays=arrays),repeats,MIN_RUN_TIME)
+	
+	#~ reading all the channels of the cabinet from the input files, without the binary cache of text files
+	io_dr=importlib.import_module(alarm_detector.READERS[fleet.input_format][0])
+	directory=fleet.files(0,point)
+	def read():
+		dr=io_dr.data_reader(ts_start=cfg.t_start,ts_end=cfg.t_end,s_int=alarm_detector.SAMPLING_INT,n_ref_days=cfg.ref_days,err=list(),extra=cfg.rrd_function)
+		dr.USE_CACHE=False
+		for channel in arrays:
+			dr.read(os.path.join(directory,channel+"."+fleet.input_format))
+	results["reader_"+fleet.input_format]=best_time(read,repeats,MIN_RUN_TIME)
+	
+	return results
+
+
+def cli_benchmark(fleet,point,n_cabinets,repeats):
+	#~ wall time of running the alarm detector command line on n_cabinets cabinets, one after the other
+	arguments=[cli_arguments(fleet,i_cabinet,point) for i_cabinet in xrange(0,n_cabinets)]
+	program=os.path.join(ALARM_DETECTOR_DIR,"slightlimon_alarm-detector.py")
+	
+	def run_cli():
+		for cabinet_arguments in arguments:
+			output=subprocess.check_output([sys.executable,program]+cabinet_arguments)
+			if len(json.loads(output.splitlines()[-1])["errors"])>0:
+				raise RuntimeError("alarm detector errors: "+output)
+	return best_time(run_cli,repeats)
+
+
+def run_benchmarks(directory,seed,repeats,input_format,quick=False,log=None):
+	#~ runs all the benchmarks, returning the results as a dictionary mapping the benchmark names to seconds.
+	#~ Names are "<module|cli>/<benchmark>/<parameter>=<value>"
+	
+	axes=AXES
+	cabinets=CABINETS
+	if quick:
+		axes=[(name,(values[0],values[-1])) for name,values in AXES]
+		cabinets=CABINETS[:2]
+	
+	fleet=bench_fleet(directory,seed,max(cabinets),input_format)
+	results=dict()
+	measured=dict()
+	
+	def point_with(name,value):
+		point=dict(DEFAULT_POINT)
+		point[name]=value
+		return point
+	
+	for name,values in axes:
+		for value in values:
+			point=point_with(name,value)
+			key=tuple(sorted(point.items()))
+			if key not in measured:
+				module_results=module_benchmarks(fleet,point,repeats)
+				module_results["cli"]=cli_benchmark(fleet,point,1,repeats)
+				measured[key]=module_results
+			for benchmark,seconds in measured[key].iteritems():
+				group="cli" if benchmark=="cli" else "module"
+				results["%s/%s/%s=%s" %(group,("alarm_detector" if group=="cli" else benchmark),name,value)]=seconds
+			if log is not None:
+				log("%s=%s done" %(name,value))
+	
+	point=dict(DEFAULT_POINT)
+	for n_cabinets in cabinets:
+		results["cli/alarm_detector/cabinets=%d" %n_cabinets]=cli_benchmark(fleet,point,n_cabinets,repeats)
+		if log is not None:
+			log("cabinets=%d done" %n_cabinets)
+	
+	return results
+
+
+def compare(baseline,results,tolerance,min_seconds):
+	#~ benchmarks slower than in the baseline by more than tolerance (relative) and min_seconds (absolute), as
+	#~ (name, baseline seconds, seconds) tuples. Benchmarks missing from either side are ignored
+	regressions=list()
+	for name in sorted(set(baseline) & set(results)):
+		if results[name]>baseline[name]*(1+tolerance) and results[name]-baseline[name]>min_seconds:
+			regressions.append((name,baseline[name],results[name]))
+	return regressions
+
+
+def main(argv):
+
+	def parse_args():
+		parser=argparse.ArgumentParser(description='SLightliMon BENCHMARKS - Times the processing modules and the alarm detector command line on a synthetic fleet, scaling analyzed window, reference days, average interval, gap density and number of cabinets. Results are saved as JSON, and compared with a previous baseline to detect speed regressions.')
+		parser.add_argument('-o','--output',type=str,default='',help='JSON file the results are written to.')
+		parser.add_argument('-b','--baseline',type=str,default='',help='JSON file of previous results: benchmarks slower than there are reported, and the exit status is 1.')
+		parser.add_argument('-t','--tolerance',type=float,help='relative slowdown allowed with respect to the baseline [percent]. Default is 25.',default='25')
+		parser.add_argument('-ms','--min_slowdown',type=float,help='absolute slowdown below which differences are ignored as noise [milliseconds]. Default is 2.',default='2')
+		parser.add_argument('-r','--repeats',type=int,help='number of runs of each benchmark, of which the fastest is kept. Default is 3.',default='3')
+		parser.add_argument('-s','--seed',type=int,help='random seed of the synthetic fleet. Default is 1.',default='1')
+		parser.add_argument('-rrd','--rrd',dest='rrd',action='store_true',help='use RRD input files instead of text files (requires RRDTool).')
+		parser.add_argument('-w','--work_dir',type=str,default='',help='directory for the generated input files, kept after the run. Default is a temporary directory, removed at the end.')
+		parser.add_argument('-q','--quick',dest='quick',action='store_true',help='only the smallest and largest value of each parameter, and at most 4 cabinets.')
+		parser.set_defaults(rrd=False)
+		parser.set_defaults(quick=False)
+		return parser.parse_args(argv[1:])
+
+	args=parse_args()
+	if args.repeats<=0:
+		sys.exit("Number of repeats not valid")
+	
+	directory=args.work_dir
+	if directory=="":
+		directory=tempfile.mkdtemp(prefix="slightlimon-bench-")
+	input_format=("rrd" if args.rrd else "txt")
+	
+	def log(message):
+		sys.stderr.write(message+"\n")
+	
+	try:
+		results=run_benchmarks(directory,args.seed,args.repeats,input_format,args.quick,log)
+	finally:
+		if args.work_dir=="":
+			shutil.rmtree(directory,ignore_errors=True)
+	
+	output_json=dict()
+	output_json["version"]=FORMAT_VERSION
+	output_json["environment"]={"python":platform.python_version(),"numpy":numpy.__version__,"platform":platform.platform(),
+		"machine":platform.machine(),"processor":platform.processor()}
+	output_json["settings"]={"seed":args.seed,"repeats":args.repeats,"input_format":input_format,"quick":args.quick}
+	output_json["results"]=results
+	
+	if args.output!="":
+		with open(args.output,"w") as output_file:
+			json.dump(output_json,output_file,indent=1,sort_keys=True)
+	
+	regressions=list()
+	if args.baseline!="":
+		with open(args.baseline) as baseline_file:
+			baseline=json.load(baseline_file)
+		if baseline.get("settings",{}).get("input_format")!=input_format:
+			log("Warning: baseline measured with a different input format")
+		regressions=compare(baseline["results"],results,args.tolerance/100.,args.min_slowdown/1000.)
+		for name,baseline_seconds,seconds in regressions:
+			print "REGRESSION %s: %.4f s -> %.4f s (%+.0f%%)" %(name,baseline_seconds,seconds,100.*(seconds/baseline_seconds-1))
+	
+	if args.output=="":
+		print json.dumps(output_json,indent=1,sort_keys=True)
+	
+	if len(regressions)>0:
+		sys.exit(1)
+
+
+
+
+if __name__ == "__main__":
+	main(sys.argv)
@@ -0,0 +1,172 @@
+#   Copyright 2015 Adamo Ferro
+#
+#   This file is part of SLightliMon.
+#
+#   SLightliMon is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   SLightliMon is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import mmap
+import warnings
+import numpy
+import data_io.seek_index
+
+
+class data_reader():
+
+	SECONDS_PER_DAY=24*60*60
+	ERROR_MESSAGE_DATA="Error while reading data"
+	ERROR_MESSAGE_REF_DATA="Error while reading reference data"
+
+	def __init__(self,filename=None,ts_start=0,ts_end=0,s_int=0,n_ref_days=0,err=None,extra="",dtype=numpy.float64):
+		self.filename=filename
+		self.ts_start=ts_start
+		self.ts_end=ts_end
+		self.sampling_int=s_int
+		self.errors=err
+		self.n_data_points=int((self.ts_end-self.ts_start)/60/self.sampling_int)+1
+		self.set_n_ref_days(n_ref_days)
+		self.dtype=dtype
+
+		#~ data are returned as float arrays with NaN for no data values: data has one value per data point,
+		#~ ref_data has one row per reference day
+		self.data=None
+		self.ref_data=None
+
+		#~ number of windows read from the files
+		self.n_fetches=0
+
+		self.DEBUG=False
+
+
+	def set_n_ref_days(self,n_ref_days):
+		self.n_ref_days=n_ref_days
+		self.start_ref_ts=self.ts_start-(self.n_ref_days)*self.SECONDS_PER_DAY
+
+
+	def last_update(self,fn,ds=""):
+		#~ timestamp of the last complete row of the file, that is of its last sample, or None if there are none.
+		#~ The file is read backwards from its end until a row is found
+		db_filename=self.filename
+		if fn!="":
+			db_filename=fn
+		with open(db_filename,'rb') as text_file:
+			text_file.seek(0,os.SEEK_END)
+			size=text_file.tell()
+			tail_size=4096
+			while True:
+				i_start=max(size-tail_size,0)
+				text_file.seek(i_start)
+				lines=text_file.read(size-i_start).split("\n")
+				#~ the first line may be incomplete, as the last one if not ended by a newline
+				for line in reversed(lines[(1 if i_start>0 else 0):-1]):
+					try:
+						return float(line.split(",",1)[0])
+					except ValueError:
+						pass
+				if i_start==0:
+					return None
+				tail_size*=2
+
+
+	def read(self,fn,ds=""):
+
+		#~ files contain one "timestamp,value" row per line, sorted by timestamp. ds is not used
+		db_filename=self.filename
+		if fn!="":
+			db_filename=fn
+
+		self.data=None
+		self.ref_data=None
+
+		#~ the rows of the current period and of each reference day are located through the persisted index of the file,
+		#~ so that only their windows are read
+		try:
+			with open(db_filename,'rb') as text_file:
+				text=mmap.mmap(text_file.fileno(),0,access=mmap.ACCESS_READ)
+		except:
+			self.errors.append(self.ERROR_MESSAGE_DATA)
+			return
+
+		try:
+			index=data_io.seek_index.seek_index(db_filename)
+			index.DEBUG=self.DEBUG
+			index.update(text)
+
+			try:
+				self.data=self.window(text,index,self.ts_start)
+			except:
+				self.errors.append(self.ERROR_MESSAGE_DATA)
+			else:
+				if self.n_ref_days>0:
+					try:
+						self.ref_data=numpy.empty((self.n_ref_days,self.n_data_points),dtype=self.dtype)
+						for i_ref_day in xrange(0,self.n_ref_days):
+							self.ref_data[i_ref_day]=self.window(text,index,self.start_ref_ts+self.SECONDS_PER_DAY*i_ref_day)
+
+						if self.DEBUG:
+							print "# reference profiles:		",len(self.ref_data)
+					except:
+						self.ref_data=None
+						self.errors.append(self.ERROR_MESSAGE_REF_DATA)
+		finally:
+			text.close()
+
+
+	def window(self,text,index,ts_start):
+		#~ values of the n_data_points data points starting from ts_start. Each row is assigned to the data point
+		#~ nearest to its timestamp; data points without rows are NaN
+
+		step=self.sampling_int*60
+		offset_start,offset_end=index.window(ts_start-step/2.,ts_start+(self.n_data_points-1)*step+step/2.,len(text))
+		self.n_fetches+=1
+		ts,values=self.parse(text[offset_start:offset_end])
+
+		i_point=numpy.floor((ts-ts_start)/step+0.5).astype(numpy.int64)
+		in_window=(i_point>=0) & (i_point<self.n_data_points)
+
+		data=numpy.empty(self.n_data_points,dtype=self.dtype)
+		data.fill(numpy.nan)
+		data[i_point[in_window]]=values[in_window]
+		return data
+
+
+	def parse(self,text):
+		#~ converts "timestamp,value" rows into timestamp and value arrays. Rows are converted in bulk,
+		#~ falling back to one row at a time if some of them are not numeric (header, empty values)
+
+		lines=text.splitlines()
+		with warnings.catch_warnings():
+			warnings.simplefilter("ignore",DeprecationWarning)
+			try:
+				rows=numpy.fromstring(text.replace(","," "),dtype=numpy.float64,sep=" ")
+			except ValueError:
+				rows=numpy.empty(0)
+		if len(rows)==2*len(lines):
+			return rows[0::2],rows[1::2]
+
+		ts=list()
+		values=list()
+		for line in lines:
+			fields=line.split(",")
+			try:
+				ts_line=float(fields[0])
+			except ValueError:
+				continue
+			try:
+				values.append(float(fields[1]))
+			except (ValueError,IndexError):
+				values.append(numpy.nan)
+			ts.append(ts_line)
+		return numpy.array(ts,dtype=numpy.float64),numpy.array(values,dtype=numpy.float64)
@@ -0,0 +1,88 @@
+#   Copyright 2015 Adamo Ferro
+#
+#   This file is part of SLightliMon.
+#
+#   SLightliMon is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   SLightliMon is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy
+
+
+class data_reader():
+
+	ERROR_MESSAGE_DATA="Error while reading data"
+	ERROR_MESSAGE_DATA_LENGTH="Input data length shorter than expected"
+	ERROR_MESSAGE_REF_DATA="Error while reading reference data"
+
+	def __init__(self,filename=None,ts_start=0,ts_end=0,s_int=0,n_ref_days=0,err=None,extra=None,dtype=numpy.float64):
+		self.filename=filename
+		self.ts_start=ts_start
+		self.ts_end=ts_end
+		self.sampling_int=s_int
+		self.errors=err
+		self.n_data_points=int((self.ts_end-self.ts_start)/60/self.sampling_int)+1
+		self.n_ref_days=n_ref_days
+		self.dtype=dtype
+
+		#~ arrays already in memory, as a dictionary mapping channel names to (data, ref_data) pairs
+		self.arrays=extra
+
+		#~ data are returned as float arrays with NaN for no data values: data has one value per data point,
+		#~ ref_data has one row per reference day
+		self.data=None
+		self.ref_data=None
+
+		#~ data are never fetched from a data source
+		self.n_fetches=0
+
+		self.DEBUG=False
+
+
+	def set_n_ref_days(self,n_ref_days):
+		self.n_ref_days=n_ref_days
+
+
+	def read(self,fn,ds=""):
+
+		#~ the channel is named by ds or, if not given, by fn
+		channel=ds
+		if channel=="":
+			channel=fn
+
+		self.data=None
+		self.ref_data=None
+
+		#~ arrays are used without copying if they already have the requested type. Reference days are the most recent ones
+		#~ if more than needed are given
+		try:
+			data,ref_data=self.arrays[channel]
+			data=numpy.asarray(data,dtype=self.dtype)
+		except:
+			self.errors.append(self.ERROR_MESSAGE_DATA)
+			return
+
+		if data.ndim!=1 or len(data)<self.n_data_points:
+			self.errors.append(self.ERROR_MESSAGE_DATA_LENGTH)
+			return
+		self.data=data[:self.n_data_points]
+
+		if self.n_ref_days>0:
+			try:
+				ref_data=numpy.asarray(ref_data,dtype=self.dtype)
+				if ref_data.ndim!=2 or ref_data.shape[0]<self.n_ref_days or ref_data.shape[1]<self.n_data_points:
+					raise ValueError("reference data shape")
+				self.ref_data=ref_data[-self.n_ref_days:,:self.n_data_points]
+			except:
+				self.ref_data=None
+				self.errors.append(self.ERROR_MESSAGE_REF_DATA)
@@ -0,0 +1,176 @@
+#   Copyright 2015 Adamo Ferro
+#
+#   This file is part of SLightliMon.
+#
+#   SLightliMon is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   SLightliMon is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
+
+
+import threading
+import rrdtool
+import numpy
+
+
+#~ the RRDTool library is not guaranteed to be thread-safe: fetches from different threads are serialized
+FETCH_LOCK=threading.Lock()
+
+
+class data_reader():	
+	
+	SECONDS_PER_DAY=24*60*60
+	ERROR_MESSAGE_DATA="Error while reading data"
+	ERROR_MESSAGE_REF_DATA="Error while reading reference data"
+	ERROR_MESSAGE_DS="Data source not found"
+	
+	def __init__(self,filename=None,ts_start=0,ts_end=0,s_int=0,n_ref_days=0,err=None,extra="",dtype=numpy.float64):
+		self.filename=filename
+		self.ts_start=ts_start
+		self.ts_end=ts_end
+		self.sampling_int=s_int
+		self.errors=err
+		self.rrd_function=extra
+		self.n_data_points=int((self.ts_end-self.ts_start)/60/self.sampling_int)+1
+		self.set_n_ref_days(n_ref_days)
+		self.dtype=dtype
+						
+		#~ data are returned as float arrays with NaN for no data values: data has one value per data point,
+		#~ ref_data has one row per reference day
+		self.data=None
+		self.ref_data=None
+		
+		#~ last fetched span: (filename, start, end, buffer, first row timestamp, step, data source names)
+		self.fetched=None
+		
+		#~ number of fetches from the RRD files
+		self.n_fetches=0
+		
+		self.DEBUG=False
+
+	
+	def set_n_ref_days(self,n_ref_days):
+		self.n_ref_days=n_ref_days
+		self.start_ref_ts=self.ts_start-(self.n_ref_days)*self.SECONDS_PER_DAY
+		self.end_ref_ts=self.ts_end-self.SECONDS_PER_DAY				
+
+
+	def last_update(self,fn,ds=""):
+		#~ timestamp of the last update of the file, that is of its last sample
+		db_filename=self.filename
+		if fn!="":
+			db_filename=fn
+		with FETCH_LOCK:
+			return rrdtool.last(db_filename)
+
+
+	def fetch(self,db_filename,ts_start,ts_end):
+		#~ fetches data between ts_start and ts_end as a float array with one row per data point and one column per data source.
+		#~ Returns also the timestamp of the first row, the time step between rows and the data source names.
+		#~ The last fetched span is kept, so that all the data sources of a file are read with a single fetch
+		
+		if self.fetched is not None:
+			fetched_filename,fetched_start,fetched_end,buffer,first_ts,step,ds_names=self.fetched
+			if fetched_filename==db_filename and ((fetched_start,fetched_end)==(ts_start,ts_end) or
+				(fetched_start<=ts_start and ts_end<=fetched_end and step==self.sampling_int*60)):
+				return buffer,first_ts,step,ds_names
+		
+		#~ -60 because RRDTool returns the next value wrt what asked
+		with FETCH_LOCK:
+			(fetch_start,fetch_end,fetch_step),ds_names,rows=rrdtool.fetch(db_filename, self.rrd_function, '-s', "%s" %(ts_start-60), '-e', '%s' %(ts_end-60) )
+		self.n_fetches+=1
+		buffer=numpy.array(rows,dtype=self.dtype).reshape(len(rows),len(ds_names))
+		
+		self.fetched=(db_filename,ts_start,ts_end,buffer,fetch_start+fetch_step,fetch_step,ds_names)
+		return buffer,fetch_start+fetch_step,fetch_step,ds_names
+
+
+	def data_source(self,buffer,ds_names,ds):
+		#~ column of the fetched buffer holding the data source named ds, or the first one if no name is given
+		if ds=="":
+			return buffer[:,0]
+		if ds not in ds_names:
+			self.errors.append(self.ERROR_MESSAGE_DS+": "+ds)
+			raise KeyError(ds)
+		return buffer[:,list(ds_names).index(ds)]
+
+
+	def row_index(self,ts,first_ts,step):
+		#~ index of the fetched row corresponding to the data point at timestamp ts, that is the first
+		#~ row RRDTool would return if asked for data starting from ts (see fetch)
+		ts_fetch=ts-60
+		return (ts_fetch-ts_fetch%step+step-first_ts)//step
+
+
+	def window(self,buffer,i_start):
+		#~ view of the n_data_points rows of buffer starting from i_start
+		if i_start<0 or i_start+self.n_data_points>len(buffer):
+			raise IndexError("data window out of fetched data")
+		return buffer[i_start:i_start+self.n_data_points]
+
+
+	def read(self,fn,ds=""):
+		
+		#~ ds is the name of the data source to be read, when the file contains more than one
+		db_filename=self.filename
+		if fn!="":
+			db_filename=fn
+		
+		self.data=None
+		self.ref_data=None
+		
+		#~ current period and reference days are fetched at once, from the beginning of the first reference day
+		#~ to the end of the current period. Data and reference data are then views of this buffer
+		try:
+			buffer,first_ts,step,ds_names=self.fetch(db_filename,self.start_ref_ts,self.ts_end)
+			buffer=self.data_source(buffer,ds_names,ds)
+			
+			if self.DEBUG:
+				print "Actual # data points:			",len(buffer)
+			
+			#~ if the fetched span is too long for the archive at full resolution, RRDTool returns consolidated data:
+			#~ in this case the current period is fetched separately, as reference days are (see below)
+			single_fetch=(step==self.sampling_int*60 or self.n_ref_days==0)
+			if not single_fetch:
+				buffer,first_ts,step,ds_names=self.fetch(db_filename,self.ts_start,self.ts_end)
+				buffer=self.data_source(buffer,ds_names,ds)
+			
+			self.data=self.window(buffer,self.row_index(self.ts_start,first_ts,step))
+		except:
+			self.errors.append(self.ERROR_MESSAGE_DATA)
+		else:
+			if self.n_ref_days>0:
+				try:
+					if single_fetch:
+						
+						#~ reference days are equally spaced in the buffer, so they are seen as a (n_ref_days x n_data_points)
+						#~ array without copying. Windows overlap if the analyzed period is longer than one day
+						i_ref_start=self.row_index(self.start_ref_ts,first_ts,step)
+						day_rows=self.SECONDS_PER_DAY//step
+						self.window(buffer,i_ref_start+day_rows*(self.n_ref_days-1))
+						self.ref_data=numpy.lib.stride_tricks.as_strided(self.window(buffer,i_ref_start),
+							shape=(self.n_ref_days,self.n_data_points),strides=(day_rows*buffer.strides[0],buffer.strides[0]),writeable=False)
+					else:
+						self.ref_data=numpy.empty((self.n_ref_days,self.n_data_points),dtype=self.dtype)
+						for i_ref_day in xrange(0,self.n_ref_days):
+							start_ref_ts_tmp=self.start_ref_ts+self.SECONDS_PER_DAY*i_ref_day
+							end_ref_ts_tmp=self.end_ref_ts-self.SECONDS_PER_DAY*(self.n_ref_days-1-i_ref_day)
+							
+							ref_buffer,ref_first_ts,ref_step,ds_names=self.fetch(db_filename,start_ref_ts_tmp,end_ref_ts_tmp)
+							self.ref_data[i_ref_day]=self.window(self.data_source(ref_buffer,ds_names,ds),0)
+						
+					if self.DEBUG:
+						print "# reference profiles:		",len(self.ref_data)
+				except:
+					self.ref_data=None
+					self.errors.append(self.ERROR_MESSAGE_REF_DATA)
+
+		
@@ -0,0 +1,163 @@
+#   Copyright 2015 Adamo Ferro
+#
+#   This file is part of SLightliMon.
+#
+#   SLightliMon is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   SLightliMon is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import sqlite3
+import numpy
+
+
+#~ samples are clustered by channel, cabinet and timestamp, so that the data of one channel in any period are read
+#~ with a single range scan of the primary key
+SCHEMA="""CREATE TABLE IF NOT EXISTS samples (
+	channel TEXT NOT NULL,
+	cabinet TEXT NOT NULL,
+	ts INTEGER NOT NULL,
+	value REAL,
+	PRIMARY KEY (channel, cabinet, ts)
+) WITHOUT ROWID"""
+
+
+def store(db_filename,cabinet,channel,ts,values):
+	#~ adds (or replaces) samples of a channel of a cabinet, creating the database if needed. NaN values are stored as NULL
+
+	connection=sqlite3.connect(db_filename)
+	try:
+		with connection:
+			connection.execute(SCHEMA)
+			connection.executemany("INSERT OR REPLACE INTO samples (channel,cabinet,ts,value) VALUES (?,?,?,?)",
+				((channel,cabinet,int(ts_i),(None if numpy.isnan(value_i) else float(value_i))) for ts_i,value_i in zip(ts,values)))
+	finally:
+		connection.close()
+
+
+class data_reader():
+
+	SECONDS_PER_DAY=24*60*60
+	ERROR_MESSAGE_DATA="Error while reading data"
+	ERROR_MESSAGE_REF_DATA="Error while reading reference data"
+	QUERY="SELECT ts,value FROM samples WHERE channel=? AND cabinet=? AND ts>=? AND ts<? ORDER BY ts"
+	QUERY_LAST="SELECT max(ts) FROM samples WHERE channel=? AND cabinet=?"
+
+	def __init__(self,filename=None,ts_start=0,ts_end=0,s_int=0,n_ref_days=0,err=None,extra="",dtype=numpy.float64):
+		self.filename=filename
+		self.ts_start=ts_start
+		self.ts_end=ts_end
+		self.sampling_int=s_int
+		self.errors=err
+		self.cabinet=extra
+		self.n_data_points=int((self.ts_end-self.ts_start)/60/self.sampling_int)+1
+		self.set_n_ref_days(n_ref_days)
+		self.dtype=dtype
+
+		#~ data are returned as float arrays with NaN for no data values: data has one value per data point,
+		#~ ref_data has one row per reference day
+		self.data=None
+		self.ref_data=None
+
+		#~ connection to the last read database, kept open for reading the other channels
+		self.db_filename=None
+		self.connection=None
+
+		#~ number of queries to the database
+		self.n_fetches=0
+
+		self.DEBUG=False
+
+
+	def set_n_ref_days(self,n_ref_days):
+		self.n_ref_days=n_ref_days
+		self.start_ref_ts=self.ts_start-(self.n_ref_days)*self.SECONDS_PER_DAY
+
+
+	def connect(self,db_filename):
+		if self.connection is None or self.db_filename!=db_filename:
+			if self.connection is not None:
+				self.connection.close()
+				self.connection=None
+
+			#~ sqlite3 would silently create a missing database
+			if not os.path.isfile(db_filename):
+				raise IOError("database not found: "+db_filename)
+			self.connection=sqlite3.connect(db_filename)
+			self.db_filename=db_filename
+		return self.connection
+
+
+	def last_update(self,fn,ds=""):
+		#~ timestamp of the last sample of channel ds, or None if there are none. The database is queried through a connection
+		#~ of its own, as connections cannot be shared with the thread reading the channels
+		db_filename=self.filename
+		if fn!="":
+			db_filename=fn
+		if not os.path.isfile(db_filename):
+			raise IOError("database not found: "+db_filename)
+		connection=sqlite3.connect(db_filename)
+		try:
+			return connection.execute(self.QUERY_LAST,(ds,self.cabinet)).fetchone()[0]
+		finally:
+			connection.close()
+
+
+	def read(self,fn,ds=""):
+
+		#~ fn is the database file, if not given when creating the reader, and ds the name of the channel to be read
+		db_filename=self.filename
+		if fn!="":
+			db_filename=fn
+		channel=ds
+
+		self.data=None
+		self.ref_data=None
+
+		#~ current period and reference days are read with one range query, from the beginning of the first reference day
+		#~ to the end of the current period. Each sample is assigned to the data point nearest to its timestamp.
+		#~ Data and reference data are then views of the same buffer
+		step=self.sampling_int*60
+		try:
+			self.n_fetches+=1
+			rows=numpy.array(self.connect(db_filename).execute(self.QUERY,(channel,self.cabinet,
+				self.start_ref_ts-step//2,self.ts_end+step-step//2)).fetchall(),dtype=numpy.float64).reshape(-1,2)
+
+			if self.DEBUG:
+				print "Actual # data points:			",len(rows)
+
+			n_buffer=(self.ts_end-self.start_ref_ts)//step+1
+			i_point=numpy.floor((rows[:,0]-self.start_ref_ts)/step+0.5).astype(numpy.int64)
+			in_buffer=(i_point>=0) & (i_point<n_buffer)
+			buffer=numpy.empty(n_buffer,dtype=self.dtype)
+			buffer.fill(numpy.nan)
+			buffer[i_point[in_buffer]]=rows[in_buffer,1]
+
+			i_start=(self.ts_start-self.start_ref_ts)//step
+			self.data=buffer[i_start:i_start+self.n_data_points]
+		except:
+			self.errors.append(self.ERROR_MESSAGE_DATA)
+		else:
+			if self.n_ref_days>0:
+				try:
+					#~ reference days are equally spaced in the buffer, so they are seen as a (n_ref_days x n_data_points)
+					#~ array without copying. Windows overlap if the analyzed period is longer than one day
+					day_points=self.SECONDS_PER_DAY//step
+					self.ref_data=numpy.lib.stride_tricks.as_strided(buffer,shape=(self.n_ref_days,self.n_data_points),
+						strides=(day_points*buffer.strides[0],buffer.strides[0]),writeable=False)
+
+					if self.DEBUG:
+						print "# reference profiles:		",len(self.ref_data)
+				except:
+					self.ref_data=None
+					self.errors.append(self.ERROR_MESSAGE_REF_DATA)
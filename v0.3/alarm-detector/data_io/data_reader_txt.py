@@ -0,0 +1,268 @@
+#   Copyright 2015 Adamo Ferro
+#
+#   This file is part of SLightliMon.
+#
+#   SLightliMon is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   SLightliMon is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
+
+
+import mmap
+import warnings
+import numpy
+import data_io.text_cache
+
+
+class data_reader():
+	
+	CHUNK_SIZE=1<<20		# bytes scanned at a time when looking for the end of the needed lines
+	ERROR_MESSAGE_DATA="Error while reading data"
+	ERROR_MESSAGE_DATA_LENGTH="Input data length shorter than expected"
+	ERROR_MESSAGE_DATA_CORRUPTED="Data contain non-numeric characters"
+	ERROR_MESSAGE_DS="Data source not found"
+	
+	#~ bytes separating the numbers of a line, and the lines
+	SEPARATORS=numpy.zeros(256,dtype=bool)
+	SEPARATORS[[ord(c) for c in " \t\r\n\v\f,"]]=True
+	
+	def __init__(self,filename=None,ts_start=0,ts_end=0,s_int=0,n_ref_days=0,err=None,extra="",dtype=numpy.float64):
+		self.filename=filename
+		self.ts_start=ts_start
+		self.ts_end=ts_end
+		self.sampling_int=s_int
+		self.errors=err
+		self.n_data_points=int((self.ts_end-self.ts_start)/60/self.sampling_int)+1
+		self.n_ref_days=n_ref_days
+		self.dtype=dtype
+		
+		#~ data are returned as float arrays with NaN for no data values: data has one value per data point,
+		#~ ref_data has one row per reference day. Both are views of the same buffer
+		self.data=None
+		self.ref_data=None
+		
+		#~ if set, converted values are kept in a binary cache next to each text file
+		self.USE_CACHE=True
+		
+		#~ last parsed multi-channel file: (filename, column names, values with one column per channel)
+		self.parsed=None
+		
+		#~ number of reads from the text files
+		self.n_fetches=0
+		
+		self.DEBUG=False
+		
+		
+	def set_n_ref_days(self,n_ref_days):
+		self.n_ref_days=n_ref_days
+		
+		
+	def read(self,fn,ds=""):
+		
+		#~ ds is the name of the channel to be read from a multi-channel file. If not given, the file contains one data series only
+		
+		db_filename=self.filename
+		if fn!="":
+			db_filename=fn
+		
+		self.data=None
+		self.ref_data=None
+		n_lines=self.n_data_points*(self.n_ref_days+1)
+		
+		try:
+			if ds=="":
+				values=self.read_values(db_filename,n_lines)
+			else:
+				values=self.read_channel(db_filename,n_lines,ds)
+		except:
+			self.errors.append(self.ERROR_MESSAGE_DATA)
+		else:
+			if values is not None:
+				#~ create data and reference data arrays
+				self.data=values[:self.n_data_points]
+				if self.n_ref_days>0:
+					self.ref_data=values[self.n_data_points:].reshape(self.n_ref_days,self.n_data_points)
+
+
+	def read_values(self,db_filename,n_lines):
+		#~ returns the values of the first n_lines lines of the file, or None after appending an error.
+		#~ If enabled, the values already converted in previous runs are taken from the binary cache,
+		#~ and only the lines not yet cached are read from the text file
+		
+		cache=None
+		cached_values=None
+		offset=0
+		if self.USE_CACHE:
+			cache=data_io.text_cache.text_cache(db_filename)
+			cache.DEBUG=self.DEBUG
+			cached_values=cache.load()
+			if cached_values is not None:
+				offset=cache.parsed_bytes
+				if len(cached_values)>=n_lines:
+					return numpy.asarray(cached_values[:n_lines],dtype=self.dtype)
+		
+		n_cached_values=0
+		if cached_values is not None:
+			n_cached_values=len(cached_values)
+		
+		#~ read only the needed lines of the text file
+		text=self.read_lines(db_filename,n_lines-n_cached_values,offset)
+		
+		#~ check the number of lines wrt the number of expected data points
+		if text is None:
+			self.errors.append(self.ERROR_MESSAGE_DATA_LENGTH)
+			return None
+		
+		#~ convert text into floating point numbers in bulk ('nan' is converted natively). Values are always converted
+		#~ and cached in double precision, whatever the precision of the returned ones
+		new_values,i_bad_line=self.parse(text,dtype=numpy.float64)
+		if new_values is None:
+			self.errors.append(self.ERROR_MESSAGE_DATA_CORRUPTED+": line %d" %(n_cached_values+i_bad_line+1))
+			return None
+		
+		if cache is not None:
+			#~ a last line without newline may be still being written, so it is not cached
+			n_complete_lines=text.count("\n")
+			cache.extend(new_values[:n_complete_lines],text[:text.rfind("\n")+1])
+		
+		if n_cached_values>0:
+			return numpy.concatenate((numpy.asarray(cached_values,dtype=self.dtype),numpy.asarray(new_values,dtype=self.dtype)))
+		return numpy.asarray(new_values,dtype=self.dtype)
+
+
+	def read_channel(self,db_filename,n_lines,ds):
+		#~ returns the values of channel ds in the first n_lines rows of a multi-channel file, or None after appending an error.
+		#~ The first line of the file names the columns, and each of the following rows holds all the channels of one data point.
+		#~ The file is parsed once into a (rows x channels) array, and the other channels are then taken from it
+		
+		if (self.parsed is None or self.parsed[0]!=db_filename or len(self.parsed[2])<n_lines):
+			self.parsed=None
+			
+			text=self.read_lines(db_filename,n_lines+1)
+			if text is None:
+				self.errors.append(self.ERROR_MESSAGE_DATA_LENGTH)
+				return None
+			header,text=(text.split("\n",1)+[""])[:2]
+			names=header.replace(","," ").split()
+			
+			if len(names)==0:
+				self.errors.append(self.ERROR_MESSAGE_DATA_CORRUPTED+": line 1")
+				return None
+			#~ columns may be separated by commas or blanks
+			values,i_bad_line=self.parse(text,len(names))
+			if values is None:
+				self.errors.append(self.ERROR_MESSAGE_DATA_CORRUPTED+": line %d" %(i_bad_line+2))
+				return None
+			self.parsed=(db_filename,names,values.reshape(n_lines,len(names)))
+		
+		filename,names,values=self.parsed
+		if ds not in names:
+			self.errors.append(self.ERROR_MESSAGE_DS+": "+ds)
+			return None
+		return values[:n_lines,names.index(ds)]
+
+
+	def read_lines(self,db_filename,n_lines,offset=0):
+		#~ returns the text of n_lines lines of the file starting from byte offset, or None if the file is shorter.
+		#~ The file is memory mapped and scanned one chunk at a time, so that the rest of it is never read
+		
+		with open(db_filename,'rb') as text_file:
+			if n_lines<=0:
+				return ""
+			self.n_fetches+=1
+			try:
+				text=mmap.mmap(text_file.fileno(),0,access=mmap.ACCESS_READ)
+			except ValueError:		# empty file
+				return None
+			
+			try:
+				i_chunk=offset
+				n_lines_found=0
+				while i_chunk<len(text):
+					chunk=text[i_chunk:i_chunk+self.CHUNK_SIZE]
+					i_newlines=numpy.flatnonzero(numpy.frombuffer(chunk,dtype=numpy.uint8)==ord("\n"))
+					if n_lines_found+len(i_newlines)>=n_lines:
+						return text[offset:i_chunk+i_newlines[n_lines-n_lines_found-1]+1]
+					n_lines_found+=len(i_newlines)
+					i_chunk+=len(chunk)
+				
+				#~ the last line may not end with a newline
+				if n_lines_found+1==n_lines and len(text)>offset and text[-1:]!="\n":
+					return text[offset:]
+				return None
+			finally:
+				text.close()
+
+
+	def parse(self,text,n_columns=1,dtype=None):
+		#~ converts text with n_columns numbers per line, separated by commas or blanks, into a float array holding the values
+		#~ of all the lines in order. The array type is dtype, or the one of the reader if not given. Returns the array and None, or None and the index of the first malformed line of text.
+		#~ Numbers are converted in bulk with a comma as the only separator, so that conversion stops at the first number
+		#~ not entirely numeric instead of taking its numeric prefix. Since then each number is either converted whole or
+		#~ stops the conversion, the text is valid if all the numbers are converted and the last one is valid by itself.
+		#~ Lines are parsed one at a time only to find the malformed one
+		
+		if dtype is None:
+			dtype=self.dtype
+		n_lines=text.count("\n")
+		if len(text)>0 and text[-1]!="\n":
+			n_lines+=1
+		
+		if n_columns==1 and text.find(",")<0:
+			#~ one number per line: blanks within a line stop the conversion as well
+			numbers=text.replace("\n",",")
+			last_number=text[text.rstrip().rfind("\n")+1:]
+		else:
+			#~ each line must hold n_columns numbers
+			text_bytes=numpy.frombuffer(text,dtype=numpy.uint8)
+			is_separator=self.SEPARATORS[text_bytes]
+			number_starts=~is_separator
+			number_starts[1:]&=is_separator[:-1]
+			i_line_ends=numpy.flatnonzero(text_bytes==ord("\n"))
+			if len(text)>0 and text[-1]!="\n":
+				i_line_ends=numpy.append(i_line_ends,len(text)-1)
+			n_numbers=numpy.cumsum(number_starts)[i_line_ends]
+			if numpy.any(numpy.diff(numpy.concatenate(([0],n_numbers)))!=n_columns):
+				return self.parse_lines(text,n_lines,n_columns,dtype)
+			numbers=text.replace(","," ").split()
+			last_number=(numbers[-1] if len(numbers)>0 else "")
+			numbers=",".join(numbers)
+		
+		with warnings.catch_warnings():
+			warnings.simplefilter("ignore",DeprecationWarning)
+			try:
+				values=numpy.fromstring(numbers,dtype=dtype,sep=",")
+			except ValueError:
+				values=numpy.empty(0,dtype=dtype)
+		
+		if len(values)==n_lines*n_columns:
+			try:
+				if n_lines>0:
+					float(last_number)
+				return values,None
+			except ValueError:
+				pass
+		return self.parse_lines(text,n_lines,n_columns,dtype)
+
+
+	def parse_lines(self,text,n_lines,n_columns,dtype):
+		#~ converts text one line at a time, as parse does
+		
+		values=numpy.empty(n_lines*n_columns,dtype=dtype)
+		for i_line,line in enumerate(text.split("\n")[:n_lines]):
+			numbers=line.replace(","," ").split()
+			if len(numbers)!=n_columns:
+				return None,i_line
+			try:
+				values[i_line*n_columns:(i_line+1)*n_columns]=[float(number) for number in numbers]
+			except ValueError:
+				return None,i_line
+		return values,None
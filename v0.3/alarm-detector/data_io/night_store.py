@@ -0,0 +1,111 @@
+#   Copyright 2015 Adamo Ferro
+#
+#   This file is part of SLightliMon.
+#
+#   SLightliMon is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   SLightliMon is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import json
+import urllib
+import hashlib
+import tempfile
+import numpy
+
+
+class night_store():
+
+	#~ Products of the analysis of each night of a power cabinet, kept in a directory between runs so that later runs take
+	#~ their reference days from it instead of reading them again. There is one .npz file for each channel and night:
+	#~   <directory>/<cabinet>/<channel>/<night start timestamp>_<parameters hash>.npz
+	#~ holding what later runs need of the night, depending on the channel (e.g. the data of phases, the energy offset).
+	#~ JSON products are kept as strings. Nights analyzed with different parameters have different hashes, so they are
+	#~ never mixed up
+
+	SECONDS_PER_DAY=24*60*60
+	SUFFIX=".npz"
+
+	def __init__(self,directory,cabinet,parameters):
+		self.directory=directory
+		self.cabinet=cabinet
+		self.parameters_hash=hashlib.sha1(repr(parameters)).hexdigest()[:16]
+		self.DEBUG=False
+
+
+	def filename(self,channel,ts_start):
+		#~ cabinet and channel names are quoted, so that any name (e.g. a file path) is a valid directory name
+		return os.path.join(self.directory,urllib.quote(self.cabinet,safe="") or "_",urllib.quote(channel,safe=""),
+			"%d_%s%s" %(ts_start,self.parameters_hash,self.SUFFIX))
+
+
+	def load(self,channel,ts_start,names=None):
+		#~ products of the night starting at ts_start, as a dictionary (only those in names, if given), or None if not stored
+		products=dict()
+		try:
+			with numpy.load(self.filename(channel,ts_start)) as archive:
+				for name in archive.files:
+					if names is None or name in names:
+						products[name]=archive[name]
+		except (IOError,OSError,ValueError):
+			return None
+		if names is not None and len(products)<len(names):
+			return None
+		for name,product in products.items():
+			if product.dtype.kind=="S":
+				products[name]=json.loads(str(product))
+		return products
+
+
+	def load_days(self,channel,ts_start,n_days,names):
+		#~ products of the n_days nights before the one starting at ts_start, oldest first, or None if any of them is not stored
+		days=list()
+		for i_day in xrange(n_days,0,-1):
+			products=self.load(channel,ts_start-i_day*self.SECONDS_PER_DAY,names)
+			if products is None:
+				if self.DEBUG:
+					print "Stored nights missing:		",channel
+				return None
+			days.append(products)
+		return days
+
+
+	def stack(self,days,name):
+		#~ array with one row per night of the product name of days
+		return numpy.array([products[name] for products in days])
+
+
+	def save(self,channel,ts_start,products):
+		#~ the file is written aside and then moved, so that concurrent runs never see a partial file
+		arrays=dict()
+		for name,product in products.iteritems():
+			if isinstance(product,dict):
+				product=numpy.array(json.dumps(product))
+			arrays[name]=product
+
+		filename=self.filename(channel,ts_start)
+		channel_dir=os.path.dirname(filename)
+		if not os.path.isdir(channel_dir):
+			try:
+				os.makedirs(channel_dir)
+			except OSError:
+				if not os.path.isdir(channel_dir):
+					raise
+		fd,tmp_filename=tempfile.mkstemp(dir=channel_dir,prefix=os.path.basename(filename)+".")
+		try:
+			with os.fdopen(fd,'wb') as night_file:
+				numpy.savez(night_file,**arrays)
+			os.rename(tmp_filename,filename)
+		except:
+			os.remove(tmp_filename)
+			raise
@@ -0,0 +1,111 @@
+#   Copyright 2015 Adamo Ferro
+#
+#   This file is part of SLightliMon.
+#
+#   SLightliMon is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   SLightliMon is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
+
+
+import threading
+import collections
+import Queue
+
+
+class prefetcher():
+
+	#~ Reads a list of channels with a data reader in a background thread, in the given order and at most depth channels ahead
+	#~ of their use, so that reading overlaps with the analysis of the channels already read.
+	#~ Each channel is given as (fn, ds, n_ref_days), fn and ds being the arguments of the reader read method.
+	#~ Reading errors are collected separately for each channel, and given back together with its data.
+	#~ If metrics (a processing.metrics.metrics object) are given, reads are timed and samples and fetches counted
+
+	def __init__(self,reader,reader_errors,channels,depth=2,metrics=None):
+		#~ reader_errors is the list the reader appends its errors to, used only by the reader thread
+		self.reader=reader
+		self.reader_errors=reader_errors
+		self.channels=channels
+		self.metrics=metrics
+		self.queue=Queue.Queue(depth)
+		self.stopped=False
+		self.i_next=0
+		self.fetched=collections.deque()
+
+		self.thread=threading.Thread(target=self.read_all)
+		self.thread.daemon=True
+		self.thread.start()
+
+
+	def read_all(self):
+		for fn,ds,n_ref_days in self.channels:
+			if self.stopped:
+				break
+			try:
+				n_fetches=self.reader.n_fetches
+				started=(self.metrics.start() if self.metrics is not None else None)
+				self.reader.set_n_ref_days(n_ref_days)
+				self.reader.read(fn,ds)
+			except Exception as e:
+				self.queue.put((None,None,e))
+				continue
+			if self.metrics is not None:
+				self.metrics.stop("read",started)
+				self.metrics.count("fetches",self.reader.n_fetches-n_fetches)
+				for data in (self.reader.data,self.reader.ref_data):
+					if data is not None:
+						self.metrics.count("samples_read",data.size)
+			errors=self.reader_errors[:]
+			del self.reader_errors[:]
+			self.queue.put((self.reader.data,self.reader.ref_data,errors))
+
+
+	def next(self,errors):
+		#~ data and reference data of the next channel. Its reading errors are appended to errors,
+		#~ while unexpected exceptions are raised again
+		data,ref_data,read_errors=self.get()
+		self.i_next+=1
+		if isinstance(read_errors,Exception):
+			raise read_errors
+		errors.extend(read_errors)
+		return data,ref_data
+
+
+	def skip_to(self,i_channel):
+		#~ discards the channels before the i_channel-th one, together with their errors
+		while self.i_next<i_channel:
+			self.get()
+			self.i_next+=1
+
+
+	def fetch_all(self):
+		#~ waits for all the channels not yet used to be read, and returns their data, reference data and errors
+		#~ (or exception), still to be used through next
+		while len(self.fetched)<len(self.channels)-self.i_next:
+			self.fetched.append(self.queue.get())
+		return list(self.fetched)
+
+
+	def get(self):
+		if len(self.fetched)>0:
+			return self.fetched.popleft()
+		return self.queue.get()
+
+
+	def close(self):
+		#~ stops reading the channels that are no more needed. The queue is emptied without waiting on it, since the
+		#~ reader thread may have already put its last channel
+		self.stopped=True
+		while self.thread.is_alive():
+			try:
+				self.queue.get_nowait()
+			except Queue.Empty:
+				self.thread.join(0.01)
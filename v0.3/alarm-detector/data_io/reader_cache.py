@@ -0,0 +1,131 @@
+#   Copyright 2015 Adamo Ferro
+#
+#   This file is part of SLightliMon.
+#
+#   SLightliMon is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   SLightliMon is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import threading
+import collections
+
+
+class reader_cache():
+
+	#~ Least recently used cache of the data and reference data read by data readers, shared by the threads of a process.
+	#~ Its size is limited by the total number of bytes of the cached arrays
+
+	def __init__(self,max_bytes):
+		self.max_bytes=max_bytes
+		self.n_bytes=0
+		self.entries=collections.OrderedDict()
+		self.lock=threading.Lock()
+
+		self.n_hits=0
+		self.n_misses=0
+
+
+	def get(self,key):
+		with self.lock:
+			entry=self.entries.pop(key,None)
+			if entry is None:
+				self.n_misses+=1
+				return None
+			self.entries[key]=entry
+			self.n_hits+=1
+			return entry
+
+
+	def put(self,key,data,ref_data):
+		#~ arrays are copied, so that they don't keep alive larger buffers they may be views of, and made read-only
+		data=data.copy()
+		data.flags.writeable=False
+		n_bytes=data.nbytes
+		if ref_data is not None:
+			ref_data=ref_data.copy()
+			ref_data.flags.writeable=False
+			n_bytes+=ref_data.nbytes
+		if n_bytes>self.max_bytes:
+			return
+
+		with self.lock:
+			old_entry=self.entries.pop(key,None)
+			if old_entry is not None:
+				self.n_bytes-=old_entry[2]
+			self.entries[key]=(data,ref_data,n_bytes)
+			self.n_bytes+=n_bytes
+			while self.n_bytes>self.max_bytes:
+				_,(_,_,old_n_bytes)=self.entries.popitem(last=False)
+				self.n_bytes-=old_n_bytes
+
+
+class cached_reader():
+
+	#~ Wraps a data reader, taking data and reference data from a reader_cache when the same channel of the same, unchanged,
+	#~ file has already been read for the same period. Only reads without errors are cached.
+	#~ extra is the extra parameter the reader was created with
+
+	def __init__(self,reader,cache,extra=""):
+		self.reader=reader
+		self.cache=cache
+		self.extra=extra
+		self.data=None
+		self.ref_data=None
+		self.n_fetches=reader.n_fetches
+		self.DEBUG=reader.DEBUG
+
+
+	def set_n_ref_days(self,n_ref_days):
+		self.reader.set_n_ref_days(n_ref_days)
+
+
+	def key(self,fn,ds):
+		db_filename=self.reader.filename
+		if fn!="":
+			db_filename=fn
+
+		#~ files are identified also by size and modification time, so that updated files are read again
+		db_stat=os.stat(db_filename)
+		return (self.reader.__module__,os.path.abspath(db_filename),db_stat.st_size,db_stat.st_mtime,ds,
+			self.reader.ts_start,self.reader.ts_end,self.reader.sampling_int,self.reader.n_ref_days,
+			self.extra,str(self.reader.dtype))
+
+
+	def last_update(self,fn,ds=""):
+		return self.reader.last_update(fn,ds)
+
+
+	def read(self,fn,ds=""):
+		try:
+			key=self.key(fn,ds)
+		except OSError:
+			key=None		# missing files are left to the reader, that reports the error
+
+		entry=None
+		if key is not None:
+			entry=self.cache.get(key)
+
+		if entry is not None:
+			self.data,self.ref_data,_=entry
+			if self.DEBUG:
+				print "Cached data:			",ds or fn
+			return
+
+		n_errors=len(self.reader.errors)
+		self.reader.read(fn,ds)
+		self.n_fetches=self.reader.n_fetches
+		self.data=self.reader.data
+		self.ref_data=self.reader.ref_data
+		if key is not None and self.data is not None and len(self.reader.errors)==n_errors:
+			self.cache.put(key,self.data,self.ref_data)
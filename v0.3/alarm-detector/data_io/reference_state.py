@@ -0,0 +1,66 @@
+#   Copyright 2015 Adamo Ferro
+#
+#   This file is part of SLightliMon.
+#
+#   SLightliMon is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   SLightliMon is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import tempfile
+import numpy
+
+
+#~ Reference states of the phases of a power cabinet (see processing.rolling_merger), kept in a file between runs.
+#~ The file is a numpy .npz archive with the arrays of each phase state named "<phase>_<array>", e.g. "0_keys".
+#~ States hold all the reference days, as the runs read them anyway: the whole file is written again by each update,
+#~ in time proportional to the number of reference days (see processing.rolling_merger)
+
+
+def load(filename):
+	#~ dictionary mapping phase indexes to their states. Missing or unreadable files give no states
+	states=dict()
+	try:
+		with numpy.load(filename) as archive:
+			for name in archive.files:
+				phase,array_name=name.split("_",1)
+				states.setdefault(int(phase),dict())[array_name]=archive[name]
+	except (IOError,OSError,ValueError):
+		return dict()
+	
+	#~ incomplete states are discarded
+	for phase,state in states.items():
+		if (sorted(state.keys())!=["days","keys","n_avail","n_zero_v","p","v"] or
+			not (state["p"].shape==state["v"].shape==state["keys"].shape==state["days"].shape) or
+			not (state["n_avail"].shape==state["n_zero_v"].shape==state["p"].shape[1:])):
+			del states[phase]
+	return states
+
+
+def save(filename,states):
+	#~ the file is written aside and then moved, so that concurrent runs never see a partial file
+	arrays=dict()
+	for phase,state in states.iteritems():
+		if state is not None:
+			for array_name,array in state.iteritems():
+				arrays["%d_%s" %(phase,array_name)]=array
+	
+	state_dir=os.path.dirname(os.path.abspath(filename))
+	fd,tmp_filename=tempfile.mkstemp(dir=state_dir,prefix=os.path.basename(filename)+".")
+	try:
+		with os.fdopen(fd,'wb') as state_file:
+			numpy.savez(state_file,**arrays)
+		os.rename(tmp_filename,filename)
+	except:
+		os.remove(tmp_filename)
+		raise
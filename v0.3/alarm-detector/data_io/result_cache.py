@@ -0,0 +1,148 @@
+#   Copyright 2015 Adamo Ferro
+#
+#   This file is part of SLightliMon.
+#
+#   SLightliMon is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   SLightliMon is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import json
+import hashlib
+import tempfile
+import numpy
+
+
+def key(parameters,inputs):
+	#~ key of a result, made of the analysis parameters and of the content of the inputs, given as a list of arrays (or None).
+	#~ Type, shape and bytes of each array are hashed
+	digest=hashlib.sha1(repr(parameters))
+	for array in inputs:
+		if array is None:
+			digest.update("None")
+		else:
+			array=numpy.ascontiguousarray(array)
+			digest.update("%s%r" %(array.dtype.str,array.shape))
+			digest.update(buffer(array))
+	return digest.hexdigest()
+
+
+def encode(value):
+	#~ JSON representation of value, keeping the types JSON does not have, so that cached outputs are given back as they were:
+	#~ tuples, and dictionary keys other than strings (e.g. phase numbers)
+	if isinstance(value,tuple):
+		return {"tuple":[encode(item) for item in value]}
+	if isinstance(value,list):
+		return [encode(item) for item in value]
+	if isinstance(value,dict):
+		if all(isinstance(name,basestring) for name in value):
+			return {"dict":dict((name,encode(item)) for name,item in value.iteritems())}
+		return {"items":[[encode(name),encode(item)] for name,item in value.iteritems()]}
+	return value
+
+
+def decode(value):
+	#~ value encoded by encode
+	if isinstance(value,list):
+		return [decode(item) for item in value]
+	if isinstance(value,dict):
+		(kind,content),=value.items()
+		if kind=="tuple":
+			return tuple(decode(item) for item in content)
+		if kind=="dict":
+			return dict((decode(name),decode(item)) for name,item in content.iteritems())
+		return dict((decode(name),decode(item)) for name,item in content)
+	if isinstance(value,unicode):
+		#~ strings were plain ASCII strings
+		try:
+			return str(value)
+		except UnicodeEncodeError:
+			pass
+	return value
+
+
+class result_cache():
+
+	#~ Outputs of the alarm detector kept in a directory, one JSON file per key. Its size is limited by the total size of
+	#~ the files: the least recently used ones are removed first, their use being tracked by their modification time.
+	#~ Outputs are kept with their types (see encode)
+
+	SUFFIX=".json"
+	VERSION=2
+
+	def __init__(self,directory,max_bytes):
+		self.directory=directory
+		self.max_bytes=max_bytes
+		self.DEBUG=False
+
+
+	def filename(self,key):
+		return os.path.join(self.directory,key+self.SUFFIX)
+
+
+	def get(self,key):
+		#~ cached output, or None if not cached
+		filename=self.filename(key)
+		try:
+			with open(filename,'rb') as result_file:
+				entry=json.load(result_file)
+			if entry.get("version")!=self.VERSION:
+				return None
+			output_json=decode(entry["output"])
+			os.utime(filename,None)
+		except (IOError,OSError,ValueError,KeyError,AttributeError):
+			return None
+		return output_json
+
+
+	def put(self,key,output_json):
+		#~ the file is written aside and then moved, so that concurrent runs never see a partial file
+		if not os.path.isdir(self.directory):
+			try:
+				os.makedirs(self.directory)
+			except OSError:
+				if not os.path.isdir(self.directory):
+					raise
+		fd,tmp_filename=tempfile.mkstemp(dir=self.directory,prefix=key+".")
+		try:
+			with os.fdopen(fd,'wb') as result_file:
+				json.dump({"version":self.VERSION,"output":encode(output_json)},result_file)
+			os.rename(tmp_filename,self.filename(key))
+		except:
+			os.remove(tmp_filename)
+			raise
+		self.evict()
+
+
+	def evict(self):
+		#~ removes the least recently used files, until the cache fits its size. Files removed meanwhile by concurrent
+		#~ runs are skipped
+		entries=list()
+		for name in os.listdir(self.directory):
+			if name.endswith(self.SUFFIX):
+				try:
+					entry_stat=os.stat(os.path.join(self.directory,name))
+				except OSError:
+					continue
+				entries.append((entry_stat.st_mtime,entry_stat.st_size,name))
+		n_bytes=sum(entry_size for _,entry_size,_ in entries)
+		for _,entry_size,name in sorted(entries):
+			if n_bytes<=self.max_bytes:
+				break
+			try:
+				os.remove(os.path.join(self.directory,name))
+			except OSError:
+				pass
+			n_bytes-=entry_size
+			if self.DEBUG:
+				print "Evicted result:			",name
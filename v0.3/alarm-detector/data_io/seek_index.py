@@ -0,0 +1,185 @@
+#   Copyright 2015 Adamo Ferro
+#
+#   This file is part of SLightliMon.
+#
+#   SLightliMon is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   SLightliMon is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import struct
+import tempfile
+import zlib
+import numpy
+import data_io.text_cache
+
+
+class seek_index():
+
+	#~ Persisted index of a text file with one "timestamp,..." row per line, sorted by timestamp.
+	#~ One row every STRIDE lines is indexed with its timestamp and byte offset, so that the rows of any time window
+	#~ are found with a binary search and read with a single seek. The index is kept in a sidecar file made of
+	#~ a fixed size header followed by the entries:
+	#~   magic, version, source size, source mtime, indexed source bytes, indexed lines, stride, number of entries,
+	#~   size and checksum of the head of the source file, start and checksum of the tail of its indexed part.
+	#~ Lines appended to the source file are indexed incrementally, once the checksums tell that its head and the last indexed
+	#~ lines are unchanged. As for the text cache, only these bounded parts are read, and never the whole indexed part.
+
+	SUFFIX=".idx"
+	MAGIC="SLMI"
+	VERSION=3
+	HEADER_FORMAT="<4sIqdqqqqIIqI"
+	HEADER_SIZE=128
+	ENTRY_DTYPE=numpy.dtype([('ts','<f8'),('offset','<i8')])
+	STRIDE=1024
+	CHUNK_SIZE=1<<20		# bytes scanned at a time when indexing
+
+	def __init__(self,source_filename):
+		self.source_filename=source_filename
+		self.filename=source_filename+self.SUFFIX
+
+		self.source_stat=None
+		self.indexed_bytes=0
+		self.n_lines=0
+		self.entries=numpy.empty(0,dtype=self.ENTRY_DTYPE)
+
+		self.DEBUG=False
+
+
+	def update(self,text):
+		#~ loads the index of the source file, whose content is given as text, indexing the lines not indexed yet.
+		#~ The updated index is saved, unless it was already up to date
+
+		self.source_stat=os.stat(self.source_filename)
+		if not self.load():
+			self.indexed_bytes=0
+			self.n_lines=0
+			self.entries=numpy.empty(0,dtype=self.ENTRY_DTYPE)
+
+		if self.indexed_bytes<len(text) and self.scan(text):
+			try:
+				self.save(text)
+			except (IOError,OSError):
+				if self.DEBUG:
+					print "seek index: cannot write", self.filename
+
+
+	def window(self,ts_start,ts_end,text_size):
+		#~ byte range of the source file holding all the rows with ts_start<=timestamp<=ts_end (and a few more)
+
+		i_start=numpy.searchsorted(self.entries['ts'],ts_start,side='right')-1
+		i_end=numpy.searchsorted(self.entries['ts'],ts_end,side='right')
+
+		offset_start=0
+		if i_start>=0:
+			offset_start=int(self.entries['offset'][i_start])
+		offset_end=text_size
+		if i_end<len(self.entries):
+			offset_end=int(self.entries['offset'][i_end])
+		return offset_start,offset_end
+
+
+	def scan(self,text):
+		#~ indexes the complete lines following the already indexed ones. Returns True if new lines were found
+
+		n_lines=self.n_lines
+		new_entries=list()
+		i_chunk=self.indexed_bytes
+		while i_chunk<len(text):
+			chunk=text[i_chunk:i_chunk+self.CHUNK_SIZE]
+			i_newlines=numpy.flatnonzero(numpy.frombuffer(chunk,dtype=numpy.uint8)==ord("\n"))
+			if len(i_newlines)>0:
+
+				#~ start of the lines ended in this chunk, and their numbers
+				line_starts=numpy.concatenate(([self.indexed_bytes],i_chunk+i_newlines[:-1]+1))
+				line_numbers=self.n_lines+numpy.arange(len(line_starts))
+				for line_start in line_starts[line_numbers%self.STRIDE==0]:
+					ts=self.timestamp(text,line_start)
+					if ts is not None:
+						new_entries.append((ts,line_start))
+
+				self.n_lines+=len(i_newlines)
+				self.indexed_bytes=i_chunk+int(i_newlines[-1])+1
+			i_chunk+=len(chunk)
+
+		if self.n_lines==n_lines:
+			return False
+		self.entries=numpy.concatenate((self.entries,numpy.array(new_entries,dtype=self.ENTRY_DTYPE)))
+		return True
+
+
+	def timestamp(self,text,line_start):
+		#~ timestamp of the line starting at line_start, or None if not numeric (e.g., a header line)
+		line=text[line_start:text.find("\n",line_start)]
+		try:
+			return float(line.split(",",1)[0])
+		except ValueError:
+			return None
+
+
+	def load(self):
+		#~ loads the index, returning False if it does not exist or is stale
+
+		try:
+			with open(self.filename,'rb') as index_file:
+				header=index_file.read(self.HEADER_SIZE)
+				if len(header)<self.HEADER_SIZE:
+					return False
+				(magic,version,source_size,source_mtime,indexed_bytes,n_lines,stride,n_entries,
+					head_bytes,head_crc,tail_start,tail_crc)=struct.unpack_from(self.HEADER_FORMAT,header)
+				if magic!=self.MAGIC or version!=self.VERSION or stride!=self.STRIDE:
+					return False
+
+				if source_size!=self.source_stat.st_size or source_mtime!=self.source_stat.st_mtime:
+					#~ the source file changed: the index is still valid only if it has grown and its indexed part is unchanged
+					if (self.source_stat.st_size<=source_size or self.source_stat.st_size<indexed_bytes or
+						not data_io.text_cache.only_appended(self.source_filename,head_bytes,head_crc,tail_start,indexed_bytes,
+							tail_crc)):
+						if self.DEBUG:
+							print "seek index: stale index for", self.source_filename
+						return False
+
+				entries=numpy.fromstring(index_file.read(n_entries*self.ENTRY_DTYPE.itemsize),dtype=self.ENTRY_DTYPE)
+				if len(entries)!=n_entries:
+					return False
+
+		except (IOError,OSError,ValueError,struct.error):
+			return False
+
+		self.indexed_bytes=indexed_bytes
+		self.n_lines=n_lines
+		self.entries=entries
+		return True
+
+
+	def save(self,text):
+
+		#~ the checksums are computed on the indexed text itself, so that they always match the entries
+		head_bytes=min(self.indexed_bytes,data_io.text_cache.CHECK_SIZE)
+		tail_start=max(self.indexed_bytes-data_io.text_cache.CHECK_SIZE,0)
+		header=struct.pack(self.HEADER_FORMAT,self.MAGIC,self.VERSION,self.source_stat.st_size,self.source_stat.st_mtime,
+			self.indexed_bytes,self.n_lines,self.STRIDE,len(self.entries),
+			head_bytes,zlib.crc32(text[:head_bytes]) & 0xffffffff,
+			tail_start,zlib.crc32(text[tail_start:self.indexed_bytes]) & 0xffffffff)
+
+		#~ the index is small: it is always rewritten aside and then moved, so that concurrent runs never see a partial file
+		index_dir=os.path.dirname(os.path.abspath(self.filename))
+		fd,tmp_filename=tempfile.mkstemp(dir=index_dir,prefix=os.path.basename(self.filename)+".")
+		try:
+			with os.fdopen(fd,'wb') as index_file:
+				index_file.write(header.ljust(self.HEADER_SIZE,"\0"))
+				index_file.write(self.entries.tostring())
+			os.rename(tmp_filename,self.filename)
+		except:
+			os.remove(tmp_filename)
+			raise
@@ -0,0 +1,206 @@
+#   Copyright 2015 Adamo Ferro
+#
+#   This file is part of SLightliMon.
+#
+#   SLightliMon is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   SLightliMon is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import struct
+import zlib
+import fcntl
+import tempfile
+import numpy
+
+
+CHECK_SIZE=64*1024		# bytes checked at the start of the source file and at the end of its processed part
+
+
+def checksum(filename,offset,n_bytes):
+	#~ checksum of n_bytes of a file starting from byte offset, or None if the file is shorter
+	
+	with open(filename,'rb') as source_file:
+		source_file.seek(offset)
+		data=source_file.read(n_bytes)
+	if len(data)!=n_bytes:
+		return None
+	return zlib.crc32(data) & 0xffffffff
+
+
+def tail_checksum(tail_start,tail_crc,text_start,text):
+	#~ start and checksum of the tail checked in a processed file, once text, starting at byte text_start, has been
+	#~ processed after the tail starting at tail_start. The checksum is extended as long as the tail is not longer than
+	#~ CHECK_SIZE, and is otherwise started again from the last bytes of text
+	
+	text_end=text_start+len(text)
+	if text_end-tail_start<=CHECK_SIZE:
+		return tail_start,zlib.crc32(text,tail_crc) & 0xffffffff
+	if len(text)>CHECK_SIZE:
+		return text_end-CHECK_SIZE,zlib.crc32(text[-CHECK_SIZE:]) & 0xffffffff
+	return text_start,zlib.crc32(text) & 0xffffffff
+
+
+def only_appended(filename,head_bytes,head_crc,tail_start,tail_end,tail_crc):
+	#~ tells whether a grown file still begins with the same head_bytes bytes and holds the same tail, ending at the end of
+	#~ its already processed part (the boundary line included), that is whether it has only been appended.
+	#~ Only these bounded parts are read, so that growing files are checked in constant time: edits in the middle of the
+	#~ processed part of a file that also grew are not detected
+	
+	return (checksum(filename,0,head_bytes)==head_crc and
+		checksum(filename,tail_start,tail_end-tail_start)==tail_crc)
+
+
+class text_cache():
+
+	#~ Binary sidecar of a text data file, holding the values of its first lines already converted to float64.
+	#~ Values are always cached in double precision, also when read in single precision, so that they never depend on
+	#~ the precision of the run that cached them.
+	#~ The sidecar is made of a fixed size header followed by the raw values:
+	#~   magic, version, source size, source mtime, parsed source bytes, number of values,
+	#~   size and checksum of the head of the source file, start and checksum of the tail of its parsed part.
+	#~ The cache is used as it is if size and mtime of the source file are unchanged. If the source file has grown, the
+	#~ cache is kept only if its head and the tail of its parsed part are unchanged, that is if the file has been appended.
+
+	SUFFIX=".cache"
+	MAGIC="SLMC"
+	VERSION=4
+	HEADER_FORMAT="<4sIqdqqIIqI"
+	HEADER_SIZE=64
+
+	def __init__(self,source_filename):
+		self.source_filename=source_filename
+		self.filename=source_filename+self.SUFFIX
+
+		#~ state of the source file and of its cached part
+		self.source_stat=None
+		self.parsed_bytes=0
+		self.head_bytes=0
+		self.head_crc=0
+		self.tail_start=0
+		self.tail_crc=0
+		self.values=None
+
+		self.DEBUG=False
+
+
+	def load(self):
+		#~ returns the cached values as a read-only memory mapped array, or None if the cache does not exist or is stale
+
+		self.source_stat=os.stat(self.source_filename)
+		self.parsed_bytes=0
+		self.values=None
+
+		try:
+			with open(self.filename,'rb') as cache_file:
+				header=self.unpack_header(cache_file.read(self.HEADER_SIZE))
+			if header is None:
+				return None
+			source_size,source_mtime,parsed_bytes,n_values,head_bytes,head_crc,tail_start,tail_crc=header
+			if os.path.getsize(self.filename)<self.HEADER_SIZE+8*n_values:
+				return None
+
+			if source_size!=self.source_stat.st_size or source_mtime!=self.source_stat.st_mtime:
+				#~ the source file changed: the cache is still valid only if it has grown and its parsed part is unchanged.
+				#~ A file modified without changing its size has been edited in place
+				if (self.source_stat.st_size<=source_size or self.source_stat.st_size<parsed_bytes or
+					not only_appended(self.source_filename,head_bytes,head_crc,tail_start,parsed_bytes,tail_crc)):
+					if self.DEBUG:
+						print "text cache: stale cache for", self.source_filename
+					return None
+
+			self.parsed_bytes=parsed_bytes
+			self.head_bytes=head_bytes
+			self.head_crc=head_crc
+			self.tail_start=tail_start
+			self.tail_crc=tail_crc
+			if n_values>0:
+				self.values=numpy.memmap(self.filename,dtype="<f8",mode='r',offset=self.HEADER_SIZE,shape=(n_values,))
+			else:
+				self.values=numpy.empty(0)
+
+		except (IOError,OSError,ValueError):
+			return None
+
+		return self.values
+
+
+	def extend(self,values,text):
+		#~ appends values to the cache, text being the source bytes they were parsed from, following the ones already cached.
+		#~ The checksums are computed on text, so that they always match the cached values even if the source file is being
+		#~ modified. The cache is rebuilt if it was not valid. Errors are ignored, as the cache is just an optimization
+
+		try:
+			if self.values is None:
+				self.head_bytes=min(len(text),CHECK_SIZE)
+				self.head_crc=zlib.crc32(text[:self.head_bytes]) & 0xffffffff
+				self.tail_start,self.tail_crc=tail_checksum(0,0,0,text)
+				self.rebuild(values,len(text))
+			elif len(values)>0:
+				self.tail_start,self.tail_crc=tail_checksum(self.tail_start,self.tail_crc,self.parsed_bytes,text)
+				self.append(values,self.parsed_bytes+len(text))
+		except (IOError,OSError):
+			if self.DEBUG:
+				print "text cache: cannot write", self.filename
+
+
+	def rebuild(self,values,parsed_bytes):
+
+		#~ the new cache is written aside and then moved, so that concurrent runs never see a partial file
+		cache_dir=os.path.dirname(os.path.abspath(self.filename))
+		fd,tmp_filename=tempfile.mkstemp(dir=cache_dir,prefix=os.path.basename(self.filename)+".")
+		try:
+			with os.fdopen(fd,'wb') as cache_file:
+				cache_file.write(self.pack_header(parsed_bytes,len(values)))
+				cache_file.write(numpy.asarray(values,dtype="<f8").tostring())
+			os.rename(tmp_filename,self.filename)
+		except:
+			os.remove(tmp_filename)
+			raise
+
+
+	def append(self,values,parsed_bytes):
+
+		with open(self.filename,'r+b') as cache_file:
+			fcntl.flock(cache_file.fileno(),fcntl.LOCK_EX)
+			try:
+				#~ another run may have extended the cache in the meantime
+				header=self.unpack_header(cache_file.read(self.HEADER_SIZE))
+				if header is None or header[2]!=self.parsed_bytes:
+					return
+				n_values=header[3]
+
+				#~ values first, then the header: readers always find a consistent cache
+				cache_file.seek(self.HEADER_SIZE+8*n_values)
+				cache_file.write(numpy.asarray(values,dtype="<f8").tostring())
+				cache_file.flush()
+				cache_file.seek(0)
+				cache_file.write(self.pack_header(parsed_bytes,n_values+len(values)))
+			finally:
+				fcntl.flock(cache_file.fileno(),fcntl.LOCK_UN)
+
+
+	def pack_header(self,parsed_bytes,n_values):
+		header=struct.pack(self.HEADER_FORMAT,self.MAGIC,self.VERSION,
+			self.source_stat.st_size,self.source_stat.st_mtime,parsed_bytes,n_values,
+			self.head_bytes,self.head_crc,self.tail_start,self.tail_crc)
+		return header.ljust(self.HEADER_SIZE,"\0")
+
+
+	def unpack_header(self,header):
+		if len(header)<self.HEADER_SIZE:
+			return None
+		fields=struct.unpack_from(self.HEADER_FORMAT,header)
+		if fields[0]!=self.MAGIC or fields[1]!=self.VERSION:
+			return None
+		return fields[2:]
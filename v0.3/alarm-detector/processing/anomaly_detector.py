@@ -16,6 +16,9 @@
 #   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
 
 
+import numpy
+
+
 class anomaly_detector():
 	
 	def __init__(self,ts_start,s_int,delta_t,an_dp,an_dpr,an_dt):
@@ -39,122 +42,75 @@ class anomaly_detector():
 
 		
 		
+	def group_markers(self,markers,markers_delta):
+		#~ anomaly markers are joined into events: consecutive markers belong to the same event if they are no more than DELTA_T apart.
+		#~ Only events with at least ANOMALY_MIN_DELTA_T markers are kept.
+		#~ Returns the first marker (beginning of event), the duration and the max power shift of each event
+		
+		if len(markers)==0:
+			return markers, markers, markers_delta
+		
+		i_event_start=numpy.concatenate(([0],numpy.flatnonzero(numpy.diff(markers)>self.DELTA_T)+1))
+		i_event_end=numpy.concatenate((i_event_start[1:],[len(markers)]))-1
+		
+		event_max_delta=numpy.maximum.reduceat(markers_delta,i_event_start)
+		
+		relevant_event=(i_event_end-i_event_start+1)>=self.ANOMALY_MIN_DELTA_T
+		i_event_start=i_event_start[relevant_event]
+		i_event_end=i_event_end[relevant_event]
+		
+		return markers[i_event_start], markers[i_event_end]-markers[i_event_start]+1, numpy.floor(event_max_delta[relevant_event])
+
+
 	def detect(self):
-								 
-  			
-			# anomalies are searched only where both actual and reference profiles are in ON state (within guard intervals)
-			self.ctrl_final=[(self.ctrl_data[i_data]==1 and self.ctrl_ref[i_data]==1) for i_data in xrange(0,self.n_data_points)]
+		
+		# anomalies are searched only where both actual and reference profiles are in ON state (within guard intervals)
+		self.ctrl_final=(numpy.asarray(self.ctrl_data)==1) & (numpy.asarray(self.ctrl_ref)==1)
+		
+		if self.DEBUG:
+			print "Look for anomaly markers on current data..."
+		
+		#~ detect anomaly points
+		n_search_points=max(self.n_data_points-self.DELTA_T,0)
+		data_p_avg=numpy.asarray(self.data_p_avg,dtype=float)[:n_search_points]
+		delta_p_ref=data_p_avg-numpy.asarray(self.profile_p_ref_avg,dtype=float)[:n_search_points]
+		delta_p_ref_min=data_p_avg*self.ANOMALY_DELTA_P_REL
+		ctrl_final=self.ctrl_final[:n_search_points]
+		
+		with numpy.errstate(invalid='ignore'):
+			anomaly_on=ctrl_final & (delta_p_ref>self.ANOMALY_DELTA_P) & (delta_p_ref>delta_p_ref_min)
+			anomaly_off=ctrl_final & (-delta_p_ref>self.ANOMALY_DELTA_P) & (-delta_p_ref>delta_p_ref_min)
+		
+		anomaly_on_markers=numpy.flatnonzero(anomaly_on)
+		anomaly_on_markers_delta=delta_p_ref[anomaly_on_markers]
+		anomaly_off_markers=numpy.flatnonzero(anomaly_off)
+		anomaly_off_markers_delta=-delta_p_ref[anomaly_off_markers]
 
-		  
-			if self.DEBUG:
-				print "Look for anomaly markers on current data..."
-			anomaly_on_markers=list()
-			anomaly_on_markers_delta=list()
-			anomaly_off_markers=list()
-			anomaly_off_markers_delta=list()
-			
-			
-			#~ detect anomaly points
-			for i_data in xrange(0,self.n_data_points-self.DELTA_T):
-					
-				if self.ctrl_final[i_data]==True:					
-					delta_p_ref_tmp=self.data_p_avg[i_data]-self.profile_p_ref_avg[i_data];
-					if delta_p_ref_tmp>self.ANOMALY_DELTA_P and delta_p_ref_tmp>self.data_p_avg[i_data]*self.ANOMALY_DELTA_P_REL:
-						anomaly_on_markers.append(i_data)
-						anomaly_on_markers_delta.append(delta_p_ref_tmp)
-					elif -delta_p_ref_tmp>self.ANOMALY_DELTA_P and -delta_p_ref_tmp>self.data_p_avg[i_data]*self.ANOMALY_DELTA_P_REL:
-						anomaly_off_markers.append(i_data)
-						anomaly_off_markers_delta.append(-delta_p_ref_tmp)
 
+		if self.DEBUG:
+			print "Detected anomaly + markers :",anomaly_on_markers.tolist()
+			print "Detected anomaly + deltas  :",anomaly_on_markers_delta.tolist()
+			print "Detected anomaly - makers :",anomaly_off_markers.tolist()
+			print "Detected anomaly - deltas ;",anomaly_off_markers_delta.tolist()
 
-			if self.DEBUG:
-				print "Detected anomaly + markers :",anomaly_on_markers
-				print "Detected anomaly + deltas  :",anomaly_on_markers_delta
-				print "Detected anomaly - makers :",anomaly_off_markers
-				print "Detected anomaly - deltas ;",anomaly_off_markers_delta
 
+		anomaly_markers={'on': anomaly_on_markers, 'off': anomaly_off_markers}
+		anomaly_markers_delta={'on': anomaly_on_markers_delta, 'off': anomaly_off_markers_delta}
+		anomaly_markers_final=dict()
 
-			anomaly_markers={'on': anomaly_on_markers, 'off': anomaly_off_markers}
-			anomaly_markers_delta={'on': anomaly_on_markers_delta, 'off': anomaly_off_markers_delta}
+		
+		#~ anomaly points are filtered or joined in order to get only relevant anomalies and their main parameters (start, duration, max power shift)
+		for i_type in anomaly_markers:
 
+			if self.DEBUG:
+				print "Filter anomaly",i_type.upper(),"markers and get one per event..."
 
-			anomaly_on_markers_final=list()
-			anomaly_on_markers_final_dt=list()
-			anomaly_on_markers_final_dp=list()
-			anomaly_off_markers_final=list()
-			anomaly_off_markers_final_dt=list()
-			anomaly_off_markers_final_dp=list()
+			anomaly_t,anomaly_dt,anomaly_dp=self.group_markers(anomaly_markers[i_type],anomaly_markers_delta[i_type])
 			
-			anomaly_markers_final={
-				'on':
-					{
-					't': anomaly_on_markers_final,
-					'dt': anomaly_on_markers_final_dt,
-					'dp': anomaly_on_markers_final_dp
-					},
-				'off':
-					{
-					't': anomaly_off_markers_final,
-					'dt': anomaly_off_markers_final_dt,
-					'dp': anomaly_off_markers_final_dp
-					}
+			anomaly_markers_final[i_type]={
+				't': [int(ts_m)*60+self.TS_START for ts_m in anomaly_t],
+				'dt': [int(dt_m) for dt_m in anomaly_dt],
+				'dp': [float(dp_m) for dp_m in anomaly_dp]
 				}
 
-			
-			#~ anomaly points are filtered or joined in order to get only relevant anomalies and their main parameters (start, duration, max power shift)
-			for i_type in anomaly_markers:
-
-				if self.DEBUG:
-					print "Filter anomaly ON markers and get one per event..."
-
-				tmp_anomaly_markers=anomaly_markers[i_type]
-				tmp_anomaly_markers_delta=anomaly_markers_delta[i_type]
-				n_tmp_markers=len(tmp_anomaly_markers)
-				tmp_anomaly_markers_final=anomaly_markers_final[i_type]['t']
-				tmp_anomaly_markers_final_dt=anomaly_markers_final[i_type]['dt']
-				tmp_anomaly_markers_final_dp=anomaly_markers_final[i_type]['dp']
-				if n_tmp_markers>0:
-					i_marker=1
-					i_marker_tmp=0
-					tmp_anomaly_markers_tmp=list()
-					tmp_anomaly_markers_delta_tmp=list()
-					
-					tmp_anomaly_markers_tmp.append(tmp_anomaly_markers[0])
-					tmp_anomaly_markers_delta_tmp.append(tmp_anomaly_markers_delta[0])
-					while i_marker<=n_tmp_markers:
-						if i_marker!=n_tmp_markers and (len(tmp_anomaly_markers_tmp)==0 or tmp_anomaly_markers[i_marker]-tmp_anomaly_markers_tmp[i_marker_tmp]<=self.DELTA_T):
-							tmp_anomaly_markers_tmp.append(tmp_anomaly_markers[i_marker])
-							tmp_anomaly_markers_delta_tmp.append(tmp_anomaly_markers_delta[i_marker])
-							i_marker_tmp+=1
-							i_marker+=1
-						
-						else:
-							if len(tmp_anomaly_markers_tmp)>0:
-								if len(tmp_anomaly_markers_tmp)>=self.ANOMALY_MIN_DELTA_T:
-									
-									# find max delta
-									tmp_anomaly_markers_delta_tmp_max=max(tmp_anomaly_markers_delta_tmp)
-									
-									# save the first marker (beginning of event), the duration of the anomaly and the max power shift
-									tmp_anomaly_markers_final.append(tmp_anomaly_markers_tmp[0])
-									tmp_anomaly_markers_final_dt.append((tmp_anomaly_markers_tmp[-1]-tmp_anomaly_markers_tmp[0]+1));
-									tmp_anomaly_markers_final_dp.append(tmp_anomaly_markers_delta_tmp_max//1)
-
-								i_marker_tmp=0
-								tmp_anomaly_markers_tmp=list()
-								tmp_anomaly_markers_delta_tmp=list()
-
-							if i_marker<n_tmp_markers:
-								tmp_anomaly_markers_tmp.append(tmp_anomaly_markers[i_marker])
-								tmp_anomaly_markers_delta_tmp.append(tmp_anomaly_markers_delta[i_marker])
-
-							i_marker+=1
-
-			anomaly_markers_final['on']['t']=[ts_m*60+self.TS_START for ts_m in anomaly_on_markers_final]
-			anomaly_markers_final['off']['t']=[ts_m*60+self.TS_START for ts_m in anomaly_off_markers_final]
-
-			return anomaly_markers_final
-
-
-		
-		
+		return anomaly_markers_final
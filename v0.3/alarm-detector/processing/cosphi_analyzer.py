@@ -0,0 +1,72 @@
+#   Copyright 2015 Adamo Ferro
+#
+#   This file is part of SLightliMon.
+#
+#   SLightliMon is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   SLightliMon is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy
+
+
+class cosphi_analyzer():
+
+	def __init__(self,s_int,cosphi_min,cosphi_dt_max):
+		self.SAMPLING_INT=s_int
+		self.COSPHI_MIN=cosphi_min
+		self.COSPHI_DT_MAX=cosphi_dt_max
+		self.data_c=None
+		self.ctrl_data=None
+		self.DEBUG=False
+
+
+	def set_data(self,data_c,ctrl_data):
+		#~ ctrl_data contains one row per phase, as returned by the profile analyzer
+		self.data_c=numpy.asarray(data_c,dtype=float)
+		self.ctrl_data=numpy.asarray(ctrl_data).reshape(-1,len(self.data_c))
+
+
+	def analyze(self):
+		#~ returns the low cosphi time, the average low cosphi and the alarm flag
+
+		if self.DEBUG:
+			print "\nLooking for cosphi anomalies with COSPHI_MIN =",self.COSPHI_MIN, "for at least", self.COSPHI_DT_MAX, "minutes"
+
+		#~ use as reference the intersection of the ON periods of the available phases
+		#~ that is, for each data point checks whether all the phases where in ON state
+		ctrl_all=numpy.all(self.ctrl_data==1,axis=0)
+
+		#~ count the number of data points with low cosphi. NaN values are never lower than COSPHI_MIN
+		with numpy.errstate(invalid='ignore'):
+			c_low=self.data_c[ctrl_all & (self.data_c<self.COSPHI_MIN)]
+		c_low_count=len(c_low)
+
+		if self.DEBUG:
+			print "# of data points with low cosphi:", c_low_count
+
+		#~ convert # of data points in time
+		c_low_dt=c_low_count*self.SAMPLING_INT
+
+		#~ calculate average cosphi during low cosphi periods. Values are summed in time order
+		c_low_avg=None
+		if c_low_count>0:
+			c_low_avg=float(numpy.cumsum(c_low)[-1])/float(c_low_count)
+
+		cosphi=dict()
+		cosphi["low_dt"]=c_low_dt
+		cosphi["low_avg"]=c_low_avg
+		cosphi["alarm"]=0
+		if c_low_dt > self.COSPHI_DT_MAX:
+			cosphi["alarm"]=1
+
+		return cosphi
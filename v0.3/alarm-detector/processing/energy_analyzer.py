@@ -0,0 +1,142 @@
+#   Copyright 2015 Adamo Ferro
+#
+#   This file is part of SLightliMon.
+#
+#   SLightliMon is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   SLightliMon is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy
+
+
+class energy_analyzer():
+
+	def __init__(self,data_min_avail,ref_min_avail,energy_rel_offset):
+		self.MIN_OVERALL_DATA_AVAILABILITY=data_min_avail
+		self.MIN_OVERALL_REF_AVAILABILITY=ref_min_avail
+		self.ENERGY_REL_OFFSET=energy_rel_offset
+		self.data_e=None
+		self.data_e_ref=None
+		self.ref_e_offsets=None
+		self.ref_e_availabilities=None
+		self.data_e_offset=None
+		self.data_e_availability=None
+		self.DEBUG=False
+
+
+	def set_data(self,data_e,data_e_ref):
+		#~ data_e_ref contains one row per reference day, or it is None if no comparison with reference data is needed
+		self.data_e=numpy.asarray(data_e,dtype=float)
+		self.data_e_ref=None
+		if data_e_ref is not None:
+			self.data_e_ref=numpy.asarray(data_e_ref,dtype=float).reshape(-1,len(self.data_e))
+		self.n_data_points=len(self.data_e)
+		self.ref_e_offsets=None
+		self.ref_e_availabilities=None
+
+
+	def set_ref_offsets(self,ref_e_offsets,ref_e_availabilities):
+		#~ energy offsets of the reference days and their availability (see offsets), used instead of reference data
+		#~ when they are already known, e.g. from the analysis of previous nights
+		self.ref_e_offsets=numpy.asarray(ref_e_offsets,dtype=float)
+		self.ref_e_availabilities=numpy.asarray(ref_e_availabilities,dtype=float)
+
+
+	def offsets(self,data_e):
+		#~ for each row of data_e find the first and the last data point with available energy data.
+		#~ Returns the energy offsets between them and their availability, calculated as the ratio between
+		#~ the duration of the measurable period and the duration of the whole period under analysis
+
+		e_avail=~numpy.isnan(data_e)
+		i_rows=numpy.arange(data_e.shape[0])
+		i_data_start=numpy.where(e_avail.any(axis=1),numpy.argmax(e_avail,axis=1),self.n_data_points)
+		i_data_end=numpy.where(e_avail.any(axis=1),self.n_data_points-1-numpy.argmax(e_avail[:,::-1],axis=1),-1)
+
+		i_data_offset=numpy.maximum(i_data_end-i_data_start+1,0)
+		e_availability=i_data_offset/float(self.n_data_points)
+
+		e_offsets=numpy.empty(data_e.shape[0])
+		e_offsets.fill(numpy.nan)
+		e_measurable=i_data_offset>0
+		i_rows=i_rows[e_measurable]
+		e_offsets[e_measurable]=data_e[i_rows,i_data_end[e_measurable]]-data_e[i_rows,i_data_start[e_measurable]]
+
+		return e_offsets, e_availability
+
+
+	def analyze(self):
+		#~ returns the energy section of the results
+
+		energy=dict()
+		if self.data_e is None:
+			return energy
+
+		data_e_offset,data_e_availability=self.offsets(self.data_e[numpy.newaxis,:])
+		data_e_offset=float(data_e_offset[0])
+		data_e_availability=float(data_e_availability[0])
+		energy["availability"]=data_e_availability
+		
+		#~ kept to be used as reference by later analyses
+		self.data_e_offset=data_e_offset
+		self.data_e_availability=data_e_availability
+
+		if data_e_availability>self.MIN_OVERALL_DATA_AVAILABILITY:
+
+			#~ if availability is sufficient, energy consumption is calculated as the difference
+			#~ between the energy values measured at the beginning and at the end of the measurable period
+			energy["offset"]=data_e_offset
+
+			if self.ref_e_offsets is None and self.data_e_ref is not None:
+				
+				#~ Do the same for all the reference days at once
+				self.ref_e_offsets,self.ref_e_availabilities=self.offsets(self.data_e_ref)
+			
+			if self.ref_e_offsets is not None and len(self.ref_e_offsets)>0:
+				energy["reference"]=dict()
+				ref_e_offsets=self.ref_e_offsets
+				ref_e_availabilities=self.ref_e_availabilities
+
+				#~ each reference day power consumption must have a sufficient reliability to be considered in the reference measurement
+				ref_e_reliable=ref_e_availabilities>=self.MIN_OVERALL_DATA_AVAILABILITY
+				ref_e_offsets=ref_e_offsets[ref_e_reliable]
+
+				#~ the overall reliability of reference data is calculated as the ratio between
+				#~ reliable reference days and total number of reference days
+				n_ref_days=len(ref_e_availabilities)
+				n_ref_unreliable=n_ref_days-len(ref_e_offsets)
+				ref_e_availability=1
+				if n_ref_unreliable>0:
+					ref_e_availability=float(numpy.subtract.reduce(numpy.concatenate(([1.],numpy.repeat(1/float(n_ref_days),n_ref_unreliable)))))
+
+				if self.DEBUG:
+					print "Reliable energy reference days:",len(ref_e_offsets),"of",n_ref_days
+
+				energy["reference"]["availability"]=ref_e_availability
+				if ref_e_availability>=self.MIN_OVERALL_REF_AVAILABILITY and len(ref_e_offsets)>0:
+
+					#~ reference energy consumption is calculated as the median of the
+					#~ daily energy consumption of the reference days
+					ref_e_offset_median=float(numpy.sort(ref_e_offsets)[len(ref_e_offsets)//2])
+					energy["reference"]["offset"]=ref_e_offset_median
+
+					#~ alarm = 1 if actual energy consumption is more than expected
+					#~ -1 if it's less
+					#~ 0 if there's no alarm
+					if data_e_offset>=ref_e_offset_median*(1+self.ENERGY_REL_OFFSET):
+						energy["reference"]["alarm"]=1
+					elif data_e_offset<=ref_e_offset_median*(1-self.ENERGY_REL_OFFSET):
+						energy["reference"]["alarm"]=-1
+					else:
+						energy["reference"]["alarm"]=0
+
+		return energy
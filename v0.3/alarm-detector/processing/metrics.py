@@ -0,0 +1,81 @@
+#   Copyright 2015 Adamo Ferro
+#
+#   This file is part of SLightliMon.
+#
+#   SLightliMon is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   SLightliMon is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+import time
+import threading
+import resource
+
+
+#~ CPU time is measured for the calling thread where the system allows it (RUSAGE_THREAD, Linux only, not exposed by
+#~ the resource module of Python 2), and for the whole process otherwise
+RUSAGE_WHO=resource.RUSAGE_SELF
+if sys.platform.startswith("linux"):
+	RUSAGE_WHO=1
+
+
+def cpu_time():
+	usage=resource.getrusage(RUSAGE_WHO)
+	return usage.ru_utime+usage.ru_stime
+
+
+class metrics():
+	
+	#~ Wall and CPU time spent in each stage of an analysis, and counters of the processed items (samples, gaps, markers, ...).
+	#~ Stages can be timed from any thread: a stage is timed by calling stop with the value returned by start.
+	#~ When not enabled nothing is measured, so that stages can always be timed
+
+	def __init__(self,enabled=True):
+		self.enabled=enabled
+		self.stages=dict()
+		self.counters=dict()
+		self.lock=threading.Lock()
+
+
+	def start(self):
+		if not self.enabled:
+			return None
+		return time.time(),cpu_time()
+
+
+	def stop(self,stage,started):
+		if started is None:
+			return
+		wall=time.time()-started[0]
+		cpu=cpu_time()-started[1]
+		with self.lock:
+			calls,stage_wall,stage_cpu=self.stages.get(stage,(0,0.,0.))
+			self.stages[stage]=(calls+1,stage_wall+wall,stage_cpu+cpu)
+
+
+	def count(self,counter,n=1):
+		if self.enabled:
+			with self.lock:
+				self.counters[counter]=self.counters.get(counter,0)+int(n)
+
+
+	def output(self):
+		#~ metrics as given in the alarm detector output: times are in seconds
+		with self.lock:
+			stages=dict()
+			for stage,(calls,wall,cpu) in self.stages.iteritems():
+				stages[stage]={"calls":calls,"wall":wall,"cpu":cpu}
+			return {"stages":stages,"counters":dict(self.counters)}
+
+
+#~ used by the processing stages when no metrics are collected
+DISABLED=metrics(False)
@@ -0,0 +1,57 @@
+#   Copyright 2015 Adamo Ferro
+#
+#   This file is part of SLightliMon.
+#
+#   SLightliMon is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   SLightliMon is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy
+
+
+class nan_intervals():
+
+	def __init__(self,nan_mask):
+
+		#~ run-length encoding of the nan mask: +1 where a nan interval begins, -1 just after it ends
+		nan_mask=numpy.asarray(nan_mask,dtype=bool)
+		nan_mask_edges=numpy.diff(numpy.concatenate(([0],nan_mask.astype(numpy.int8),[0])))
+
+		self.n_data_points=len(nan_mask)
+
+		#~ first and last point of each nan interval (both included)
+		self.start=numpy.flatnonzero(nan_mask_edges==1)
+		self.end=numpy.flatnonzero(nan_mask_edges==-1)-1
+
+		self.n=len(self.start)
+		self.n_nan_points=int(numpy.sum(self.end-self.start+1))
+
+
+	def duration(self):
+		return self.end-self.start+1
+
+
+	def inner(self):
+		#~ True for the intervals that neither begin at the first data point nor end at the last one
+		return (self.start!=0) & (self.end!=self.n_data_points-1)
+
+
+	def points(self,selection):
+		#~ indexes of all the data points belonging to the selected intervals
+
+		start=self.start[selection]
+		duration=self.end[selection]-start+1
+
+		#~ each point is the start of its interval plus its position within the interval
+		int_offset=numpy.repeat(start-numpy.cumsum(duration)+duration,duration)
+		return int_offset+numpy.arange(int_offset.size)
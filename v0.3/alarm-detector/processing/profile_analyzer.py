@@ -16,6 +16,11 @@
 #   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
 
 
+import numpy
+import processing.nan_intervals
+import processing.metrics
+
+
 class profile_analyzer():
 
 	def __init__(self,ts_start,s_int,dt,avg_t,an_fdt,vm,vM):
@@ -30,24 +35,28 @@ class profile_analyzer():
 		self.data_v=None
 		self.P_OFF_MAX=None
 		self.first_init=True
+		self.metrics=processing.metrics.DISABLED
 		self.DEBUG=False
 		
 	
 	def set_data(self,data_p,data_v,poff,preserve_avail_info):
 		self.P_OFF_MAX=poff
-		self.data_p=data_p				# DO NOT make a copy
+		#~ input buffers are never modified, they are copied only when data have to be changed (see copy_on_write)
+		self.data_p=self.as_float_array(data_p)
 		self.data_p_avg=None
 		
 		self.data_v=self.data_p			# fake, used when analyzing energy and cosphi data
 		if data_v is not None:
-			self.data_v=data_v			# DO NOT make a copy
+			self.data_v=self.as_float_array(data_v)
 		self.data_v_avg=None
+		self.data_copied=False
 
 		#~ preserve_avail_info is used to avoid calculations in the case where the new dataset to be analyzed
 		#~ has the same data availability (i.e., nan positions) of the previous one
 		if (not preserve_avail_info) or self.first_init:
 			self.n_data_points=len(self.data_p)
 			self.overall_data_availability=0
+			self.nan_index=None
 			self.nan_int_start=None
 			self.nan_int_end=None
 			self.n_nan_int=0
@@ -55,7 +64,7 @@ class profile_analyzer():
 			#~ Array that indicates whether a data point should be analyzed or not (to be used in AND with ctrl_data)
 			#~ = 0: no because data not available (NaN on data or on reference profile)
 			#~ = 1 : yes
-			self.ctrl_nan=[1 for i_data in xrange(0,self.n_data_points)]
+			self.ctrl_nan=numpy.ones(self.n_data_points,dtype=int)
 			
 			self.avail_estimated=False
 			
@@ -64,7 +73,25 @@ class profile_analyzer():
 		#~ Array that indicates whether a data point should be analyzed or not (to be used in AND with ctrl_nan)
 		#~ = 0 : no because it does not lie within an ON/OFF interval
 		#~ = 1 : yes
-		self.ctrl_data=[0 for i_data in xrange(0,self.n_data_points)]
+		self.ctrl_data=numpy.zeros(self.n_data_points,dtype=int)
+
+
+	def as_float_array(self,data):
+		#~ float arrays (also single precision ones) are used as they are, anything else (e.g. lists with None for no data) is converted
+		data=numpy.asarray(data)
+		if data.dtype.kind!='f':
+			data=numpy.asarray(data,dtype=numpy.float64)
+		return data
+
+
+	def copy_on_write(self):
+		#~ makes private double precision copies of the data before they are modified for the first time,
+		#~ so that the same input buffers can be safely used for other analyses
+		if not self.data_copied:
+			data_v_is_data_p=self.data_v is self.data_p
+			self.data_p=self.data_p.astype(numpy.float64)
+			self.data_v=self.data_p if data_v_is_data_p else self.data_v.astype(numpy.float64)
+			self.data_copied=True
 
 
 	def estimate_availability(self):
@@ -75,49 +102,115 @@ class profile_analyzer():
 			
 			if self.DEBUG:
 				print "Estimate availability..."
+			started=self.metrics.start()
 				
-			nan_count=0
-			self.nan_int_start=list()
-			self.nan_int_end=list()
-			nan_i_tmp=-1
-			self.overall_data_availability=1
-
-			for i_data in xrange(0,self.n_data_points):
-				if type(self.data_p[i_data]) is not float:			# do not check data_v because it is assumed that P and V are always measured together
-					
-					#~ assure that both are None
-					self.data_p[i_data]=None
-					self.data_v[i_data]=None
-					self.ctrl_nan[i_data]=0
-					nan_count+=1
-					
-					#~ save start and end of nan intervals
-					if len(self.nan_int_start)==0 or i_data-nan_i_tmp>1:
-						self.nan_int_start.append(i_data)
-						
-					nan_i_tmp=i_data
-						
-				else:
-					if (len(self.nan_int_end)==0 and nan_i_tmp>=0) or (len(self.nan_int_end)>0 and self.nan_int_end[-1]!=nan_i_tmp):
-						self.nan_int_end.append(nan_i_tmp)
-					
-					
-				#~ if the last nan interval spans until the end of the data...
-				if nan_i_tmp==self.n_data_points-1:
-					self.nan_int_end.append(nan_i_tmp)
-					
-					if self.DEBUG:
-						print "*** data end with a nan interval ***"
+			#~ do not check data_v because it is assumed that P and V are always measured together
+			nan_mask=numpy.isnan(self.data_p)
+			
+			#~ assure that both are NaN
+			if not numpy.isnan(self.data_v[nan_mask]).all():
+				self.copy_on_write()
+				self.data_v[nan_mask]=numpy.nan
+			self.ctrl_nan[nan_mask]=0
+			
+			#~ find start and end of nan intervals
+			self.nan_index=processing.nan_intervals.nan_intervals(nan_mask)
+			self.nan_int_start=self.nan_index.start
+			self.nan_int_end=self.nan_index.end
+			nan_count=self.nan_index.n_nan_points
+
+			if self.DEBUG and self.n_data_points>0 and nan_mask[-1]:
+				print "*** data end with a nan interval ***"
 					
-			self.n_nan_int=len(self.nan_int_start)			
+			self.n_nan_int=self.nan_index.n
 
 			self.overall_data_availability=1.-float(nan_count)/float(self.n_data_points)
 			self.avail_estimated=True
+			self.metrics.stop("estimate_availability",started)
+			self.metrics.count("nan_intervals",self.n_nan_int)
 		
 		return self.overall_data_availability
 
 
 
+	def fill_gaps(self):
+		#~ fills short nan intervals by linear interpolation between the points preceding and following them,
+		#~ all at once. Intervals at the beginning or at the end of data cannot be filled.
+		#~ Returns the long gaps (points preceding and following each of them) and the ON/OFF markers
+		#~ inferred across the long gaps, as (marker, precision) rows
+
+		#~ NOTE: assumption: data have 1 minute sampling *** TODO: change this and make general
+		inner_nan_int=self.nan_index.inner()
+		short_nan_int=inner_nan_int & (self.nan_index.duration()<=self.DELTA_T)
+		long_nan_int=inner_nan_int & ~short_nan_int
+
+		i_fill=self.nan_index.points(short_nan_int)
+		if len(i_fill)>0:
+			self.copy_on_write()
+			i_avail=numpy.flatnonzero(~numpy.isnan(self.data_p))
+			self.data_p[i_fill]=numpy.interp(i_fill,i_avail,self.data_p[i_avail])
+			self.data_v[i_fill]=numpy.interp(i_fill,i_avail,self.data_v[i_avail])
+			self.ctrl_nan[i_fill]=1			# nan recovered
+
+		long_nan_int_start=self.nan_index.start[long_nan_int]-1
+		long_nan_int_end=self.nan_index.end[long_nan_int]+1
+
+		if self.DEBUG:
+			print "...filled gaps:", numpy.count_nonzero(short_nan_int)
+			for i_start,i_end in zip(long_nan_int_start,long_nan_int_end):
+				print "...long gap detected: ", i_start, "to", i_end
+
+		#~ detect ON or OFF happened during a long gap
+		#~ ON/OFF precision in minutes is calculated as half of the nan interval (instead of half of the avg interval)
+		p_start=self.data_p[long_nan_int_start]
+		p_end=self.data_p[long_nan_int_end]
+		with numpy.errstate(invalid='ignore'):
+			long_nan_on=(p_start<self.P_OFF_MAX) & (p_end>self.P_OFF_MAX)
+			long_nan_off=(p_start>self.P_OFF_MAX) & (p_end<self.P_OFF_MAX)
+
+		long_nan_half_dt=(long_nan_int_end-long_nan_int_start)//2
+		long_nan_markers=numpy.column_stack((long_nan_int_start+long_nan_half_dt,long_nan_half_dt))
+
+		return long_nan_int_start, long_nan_int_end, long_nan_markers[long_nan_on], long_nan_markers[long_nan_off]
+
+
+	def moving_average(self,data,data_avg,i_start,i_end):
+		#~ centred moving average of data over AVG_INTERVAL points, written into data_avg[i_start:i_end]
+		#~ Window sums are obtained as differences of the cumulative sum of the segment, so the cost does not depend on AVG_INTERVAL.
+		#~ Non-finite values are summed as zeros and counted apart, so that they only affect the averages of the windows holding
+		#~ them, which are NaN, +inf or -inf as the plain sum of their values
+
+		if i_end>i_start:
+			segment=data[i_start-self.AVG_INTERVAL//2:i_end+self.AVG_INTERVAL//2]
+			segment_finite=numpy.isfinite(segment)
+			data_cumsum=numpy.concatenate(([0.],numpy.cumsum(numpy.where(segment_finite,segment,0.),dtype=numpy.float64)))
+			window_avg=(data_cumsum[self.AVG_INTERVAL:]-data_cumsum[:-self.AVG_INTERVAL])/self.AVG_INTERVAL
+			if not segment_finite.all():
+				n_windowed=dict()
+				for name,is_value in (("nan",numpy.isnan(segment)),("pos_inf",segment==numpy.inf),("neg_inf",segment==-numpy.inf)):
+					value_cumsum=numpy.concatenate(([0],numpy.cumsum(is_value)))
+					n_windowed[name]=value_cumsum[self.AVG_INTERVAL:]-value_cumsum[:-self.AVG_INTERVAL]
+				window_avg[n_windowed["pos_inf"]>0]=numpy.inf
+				window_avg[n_windowed["neg_inf"]>0]=-numpy.inf
+				window_avg[(n_windowed["nan"]>0) | ((n_windowed["pos_inf"]>0) & (n_windowed["neg_inf"]>0))]=numpy.nan
+			data_avg[i_start:i_end]=window_avg
+
+
+	def intervals_to_mask(self,int_start,int_end):
+		#~ returns an integer array that is 1 within the union of the [start,end) intervals, and 0 elsewhere.
+		#~ Interval bounds are clipped to the data range, empty intervals are ignored
+		
+		int_start=numpy.clip(numpy.array(int_start,dtype=int),0,self.n_data_points)
+		int_end=numpy.clip(numpy.array(int_end,dtype=int),0,self.n_data_points)
+		valid_int=int_end>int_start
+		
+		int_count=numpy.zeros(self.n_data_points+1,dtype=int)
+		numpy.add.at(int_count,int_start[valid_int],1)
+		numpy.add.at(int_count,int_end[valid_int],-1)
+		
+		return (numpy.cumsum(int_count[:-1])>0).astype(int)
+
+
 	def analyze_profile(self):
 		#~ data are considered reliable
 		#~ The process fills short nan intervals by linear prediction. "Short" is defined as duration <= DELTA_T
@@ -132,57 +225,21 @@ class profile_analyzer():
 				print "Fill short data gaps..."
 				print "# NaN intervals:			",self.n_nan_int
 			
-			long_nan_int_start=list()
-			long_nan_int_end=list()
-			
-			#~ NOTE: assumption: data have 1 minute sampling *** TODO: change this and make general
-			for i_nan_int in xrange(0,self.n_nan_int):
-				if self.nan_int_start[i_nan_int]!=0 and self.nan_int_end[i_nan_int]!=self.n_data_points-1:
-					nan_int_dt=self.nan_int_end[i_nan_int]-self.nan_int_start[i_nan_int]+1
-					i_start=self.nan_int_start[i_nan_int]-1
-					i_end=self.nan_int_end[i_nan_int]+1
-					if nan_int_dt<=self.DELTA_T:
-						p_start=self.data_p[i_start]
-						p_end=self.data_p[i_end]
-						v_start=self.data_v[i_start]
-						v_end=self.data_v[i_end]
-						
-						m_p=(p_end-p_start)/(nan_int_dt+1)
-						m_v=(v_end-v_start)/(nan_int_dt+1)
-						
-						if self.DEBUG:
-							print "...filling gap (", i_nan_int, "): ", i_start, "to", i_end
-						for i_data in xrange(i_start+1,i_end):
-							self.data_p[i_data]=p_start+m_p*(i_data-i_start)
-							self.data_v[i_data]=v_start+m_v*(i_data-i_start)
-
-							#~ self.ctrl_data[i_data]=0		# non serve piu' ripristinare ctrl_data
-							self.ctrl_nan[i_data]=1			# nan recovered
-						
-					else:
-						if self.DEBUG:
-							print "...long gap detected (", i_nan_int, "): ", i_start, "to", i_end
-						
-						long_nan_int_start.append(i_start)
-						long_nan_int_end.append(i_end)
-						
-						#~ detect ON or OFF happened during a long gap
-						#~ ON/OFF precision in minutes is calculated as half of the nan interval (instead of half of the avg interval)
-						if self.data_p[i_start]<self.P_OFF_MAX and self.data_p[i_end]>self.P_OFF_MAX:
-							
-							#~ print "ON DETECTED IN LONG NAN GAP between",i_start,"and",i_end
-							
-							data_switch_on_markers.append((i_start+int((i_end-i_start)//2),(i_end-i_start)/2))
-						elif self.data_p[i_start]>self.P_OFF_MAX and self.data_p[i_end]<self.P_OFF_MAX:
-							data_switch_off_markers.append((i_start+int((i_end-i_start)//2),(i_end-i_start)/2))
+			started=self.metrics.start()
+			long_nan_int_start,long_nan_int_end,long_nan_on_markers,long_nan_off_markers=self.fill_gaps()
+			self.metrics.stop("fill_gaps",started)
+			self.metrics.count("long_gaps",len(long_nan_int_start))
+			data_switch_on_markers.extend([(int(i_data),int(dt)) for i_data,dt in long_nan_on_markers])
+			data_switch_off_markers.extend([(int(i_data),int(dt)) for i_data,dt in long_nan_off_markers])
 
 
 
 			if self.DEBUG:
 				print "Moving average on data..."
-				
-			self.data_p_avg=self.data_p[:]        # make copies to avoid zeros at the beginning and at the end
-			self.data_v_avg=self.data_v[:]        # 
+			started=self.metrics.start()
+
+			self.data_p_avg=self.data_p.astype(numpy.float64)        # make copies to avoid zeros at the beginning and at the end
+			self.data_v_avg=self.data_v.astype(numpy.float64)        # 
 			
 			
 			if self.AVG_INTERVAL > 1:
@@ -198,30 +255,22 @@ class profile_analyzer():
 					if self.nan_int_end[-1]==(self.n_data_points-1):
 						i_end_abs=self.nan_int_start[-1]-self.AVG_INTERVAL//2
 
-				if n_long_nan_int > 0:
-					for i_long_nan_int in xrange(0,n_long_nan_int+1):
-						if i_long_nan_int==0:
-							i_start=i_start_abs
-						else:
-							i_start=long_nan_int_end[i_long_nan_int-1]+self.AVG_INTERVAL//2
-							
-						if i_long_nan_int==n_long_nan_int:
-							i_end=i_end_abs
-						else:
-							i_end=long_nan_int_start[i_long_nan_int]-self.AVG_INTERVAL//2
-
-						if self.DEBUG:
-							print "...", i_start, "to", i_end
-						for i_data in xrange(i_start,i_end):
-							self.data_p_avg[i_data]=float(sum(self.data_p[i_data-self.AVG_INTERVAL//2:i_data+self.AVG_INTERVAL//2+1])/self.AVG_INTERVAL)
-							self.data_v_avg[i_data]=float(sum(self.data_v[i_data-self.AVG_INTERVAL//2:i_data+self.AVG_INTERVAL//2+1])/self.AVG_INTERVAL)
+				for i_long_nan_int in xrange(0,n_long_nan_int+1):
+					if i_long_nan_int==0:
+						i_start=i_start_abs
+					else:
+						i_start=long_nan_int_end[i_long_nan_int-1]+self.AVG_INTERVAL//2
+						
+					if i_long_nan_int==n_long_nan_int:
+						i_end=i_end_abs
+					else:
+						i_end=long_nan_int_start[i_long_nan_int]-self.AVG_INTERVAL//2
 
-				else:
-					i_start=i_start_abs
-					i_end=i_end_abs
-					for i_data in xrange(i_start,i_end):
-						self.data_p_avg[i_data]=float(sum(self.data_p[i_data-self.AVG_INTERVAL//2:i_data+self.AVG_INTERVAL//2+1])/self.AVG_INTERVAL)
-						self.data_v_avg[i_data]=float(sum(self.data_v[i_data-self.AVG_INTERVAL//2:i_data+self.AVG_INTERVAL//2+1])/self.AVG_INTERVAL)
+					if self.DEBUG:
+						print "...", i_start, "to", i_end
+					self.moving_average(self.data_p,self.data_p_avg,i_start,i_end)
+					self.moving_average(self.data_v,self.data_v_avg,i_start,i_end)
+			self.metrics.stop("moving_average",started)
 
 
 
@@ -233,20 +282,22 @@ class profile_analyzer():
 
 			if self.DEBUG:
 				print "Look for switch on/off markers and voltage anomalies on current data..."
+			started=self.metrics.start()
 			
-			n_high_v_points=0
-			n_low_v_points=0
-			for i_data in xrange(0,self.n_data_points-1):
-				if type(self.data_p_avg[i_data]) is float:
-					if type(self.data_p_avg[i_data+1]) is float:
-						if self.data_p_avg[i_data]<=self.P_OFF_MAX and self.data_p_avg[i_data+1]>self.P_OFF_MAX:
-							data_switch_on_markers.append((i_data+1,self.AVG_INTERVAL/2))
-						elif self.data_p_avg[i_data+1]<=self.P_OFF_MAX and self.data_p_avg[i_data]>self.P_OFF_MAX:
-							data_switch_off_markers.append((i_data+1,self.AVG_INTERVAL/2))
-					if self.data_v_avg[i_data]>self.V_MAX:
-						n_high_v_points+=1
-					elif self.data_v_avg[i_data]<self.V_MIN:
-						n_low_v_points+=1
+			#~ comparisons involving NaN are false, so points without data never generate markers
+			with numpy.errstate(invalid='ignore'):
+				p_avg_off=self.data_p_avg<=self.P_OFF_MAX
+				p_avg_on=self.data_p_avg>self.P_OFF_MAX
+				v_avg_high=self.data_v_avg>self.V_MAX
+				v_avg_not_low=self.data_v_avg>=self.V_MIN
+
+			data_switch_on_markers.extend([(int(i_data),self.AVG_INTERVAL/2) for i_data in numpy.flatnonzero(p_avg_off[:-1] & p_avg_on[1:])+1])
+			data_switch_off_markers.extend([(int(i_data),self.AVG_INTERVAL/2) for i_data in numpy.flatnonzero(p_avg_on[:-1] & p_avg_off[1:])+1])
+
+			#~ voltage is checked only where power is available. A missing voltage value is counted as low
+			p_avg_avail=~numpy.isnan(self.data_p_avg[:-1])
+			n_high_v_points=int(numpy.count_nonzero(p_avg_avail & v_avg_high[:-1]))
+			n_low_v_points=int(numpy.count_nonzero(p_avg_avail & ~v_avg_not_low[:-1]))
 					
 
 			#~ necessary to sort because markers can be detected also before when dealing with nan intervals
@@ -268,48 +319,51 @@ class profile_analyzer():
 
 			n_data_on_markers_final=len(data_switch_on_markers)
 			n_data_off_markers_final=len(data_switch_off_markers)
-
+			data_on_markers_final=numpy.array([ts_m[0] for ts_m in data_switch_on_markers],dtype=int)
+			data_off_markers_final=numpy.array([ts_m[0] for ts_m in data_switch_off_markers],dtype=int)
 			
+			#~ ON intervals are collected as [start,end) index pairs and then applied all at once
+			on_int_start=list()
+			on_int_end=list()
 			
-			i_off_start_marker=0
 			if n_data_on_markers_final>0:               # there's at least one ON event --> before the ON event there was an OFF state, but not necessarily an OFF event
+				i_off_start_marker=0
 				if n_data_off_markers_final>0:          # there's at least one OFF event...
-					if data_switch_off_markers[0][0]<data_switch_on_markers[0][0]:        # --> it was ON already at the beginning, until the first OFF event
-						for i_data in xrange(0,data_switch_off_markers[0][0]-self.ANOMALY_FILTER_DELTA_T):                # there cannot be other OFF before the first ON
-							if self.ctrl_nan[i_data]==1:        # else it means it belongs to a long nan interval
-								self.ctrl_data[i_data]=1
+					if data_off_markers_final[0]<data_on_markers_final[0]:        # --> it was ON already at the beginning, until the first OFF event
+						on_int_start.append(0)                                    # there cannot be other OFF before the first ON
+						on_int_end.append(data_off_markers_final[0]-self.ANOMALY_FILTER_DELTA_T)
 						i_off_start_marker=1
 
-				i_off_marker=i_off_start_marker
-				for i_on_marker in xrange(0,n_data_on_markers_final):
-					i_data_end=self.n_data_points
-					if i_off_marker<n_data_off_markers_final:
-						i_data_end=data_switch_off_markers[i_off_marker][0]
-					for i_data in xrange(data_switch_on_markers[i_on_marker][0]+self.ANOMALY_FILTER_DELTA_T+1,i_data_end-self.ANOMALY_FILTER_DELTA_T):
-						if self.ctrl_nan[i_data]==1:
-							self.ctrl_data[i_data]=1
-					i_off_marker+=1
+				#~ the i-th ON event lasts until the i-th following OFF event, or until the end of data
+				on_int_end_tmp=numpy.empty(n_data_on_markers_final,dtype=int)
+				on_int_end_tmp.fill(self.n_data_points)
+				n_paired_markers=max(min(n_data_on_markers_final,n_data_off_markers_final-i_off_start_marker),0)
+				on_int_end_tmp[:n_paired_markers]=data_off_markers_final[i_off_start_marker:i_off_start_marker+n_paired_markers]
+				
+				on_int_start.extend(data_on_markers_final+self.ANOMALY_FILTER_DELTA_T+1)
+				on_int_end.extend(on_int_end_tmp-self.ANOMALY_FILTER_DELTA_T)
 			else:                                       # no ON events... 1) it is always ON or 2) it is always OFF or 3) it is ON at the beginning and then goes OFF
 				if n_data_off_markers_final>0:          # option 3), there should be no more than 1 OFF event (assume that)
-					for i_data in xrange(0,data_switch_off_markers[0][0]-self.ANOMALY_FILTER_DELTA_T):
-						if self.ctrl_nan[i_data]==1:
-							self.ctrl_data[i_data]=1
+					on_int_start.append(0)
+					on_int_end.append(data_off_markers_final[0]-self.ANOMALY_FILTER_DELTA_T)
 				else:
-					i_data=0
-					while i_data<self.n_data_points and type(self.data_p[i_data]) is not float:
-						i_data+=1        # i_data cannot reach self.n_data_points because the required reliability is >0 (there's at least one non-nan point)
-					
+					#~ there's at least one non-nan point because the required reliability is >0
+					i_data=numpy.flatnonzero(~numpy.isnan(self.data_p))[0]
 					
 					if self.data_p[i_data]>self.P_OFF_MAX:        # always ON
 						if self.DEBUG:
 							print "Current profile always ON"
-						for i_data in xrange(0,self.n_data_points):
-							if self.ctrl_nan[i_data]==1:
-								self.ctrl_data[i_data]=1
+						on_int_start.append(0)
+						on_int_end.append(self.n_data_points)
 					elif self.DEBUG:
 						print "Current profile always OFF"
 																# else, always OFF, alreay ctrl_data=0 from the initialization
 
+			#~ points belonging to a long nan interval are never set to ON
+			self.ctrl_data=self.intervals_to_mask(on_int_start,on_int_end)*self.ctrl_nan
+			self.metrics.stop("marker_detection",started)
+			self.metrics.count("switch_markers",n_data_on_markers_final+n_data_off_markers_final)
+
 
 			data_switch_on_markers=[(ts_m[0]*60+self.TS_START,ts_m[1]) for ts_m in data_switch_on_markers]
 			data_switch_off_markers=[(ts_m[0]*60+self.TS_START,ts_m[1]) for ts_m in data_switch_off_markers]
@@ -16,74 +16,75 @@
 #   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
 
 
+import numpy
+
+
 class profile_merger():
 	
 	def __init__(self,data_p_list,data_v_list,data_v_norm=None):
 		
-		#~ list of reference data, one entry per reference day
-		self.data_p_list=data_p_list
-		self.data_v_list=data_v_list
+		#~ reference data, one row per reference day
+		self.data_p_list=numpy.asarray(data_p_list,dtype=float)
+		self.data_v_list=numpy.asarray(data_v_list,dtype=float)
 		
 		#~ actual voltage, used to normalize power reference data
 		self.data_v_norm=data_v_norm
+		if data_v_norm is not None:
+			self.data_v_norm=numpy.asarray(data_v_norm,dtype=float)
 		
-		self.n_profiles=len(self.data_p_list)
-		self.n_data_points=len(self.data_p_list[0])
-		self.data_p_merged=[None for i_ref in xrange(0,self.n_data_points)]
-		self.data_v_merged=[None for i_ref in xrange(0,self.n_data_points)]
+		self.n_profiles=self.data_p_list.shape[0]
+		self.n_data_points=self.data_p_list.shape[1]
+		self.data_p_merged=None
+		self.data_v_merged=None
 		self.merge_avail=1
 		self.DEBUG=False
 		
 		
 	def merge(self):
-		for i_data in xrange(0,self.n_data_points):
-			p_tmp_list=list()
-			v_tmp_list=list()
-			
-			for i_profile in xrange(0,self.n_profiles):
-				p_tmp=0
-				v_tmp=0
-				
-				#~ save P values in a list only if they are not nan. Power values are normalized wrt voltage
-				if type(self.data_p_list[i_profile][i_data]) is float and type(self.data_v_list[i_profile][i_data]) is float:
-					p_tmp=self.data_p_list[i_profile][i_data]
-					v_tmp=self.data_v_list[i_profile][i_data]
-					if self.data_v_norm is not None and type(self.data_v_norm[i_data]) is float:
-						v_amp_factor=0
-						if v_tmp!=0:
-							v_amp_factor=self.data_v_norm[i_data]/v_tmp;
-							p_tmp=p_tmp*(v_amp_factor**2)			
-							v_tmp=self.data_v_norm[i_data]
-					p_tmp_list.append((i_profile,p_tmp))
-				
-				#~  may contain 0, but if so it's not used
-				v_tmp_list.append(v_tmp)
-
-			#~ check if there is at least one point in the reference profile and calculates reference values
-			if len(p_tmp_list)>0:
-				
-				#~ sort p values keeping the correspondence with ref day id
-				p_tmp_tuple=sorted(p_tmp_list,key=lambda p_value: p_value[1])
-				
-				#~ select middle p value and the corresponding v value
-				i_middle=len(p_tmp_tuple)/2
-				p_tmp_final=p_tmp_tuple[i_middle][1]
-				v_tmp_final=v_tmp_list[p_tmp_tuple[i_middle][0]]
-				
-				self.data_p_merged[i_data]=p_tmp_final
-				self.data_v_merged[i_data]=v_tmp_final
-				
-
-			#~ reduces the overall reliability of the reference profile depending on the number of ref days that
-			#~ it was possible to use.
-			#~ Every data point of the reference profile weights 1/n_data_points
-			#~ 1 is reduced by n_used_days/N_REF_DAYS, that is
-			#~ if all ref days are used, the reliability is not reduced
-			#~ if none has been used, reliability is reduced by 1/n_data_points
-			#~ (these are the extreme cases that actually never happen because of the conditions)
-			self.merge_avail-=(float(self.n_profiles-len(p_tmp_list))/float(self.n_profiles))/float(self.n_data_points)
-
-
+		
+		#~ use P values only if they are not nan, together with V
+		ref_avail=~(numpy.isnan(self.data_p_list) | numpy.isnan(self.data_v_list))
+		n_ref_avail=numpy.sum(ref_avail,axis=0)
+		
+		data_p_ref=self.data_p_list
+		data_v_ref=self.data_v_list
+		
+		#~ Power values are normalized wrt voltage, where actual voltage is available and reference voltage is not zero
+		if self.data_v_norm is not None:
+			v_norm=ref_avail & ~numpy.isnan(self.data_v_norm) & (self.data_v_list!=0)
+			with numpy.errstate(divide='ignore',invalid='ignore'):
+				v_amp_factor=self.data_v_norm/self.data_v_list
+				data_p_ref=numpy.where(v_norm,self.data_p_list*(v_amp_factor**2),self.data_p_list)
+			data_v_ref=numpy.where(v_norm,self.data_v_norm,self.data_v_list)
+		
+		#~ sort p values of each data point keeping the correspondence with ref day id.
+		#~ Not available values are moved at the end by sorting them as NaN, ties keep the ref day order
+		data_p_ref=numpy.where(ref_avail,data_p_ref,numpy.nan)
+		i_profile_sorted=numpy.argsort(data_p_ref,axis=0,kind='mergesort')
+		
+		#~ select middle p value and the corresponding v value
+		i_data=numpy.arange(self.n_data_points)
+		i_profile_middle=i_profile_sorted[numpy.minimum(n_ref_avail//2,self.n_profiles-1),i_data]
+		self.data_p_merged=data_p_ref[i_profile_middle,i_data]
+		self.data_v_merged=data_v_ref[i_profile_middle,i_data]
+		
+		#~ check if there is at least one point in the reference profile
+		self.data_p_merged[n_ref_avail==0]=numpy.nan
+		self.data_v_merged[n_ref_avail==0]=numpy.nan
+		
+		self.estimate_merge_avail(n_ref_avail)
+		
 		return self.data_p_merged, self.data_v_merged, self.merge_avail
 		
-
+		
+	def estimate_merge_avail(self,n_ref_avail):
+		
+		#~ reduces the overall reliability of the reference profile depending on the number of ref days that
+		#~ it was possible to use.
+		#~ Every data point of the reference profile weights 1/n_data_points
+		#~ 1 is reduced by n_used_days/N_REF_DAYS, that is
+		#~ if all ref days are used, the reliability is not reduced
+		#~ if none has been used, reliability is reduced by 1/n_data_points
+		#~ (these are the extreme cases that actually never happen because of the conditions)
+		merge_avail_loss=((self.n_profiles-n_ref_avail)/float(self.n_profiles))/float(self.n_data_points)
+		self.merge_avail=float(numpy.subtract.reduce(numpy.concatenate(([self.merge_avail],merge_avail_loss))))
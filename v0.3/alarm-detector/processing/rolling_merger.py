@@ -0,0 +1,185 @@
+#   Copyright 2015 Adamo Ferro
+#
+#   This file is part of SLightliMon.
+#
+#   SLightliMon is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   SLightliMon is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy
+import processing.profile_merger
+
+
+def same_days(data_a,data_b):
+	#~ True if two sets of reference days are made of the same bytes. Equal values with different representations
+	#~ (e.g. 0 and -0) are seen as different, and only cause the state to be rebuilt
+	return data_a.shape==data_b.shape and buffer(numpy.ascontiguousarray(data_a))==buffer(numpy.ascontiguousarray(data_b))
+
+
+class rolling_merger(processing.profile_merger.profile_merger):
+	
+	#~ Merges the reference days as profile_merger does, keeping the available days of each data point sorted by power
+	#~ over squared voltage in a state that is given to the merger of the next run. Normalization multiplies the power of
+	#~ all the days of a data point by the square of the same actual voltage, so this is also the order of normalized power.
+	#~ When the next run uses the same days shifted by one (i.e., it analyzes the next night) the state is updated by
+	#~ removing the oldest day and inserting the new one, both found by binary search, instead of sorting all the days again.
+	#~ Data points whose power cannot be normalized (no actual voltage or zero reference voltage) are merged by profile_merger.
+	#~ The state is a dictionary of arrays: "p" and "v" are the reference days (one row per day, oldest first), "keys" the
+	#~ sorted power over squared voltage of each data point (NaN for not available days, kept at the end), "days" the
+	#~ reference day of each key, "n_avail" and "n_zero_v" the number of available days and of those with zero voltage.
+	#~ Each update still takes time proportional to the number of data points times the number of reference days N: the days
+	#~ given are compared with those of the state, the keys between the removed and the inserted day move by one row, and the
+	#~ state is saved again as a whole (see data_io.reference_state). This is deliberate: the N reference days are read by
+	#~ each run anyway, and keeping sorted arrays is what lets the state be saved and loaded as plain arrays. Only the sort of
+	#~ the days, log2(N) times longer, is saved, so that merging is faster than with profile_merger only with many reference
+	#~ days (from about 20 with 1440 data points), and slower with a few
+	
+	def __init__(self,data_p_list,data_v_list,data_v_norm=None,state=None):
+		processing.profile_merger.profile_merger.__init__(self,data_p_list,data_v_list,data_v_norm)
+		self.state=state
+		self.state_changed=False
+	
+	
+	def merge(self):
+		
+		if self.data_v_norm is None:
+			return processing.profile_merger.profile_merger.merge(self)
+		
+		self.update_state()
+		n_ref_avail=self.state["n_avail"]
+		
+		#~ select the middle available day, and normalize its power wrt the actual voltage
+		i_data=numpy.arange(self.n_data_points)
+		i_profile_middle=self.state["days"][numpy.minimum(n_ref_avail//2,self.n_profiles-1),i_data]
+		with numpy.errstate(divide='ignore',invalid='ignore'):
+			v_amp_factor=self.data_v_norm/self.data_v_list[i_profile_middle,i_data]
+			self.data_p_merged=self.data_p_list[i_profile_middle,i_data]*(v_amp_factor**2)
+		self.data_v_merged=self.data_v_norm.copy()
+		
+		#~ data points that cannot be normalized
+		not_norm=numpy.isnan(self.data_v_norm) | (self.state["n_zero_v"]>0)
+		if numpy.any(not_norm):
+			pm=processing.profile_merger.profile_merger(self.data_p_list[:,not_norm],self.data_v_list[:,not_norm],self.data_v_norm[not_norm])
+			pm.merge()
+			self.data_p_merged[not_norm]=pm.data_p_merged
+			self.data_v_merged[not_norm]=pm.data_v_merged
+		
+		#~ check if there is at least one point in the reference profile
+		self.data_p_merged[n_ref_avail==0]=numpy.nan
+		self.data_v_merged[n_ref_avail==0]=numpy.nan
+		
+		self.estimate_merge_avail(n_ref_avail)
+		
+		return self.data_p_merged, self.data_v_merged, self.merge_avail
+	
+	
+	def day_keys(self,data_p,data_v):
+		#~ power over squared voltage, NaN for not available days. Returns also the available days and those with zero voltage
+		avail=~(numpy.isnan(data_p) | numpy.isnan(data_v))
+		with numpy.errstate(divide='ignore',invalid='ignore'):
+			keys=data_p/(data_v*data_v)
+		keys[~avail]=numpy.nan
+		return keys,avail,avail & (data_v==0)
+	
+	
+	def update_state(self):
+		
+		if self.state is not None and self.state["p"].shape==self.data_p_list.shape:
+			
+			#~ days shifted by one
+			if same_days(self.state["p"][1:],self.data_p_list[:-1]) and same_days(self.state["v"][1:],self.data_v_list[:-1]):
+				if self.DEBUG:
+					print "Reference state:			shifted"
+				self.shift_state()
+				return
+			
+			#~ same days of the previous run
+			if same_days(self.state["p"],self.data_p_list) and same_days(self.state["v"],self.data_v_list):
+				if self.DEBUG:
+					print "Reference state:			unchanged"
+				return
+		
+		if self.DEBUG:
+			print "Reference state:			rebuilt"
+		
+		#~ not available days are sorted as NaN, at the end; ties keep the ref day order
+		keys,avail,zero_v=self.day_keys(self.data_p_list,self.data_v_list)
+		days=numpy.argsort(keys,axis=0,kind='mergesort').astype(numpy.int32)
+		self.state=self.new_state(keys[days,numpy.arange(self.n_data_points)],days,numpy.sum(avail,axis=0),numpy.sum(zero_v,axis=0))
+	
+	
+	def shift_state(self):
+		
+		keys=self.state["keys"]
+		i_data=numpy.arange(self.n_data_points)
+		i_rows=numpy.arange(self.n_profiles,dtype=numpy.int32)[:,numpy.newaxis]
+		
+		#~ the oldest day is the first one among the days with the same key, and the new one goes after them.
+		#~ The new day is placed among the keys left after removing the oldest one
+		old_keys,old_avail,old_zero_v=self.day_keys(self.state["p"][0],self.state["v"][0])
+		new_keys,new_avail,new_zero_v=self.day_keys(self.data_p_list[-1],self.data_v_list[-1])
+		i_old=self.bisect(keys,old_keys,self.n_profiles,False)
+		i_new=self.bisect(keys,new_keys,self.n_profiles-1,True,i_old)
+		
+		#~ keys after the new one move forward, keys after the old one move back: both moves are done with one gather
+		i_src=i_rows-(i_rows>i_new)
+		i_src+=(i_src>=i_old)
+		numpy.minimum(i_src,self.n_profiles-1,out=i_src)
+		i_src*=self.n_data_points
+		i_src+=i_data.astype(numpy.int32)
+		keys=numpy.take(keys,i_src)
+		days=numpy.take(self.state["days"],i_src)
+		days-=1
+		keys[i_new,i_data]=new_keys
+		days[i_new,i_data]=self.n_profiles-1
+		
+		self.state=self.new_state(keys,days,self.state["n_avail"]-old_avail+new_avail,self.state["n_zero_v"]-old_zero_v+new_zero_v)
+	
+	
+	def bisect(self,keys,values,n_keys,right,i_removed=None):
+		#~ for each data point, position of values among the first n_keys sorted keys, before (right=False) or after (right=True)
+		#~ the equal ones. NaN keys are greater than any value, NaN values go before (after) the NaN keys.
+		#~ If given, the keys at row i_removed are ignored. All the data points are searched at once, in log2(n_keys) steps
+		i_data=numpy.arange(len(values))
+		nan_values=numpy.isnan(values)
+		lo=numpy.zeros(len(values),dtype=numpy.int64)
+		hi=numpy.empty(len(values),dtype=numpy.int64)
+		hi.fill(n_keys)
+		searching=lo<hi
+		while numpy.any(searching):
+			mid=(lo+hi)//2
+			i_mid=mid
+			if i_removed is not None:
+				i_mid=mid+(mid>=i_removed)
+			mid_keys=keys[numpy.minimum(i_mid,len(keys)-1),i_data]
+			with numpy.errstate(invalid='ignore'):
+				if right:
+					after_mid=(mid_keys<=values) | nan_values
+				else:
+					after_mid=(mid_keys<values) | (nan_values & ~numpy.isnan(mid_keys))
+			lo=numpy.where(searching & after_mid,mid+1,lo)
+			hi=numpy.where(searching & ~after_mid,mid,hi)
+			searching=lo<hi
+		return lo
+	
+	
+	def new_state(self,keys,days,n_avail,n_zero_v):
+		self.state_changed=True
+		state=dict()
+		state["p"]=numpy.ascontiguousarray(self.data_p_list)
+		state["v"]=numpy.ascontiguousarray(self.data_v_list)
+		state["keys"]=keys
+		state["days"]=days
+		state["n_avail"]=n_avail
+		state["n_zero_v"]=n_zero_v
+		return state
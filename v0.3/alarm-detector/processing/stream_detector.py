@@ -0,0 +1,267 @@
+#   Copyright 2015 Adamo Ferro
+#
+#   This file is part of SLightliMon.
+#
+#   SLightliMon is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   SLightliMon is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+
+
+class stream_detector():
+	
+	#~ Online version of the profile analyzer and of the anomaly detector, for one phase: samples are given one at a time as
+	#~ they are acquired and alarms are returned as soon as they fire. Each sample takes constant time, and only the last
+	#~ few samples are kept (at most DELTA_T+1 for short gaps, AVG_INTERVAL for the moving average and ANOMALY_FILTER_DELTA_T+1
+	#~ for the guard interval after ON/OFF events, see below).
+	#~ The rules are those of the batch analysis, applied as far as the samples seen so far allow:
+	#~ - short NaN intervals (<= DELTA_T) are filled by linear interpolation when the following sample arrives, while ON/OFF
+	#~   events during longer gaps are inferred from the samples preceding and following them
+	#~ - the centred moving average of each point is known AVG_INTERVAL//2 samples later. Points whose window is not complete
+	#~   or contains NaN keep their value, as at the borders of data and long gaps in the batch analysis
+	#~ - a point is checked for anomalies ANOMALY_FILTER_DELTA_T samples later, when it is known whether it lies within
+	#~   an ON interval, guard intervals excluded
+	#~ - anomaly markers are grouped into events as by the anomaly detector. An event is reported when it reaches
+	#~   ANOMALY_MIN_DELTA_T markers and again when it ends, with its duration and maximum power shift. An event ends as soon as
+	#~   the DELTA_T points following its last marker have been checked, since no later marker can join it
+	#~ The batch analysis does not average the last point whose window ends just before a long gap (nor the first one whose
+	#~ window starts just after NaN values at the beginning of data), which is known to precede a long gap only DELTA_T+1
+	#~ samples later. The streaming detector averages it as any other point, so that switch events and anomaly markers next
+	#~ to long gaps may differ from those of the batch analysis
+
+	def __init__(self,ts_start,s_int,dt,avg_t,an_fdt,vm,vM,v_dt_max,poff):
+		self.TS_START=ts_start
+		self.SAMPLING_INT=s_int
+		self.DELTA_T=dt
+		self.AVG_INTERVAL=avg_t
+		self.ANOMALY_FILTER_DELTA_T=an_fdt
+		self.V_MIN=vm
+		self.V_MAX=vM
+		self.V_DT_MAX=v_dt_max
+		self.P_OFF_MAX=poff
+		
+		#~ reference profile, see set_reference
+		self.profile_p_ref_avg=None
+		self.ctrl_ref=None
+		
+		#~ gap filling: last available sample (index, power, voltage) and length of the NaN interval following it
+		self.n_samples=0
+		self.last_avail=None
+		self.n_gap_points=0
+		
+		#~ moving average: ring buffers of the last AVG_INTERVAL filled points, with the sums and the number of NaN values
+		#~ of the window. Sums are computed again once per round of the buffers, so that rounding errors do not accumulate
+		self.ring_p=[float("nan")]*self.AVG_INTERVAL
+		self.ring_v=[float("nan")]*self.AVG_INTERVAL
+		self.ring_markers=[None]*self.AVG_INTERVAL
+		self.n_filled=0
+		self.sum_p=0.
+		self.sum_v=0.
+		self.n_window_nan_p=self.AVG_INTERVAL
+		self.n_window_nan_v=self.AVG_INTERVAL
+		
+		#~ ON/OFF state (None until the first available point) and index of the last ON event, the state being ON
+		#~ since the beginning if no ON event has been seen yet
+		self.last_p_avg=float("nan")
+		self.state_on=None
+		self.on_start=-self.ANOMALY_FILTER_DELTA_T-1
+		
+		#~ voltage anomalies
+		self.n_high_v_points=0
+		self.n_low_v_points=0
+		self.v_alarm=False
+		
+		#~ averaged power of the points waiting for the anomaly check, and the anomaly events in progress
+		self.ring_p_avg=[float("nan")]*(self.ANOMALY_FILTER_DELTA_T+1)
+		self.anomaly_events={'on': None, 'off': None}
+		
+		self.DEBUG=False
+
+
+	def set_reference(self,profile_p_ref_avg,ctrl_ref,an_dp,an_dpr,an_dt):
+		#~ averaged power and ON/OFF state of the reference profile, as given by the profile analyzer, one value per data point
+		#~ from ts_start. Points beyond the reference profile are not checked for anomalies
+		self.profile_p_ref_avg=profile_p_ref_avg
+		self.ctrl_ref=ctrl_ref
+		self.ANOMALY_DELTA_P=an_dp
+		self.ANOMALY_DELTA_P_REL=an_dpr
+		self.ANOMALY_MIN_DELTA_T=an_dt
+
+
+	def timestamp(self,i_data):
+		return i_data*self.SAMPLING_INT*60+self.TS_START
+
+
+	def add(self,p,v):
+		#~ adds the next sample (NaN or None if not available) and returns the alarms fired, as a list of dictionaries
+		alarms=list()
+		p=float("nan") if p is None else float(p)
+		v=float("nan") if (v is None or math.isnan(p)) else float(v)
+		i_data=self.n_samples
+		self.n_samples+=1
+		
+		if math.isnan(p):
+			if self.last_avail is None:
+				self.add_filled(i_data,p,v,None,alarms)			# NaN values at the beginning are never filled
+			else:
+				self.n_gap_points+=1
+				if self.n_gap_points==self.DELTA_T+1:
+					for i_gap in xrange(i_data-self.DELTA_T,i_data+1):
+						self.add_filled(i_gap,p,v,None,alarms)
+				elif self.n_gap_points>self.DELTA_T+1:
+					self.add_filled(i_data,p,v,None,alarms)
+			return alarms
+		
+		marker=None
+		if self.n_gap_points>0:
+			i_last,p_last,v_last=self.last_avail
+			if self.n_gap_points<=self.DELTA_T:
+				#~ short gap, filled
+				for i_gap in xrange(1,self.n_gap_points+1):
+					weight=float(i_gap)/(self.n_gap_points+1)
+					self.add_filled(i_last+i_gap,p_last+(p-p_last)*weight,v_last+(v-v_last)*weight,None,alarms)
+			else:
+				#~ long gap: ON or OFF event happened during the gap, with half of the gap as precision
+				half_dt=(i_data-i_last)//2
+				if p_last<self.P_OFF_MAX and p>self.P_OFF_MAX:
+					marker=('on',i_last+half_dt,half_dt)
+				elif p_last>self.P_OFF_MAX and p<self.P_OFF_MAX:
+					marker=('off',i_last+half_dt,half_dt)
+			self.n_gap_points=0
+		
+		self.last_avail=(i_data,p,v)
+		self.add_filled(i_data,p,v,marker,alarms)
+		return alarms
+
+
+	def add_filled(self,i_data,p,v,marker,alarms):
+		#~ moving average: i_data completes the window of the point AVG_INTERVAL//2 samples before
+		i_ring=i_data%self.AVG_INTERVAL
+		old_p=self.ring_p[i_ring]
+		old_v=self.ring_v[i_ring]
+		self.n_window_nan_p+=int(math.isnan(p))-int(math.isnan(old_p))
+		self.n_window_nan_v+=int(math.isnan(v))-int(math.isnan(old_v))
+		self.sum_p+=(0. if math.isnan(p) else p)-(0. if math.isnan(old_p) else old_p)
+		self.sum_v+=(0. if math.isnan(v) else v)-(0. if math.isnan(old_v) else old_v)
+		self.ring_p[i_ring]=p
+		self.ring_v[i_ring]=v
+		self.ring_markers[i_ring]=marker
+		self.n_filled+=1
+		if i_ring==self.AVG_INTERVAL-1:
+			self.sum_p=sum(value for value in self.ring_p if not math.isnan(value))
+			self.sum_v=sum(value for value in self.ring_v if not math.isnan(value))
+		
+		i_center=i_data-self.AVG_INTERVAL//2
+		if i_center>=0:
+			self.add_averaged(i_center,self.n_filled>=self.AVG_INTERVAL,alarms)
+
+
+	def add_averaged(self,i_center,window_complete,alarms):
+		i_ring=i_center%self.AVG_INTERVAL
+		p_avg=self.ring_p[i_ring]
+		v_avg=self.ring_v[i_ring]
+		if window_complete and self.n_window_nan_p==0:
+			p_avg=self.sum_p/self.AVG_INTERVAL
+			v_avg=(self.sum_v/self.AVG_INTERVAL if self.n_window_nan_v==0 else float("nan"))
+		self.update_state(i_center,p_avg,v_avg,self.ring_markers[i_ring],alarms)
+
+
+	def finish(self):
+		#~ the stream is over: points still waiting for the following samples are completed as at the end of data
+		#~ in the batch analysis (gaps are not filled and the last points are not averaged), and anomaly events in progress
+		#~ are closed. Points within the guard interval from the end are not checked for anomalies. Returns the alarms fired
+		alarms=list()
+		if 0<self.n_gap_points<=self.DELTA_T:
+			for i_gap in xrange(self.n_samples-self.n_gap_points,self.n_samples):
+				self.add_filled(i_gap,float("nan"),float("nan"),None,alarms)
+		self.n_gap_points=0
+		
+		for i_center in xrange(max(self.n_samples-self.AVG_INTERVAL//2,0),self.n_samples):
+			self.add_averaged(i_center,False,alarms)
+		
+		for anomaly_type in ('on','off'):
+			self.close_anomaly_event(anomaly_type,alarms)
+		return alarms
+
+
+	def update_state(self,i_data,p_avg,v_avg,marker,alarms):
+		#~ ON/OFF events. Comparisons involving NaN are false, so points without data never generate events
+		if marker is not None:
+			self.switch(marker[0],marker[1],marker[2],alarms)
+		if self.last_p_avg<=self.P_OFF_MAX and p_avg>self.P_OFF_MAX:
+			self.switch('on',i_data,self.AVG_INTERVAL/2,alarms)
+		elif self.last_p_avg>self.P_OFF_MAX and p_avg<=self.P_OFF_MAX:
+			self.switch('off',i_data,self.AVG_INTERVAL/2,alarms)
+		if self.state_on is None and not math.isnan(p_avg):
+			self.state_on=p_avg>self.P_OFF_MAX
+		self.last_p_avg=p_avg
+		
+		#~ voltage is checked only where power is available. A missing voltage value is counted as low
+		if not math.isnan(p_avg):
+			if v_avg>self.V_MAX:
+				self.n_high_v_points+=1
+			if not v_avg>=self.V_MIN:
+				self.n_low_v_points+=1
+			if not self.v_alarm and self.n_high_v_points+self.n_low_v_points>self.V_DT_MAX:
+				self.v_alarm=True
+				alarms.append({"alarm":"v","t":self.timestamp(i_data),"high_dt":self.n_high_v_points,"low_dt":self.n_low_v_points})
+		
+		#~ the point ANOMALY_FILTER_DELTA_T samples before lies within an ON interval if the state has been ON since then,
+		#~ and the last ON event is at least ANOMALY_FILTER_DELTA_T+1 samples before it
+		i_ring=i_data%len(self.ring_p_avg)
+		self.ring_p_avg[i_ring]=p_avg
+		i_check=i_data-self.ANOMALY_FILTER_DELTA_T
+		if self.profile_p_ref_avg is not None and 0<=i_check<len(self.profile_p_ref_avg):
+			if self.state_on and i_check>=self.on_start+self.ANOMALY_FILTER_DELTA_T+1 and self.ctrl_ref[i_check]==1:
+				self.check_anomaly(i_check,self.ring_p_avg[(i_ring+1)%len(self.ring_p_avg)],alarms)
+		
+		#~ anomaly events whose last marker is DELTA_T points before the checked one cannot be joined by following markers
+		for anomaly_type in ('on','off'):
+			event=self.anomaly_events[anomaly_type]
+			if event is not None and i_check-event["last"]>=self.DELTA_T:
+				self.close_anomaly_event(anomaly_type,alarms)
+
+
+	def switch(self,switch_type,i_data,precision,alarms):
+		self.state_on=(switch_type=='on')
+		if self.state_on:
+			self.on_start=i_data
+		alarms.append({"alarm":"switch_"+switch_type,"t":self.timestamp(i_data),"precision":precision})
+
+
+	def check_anomaly(self,i_data,p_avg,alarms):
+		#~ same conditions of the anomaly detector: the power shift must exceed both the absolute and the relative thresholds
+		delta_p_ref=p_avg-self.profile_p_ref_avg[i_data]
+		for anomaly_type,delta_p in (('on',delta_p_ref),('off',-delta_p_ref)):
+			if delta_p>self.ANOMALY_DELTA_P and delta_p>p_avg*self.ANOMALY_DELTA_P_REL:
+				event=self.anomaly_events[anomaly_type]
+				if event is None:
+					event={"start":i_data,"last":i_data,"n_markers":0,"max_delta_p":delta_p}
+					self.anomaly_events[anomaly_type]=event
+				event["last"]=i_data
+				event["n_markers"]+=1
+				event["max_delta_p"]=max(event["max_delta_p"],delta_p)
+				if event["n_markers"]==self.ANOMALY_MIN_DELTA_T:
+					alarms.append(self.anomaly_alarm(anomaly_type,event,False))
+
+
+	def close_anomaly_event(self,anomaly_type,alarms):
+		event=self.anomaly_events[anomaly_type]
+		if event is not None and event["n_markers"]>=self.ANOMALY_MIN_DELTA_T:
+			alarms.append(self.anomaly_alarm(anomaly_type,event,True))
+		self.anomaly_events[anomaly_type]=None
+
+
+	def anomaly_alarm(self,anomaly_type,event,ended):
+		return {"alarm":"anomaly_"+anomaly_type,"t":self.timestamp(event["start"]),"dt":event["last"]-event["start"]+1,
+			"dp":float(math.floor(event["max_delta_p"])),"ended":ended}
@@ -0,0 +1,121 @@
+#   Copyright 2015 Adamo Ferro
+#
+#   This file is part of SLightliMon.
+#
+#   SLightliMon is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   SLightliMon is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
+
+
+import sys
+import json
+import calendar
+import datetime
+import collections
+import importlib
+import alarm_detector
+
+#~ the command line arguments are the same of the alarm detector, except for the period to be analyzed
+cli=importlib.import_module("slightlimon_alarm-detector")
+
+
+SECONDS_PER_DAY=24*60*60
+
+ERROR_CODES=dict()
+ERROR_CODES["dates"]="Start and/or end date not valid"
+ERROR_CODES["window"]="Nightly window not valid"
+ERROR_CODES["night"]="Unexpected error while analyzing night"
+
+
+def parse_time(time_string):
+	#~ seconds from midnight of a HH:MM time
+	hours,minutes=time_string.split(":")
+	hours=int(hours)
+	minutes=int(minutes)
+	if not (0<=hours<24 and 0<=minutes<60):
+		raise ValueError("time out of range: "+time_string)
+	return hours*3600+minutes*60
+
+
+def analyze_night(cfg,arrays):
+	#~ unexpected errors are returned as the night output, so that they don't stop the analysis of the other nights
+	try:
+		return alarm_detector.run(cfg,arrays=arrays)
+	except Exception as e:
+		return {"errors":[ERROR_CODES["night"]+": "+str(e)],"warnings":[]}
+
+
+def main(argv):
+
+	def parse_args():
+		parser=cli.create_parser(description='SLightliMon ALARM DETECTOR BACKFILL - Runs the alarm detector for every night of a date range, reading input data only once. Gives the same results of one run of the alarm detector per night.',period=False)
+		parser.add_argument('-sd','--start_date',required=True,type=str,help='date of the first night, as YYYY-MM-DD (UTC)')
+		parser.add_argument('-ed','--end_date',required=True,type=str,help='date of the last night, as YYYY-MM-DD (UTC)')
+		parser.add_argument('-ws','--window_start',required=True,type=str,help='start time of the nightly window, as HH:MM (UTC)')
+		parser.add_argument('-we','--window_end',required=True,type=str,help='end time of the nightly window, as HH:MM (UTC), with the same meaning of the alarm detector end timestamp. If not later than the start time, the window ends on the next day.')
+
+		args=None
+		try:
+			args=parser.parse_args(argv[1:])
+		except:
+			pass
+
+		return args
+
+
+	output_json=collections.OrderedDict()
+	output_json["errors"]=list()
+	output_json["nights"]=collections.OrderedDict()
+
+	args=parse_args()
+	if args is None:
+		output_json["errors"].append(alarm_detector.ERROR_CODES["arg_parse"])
+	else:
+		try:
+			start_date=datetime.datetime.strptime(args.start_date,"%Y-%m-%d").date()
+			end_date=datetime.datetime.strptime(args.end_date,"%Y-%m-%d").date()
+			if end_date<start_date:
+				raise ValueError("end date precedes start date")
+		except ValueError:
+			output_json["errors"].append(ERROR_CODES["dates"])
+		try:
+			window_start=parse_time(args.window_start)
+			window_end=parse_time(args.window_end)
+			if window_end<=window_start:
+				window_end+=SECONDS_PER_DAY
+		except ValueError:
+			output_json["errors"].append(ERROR_CODES["window"])
+
+
+	if len(output_json["errors"])==0:
+
+		#~ the first night gives the period to be analyzed, and the following nights are one day apart
+		options=vars(args)
+		for name in ("start_date","end_date","window_start","window_end"):
+			del options[name]
+		ts_midnight=calendar.timegm(start_date.timetuple())
+		options["t_start"]=ts_midnight+window_start
+		options["t_end"]=ts_midnight+window_end
+		n_nights=(end_date-start_date).days+1
+
+		#~ each channel is read once for all the nights (see alarm_detector.backfill_nights)
+		nights=alarm_detector.backfill_nights(alarm_detector.config(**options),n_nights)
+		for i_night,(night_cfg,arrays) in enumerate(nights):
+			output_json["nights"][str(start_date+datetime.timedelta(days=i_night))]=analyze_night(night_cfg,arrays)
+
+	print json.dumps(output_json)
+
+
+
+
+if __name__ == "__main__":
+	main(sys.argv)
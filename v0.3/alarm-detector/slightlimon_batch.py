@@ -0,0 +1,120 @@
+#   Copyright 2015 Adamo Ferro
+#
+#   This file is part of SLightliMon.
+#
+#   SLightliMon is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   SLightliMon is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
+
+
+import sys, argparse
+import json
+import collections
+import multiprocessing
+import alarm_detector
+
+
+ERROR_CODES=dict()
+ERROR_CODES["manifest"]="Cannot read manifest"
+ERROR_CODES["workers"]="Number of workers not valid"
+ERROR_CODES["cabinet"]="Unexpected error while analyzing cabinet"
+
+
+def analyze_cabinet(cabinet):
+	#~ runs the alarm detector for one cabinet, whose options are given with the long names of the alarm detector arguments
+	#~ (e.g. "power_data_ph1"). Unexpected errors are returned as the cabinet output, so that they don't stop the analysis
+	#~ of the other cabinets
+	cabinet_id,options=cabinet
+	try:
+		try:
+			cfg=alarm_detector.config(**options)
+		except (TypeError,ValueError):
+			output_json=dict()
+			output_json["errors"]=[alarm_detector.ERROR_CODES["arg_parse"]]
+			output_json["warnings"]=list()
+			return cabinet_id,output_json
+		return cabinet_id,alarm_detector.run(cfg)
+	except Exception as e:
+		return cabinet_id,{"errors":[ERROR_CODES["cabinet"]+": "+str(e)],"warnings":[]}
+
+
+def main(argv):
+
+	def parse_args():
+		parser=argparse.ArgumentParser(description='SLightliMon ALARM DETECTOR BATCH - Runs the alarm detector for all the power cabinets listed in a manifest file, in parallel.')
+		parser.add_argument('manifest',type=str,help='JSON manifest file. "cabinets" maps each cabinet id to its options, "defaults" (optional) gives the options shared by all cabinets. Options use the long names of the alarm detector arguments, e.g. {"defaults": {"text": true, "ref_days": 7}, "cabinets": {"cab01": {"power_data_ph1": "p1.txt", "voltage_data_ph1": "v1.txt", "poff_ph1": 150}}}.')
+		parser.add_argument('-ts','--t_start',type=int,help='start UNIX epoch timestamp [seconds]. Overrides the manifest.')
+		parser.add_argument('-te','--t_end',type=int,help='end UNIX epoch timestamp [seconds]. Overrides the manifest.')
+		parser.add_argument('-w','--workers',type=int,help='number of worker processes. Default is the number of CPUs.',default=multiprocessing.cpu_count())
+		parser.add_argument('-v','--version',action='version',version='%(prog)s 0.3')
+
+		args=None
+		try:
+			args=parser.parse_args(argv[1:])
+		except:
+			pass
+
+		return args
+
+
+	output_json=collections.OrderedDict()
+	output_json["errors"]=list()
+	output_json["cabinets"]=collections.OrderedDict()
+
+	args=parse_args()
+	cabinets=list()
+
+	if args is not None:
+		try:
+			manifest=json.load(open(args.manifest),object_pairs_hook=collections.OrderedDict)
+			defaults=manifest.get("defaults",dict())
+			for cabinet_id,cabinet_options in manifest["cabinets"].iteritems():
+				options=collections.OrderedDict(defaults)
+				options.update(cabinet_options)
+				if args.t_start is not None:
+					options["t_start"]=args.t_start
+				if args.t_end is not None:
+					options["t_end"]=args.t_end
+				cabinets.append((cabinet_id,dict(options)))
+		except:
+			output_json["errors"].append(ERROR_CODES["manifest"])
+
+		if args.workers<=0:
+			output_json["errors"].append(ERROR_CODES["workers"])
+	else:
+		output_json["errors"].append(alarm_detector.ERROR_CODES["arg_parse"])
+
+
+	if len(output_json["errors"])==0:
+
+		#~ cabinets are independent: each one is analyzed exactly as by a separate run of the alarm detector
+		if args.workers==1 or len(cabinets)<=1:
+			results=dict(map(analyze_cabinet,cabinets))
+		else:
+			pool=multiprocessing.Pool(min(args.workers,len(cabinets)))
+			try:
+				results=dict(pool.imap_unordered(analyze_cabinet,cabinets))
+			finally:
+				pool.close()
+				pool.join()
+
+		#~ results are given in manifest order
+		for cabinet_id,_ in cabinets:
+			output_json["cabinets"][cabinet_id]=results[cabinet_id]
+
+	print json.dumps(output_json)
+
+
+
+
+if __name__ == "__main__":
+	main(sys.argv)
@@ -0,0 +1,187 @@
+#   Copyright 2015 Adamo Ferro
+#
+#   This file is part of SLightliMon.
+#
+#   SLightliMon is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   SLightliMon is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
+
+
+import sys, os, argparse
+import json
+import signal
+import SocketServer
+import BaseHTTPServer
+import multiprocessing.pool
+import alarm_detector
+import data_io.reader_cache
+
+
+ERROR_CODES=dict()
+ERROR_CODES["request"]="Request not valid: a JSON object with the alarm detector parameters is expected"
+ERROR_CODES["address"]="Either a Unix socket or a port must be given"
+ERROR_CODES["workers"]="Number of workers not valid"
+ERROR_CODES["analysis"]="Unexpected error during analysis"
+
+
+class request_handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+	#~ Each POST request carries a JSON object with the alarm detector parameters, named as its long command line arguments
+	#~ (e.g. {"t_start": 1420070400, "t_end": 1420156740, "power_data_ph1": "p1.rrd", "voltage_data_ph1": "v1.rrd"}),
+	#~ and is answered with the alarm detector output
+
+	def do_POST(self):
+		status=200
+		try:
+			length=int(self.headers.getheader("content-length",0))
+			parameters=json.loads(self.rfile.read(length))
+			if not isinstance(parameters,dict):
+				raise ValueError("not an object")
+		except ValueError:
+			status=400
+			output_json={"errors":[ERROR_CODES["request"]],"warnings":[]}
+		else:
+			output_json=self.server.analyze(parameters)
+
+		answer=json.dumps(output_json)
+		self.send_response(status)
+		self.send_header("Content-Type","application/json")
+		self.send_header("Content-Length",str(len(answer)))
+		self.end_headers()
+		self.wfile.write(answer)
+
+
+	def log_message(self,format,*args):
+		if self.server.DEBUG:
+			#~ Unix socket clients have no address
+			client="-"
+			if isinstance(self.client_address,tuple):
+				client=self.client_address[0]
+			sys.stderr.write("%s - [%s] %s\n" %(client,self.log_date_time_string(),format%args))
+
+
+class detector_server():
+
+	#~ Requests are handled by a bounded pool of threads, sharing the cache of the data read by previous requests.
+	#~ Used as a mixin of a socket server
+
+	def init_detector(self,n_workers,cache_bytes):
+		self.pool=multiprocessing.pool.ThreadPool(n_workers)
+		self.cache=data_io.reader_cache.reader_cache(cache_bytes)
+		self.DEBUG=False
+
+
+	def process_request(self,request,client_address):
+		self.pool.apply_async(self.process_request_thread,(request,client_address))
+
+
+	def process_request_thread(self,request,client_address):
+		try:
+			self.finish_request(request,client_address)
+		except:
+			self.handle_error(request,client_address)
+		finally:
+			self.shutdown_request(request)
+
+
+	def analyze(self,parameters):
+		try:
+			try:
+				cfg=alarm_detector.config(**parameters)
+			except (TypeError,ValueError):
+				output_json=dict()
+				output_json["errors"]=[alarm_detector.ERROR_CODES["arg_parse"]]
+				output_json["warnings"]=list()
+				return output_json
+			return alarm_detector.run(cfg,cache=self.cache)
+		except Exception as e:
+			return {"errors":[ERROR_CODES["analysis"]+": "+str(e)],"warnings":[]}
+
+
+	def server_close(self):
+		self.pool.close()
+		self.pool.join()
+
+
+class tcp_server(detector_server,BaseHTTPServer.HTTPServer):
+	allow_reuse_address=True
+
+	def server_close(self):
+		BaseHTTPServer.HTTPServer.server_close(self)
+		detector_server.server_close(self)
+
+
+class unix_server(detector_server,SocketServer.UnixStreamServer):
+
+	def server_close(self):
+		SocketServer.UnixStreamServer.server_close(self)
+		detector_server.server_close(self)
+		os.remove(self.server_address)
+
+
+def main(argv):
+
+	def parse_args():
+		parser=argparse.ArgumentParser(description='SLightliMon ALARM DETECTOR SERVER - Answers alarm detector requests sent over HTTP, keeping recently read data in memory.')
+		parser.add_argument('-s','--socket',type=str,default='',help='Unix socket to listen on.')
+		parser.add_argument('-p','--port',type=int,default=0,help='local TCP port to listen on, if no Unix socket is given.')
+		parser.add_argument('-w','--workers',type=int,help='maximum number of requests analyzed at the same time. Default is the number of CPUs.',default=multiprocessing.cpu_count())
+		parser.add_argument('-cs','--cache_size',type=int,help='maximum size of the data kept in memory [MB]. Default is 256.',default='256')
+		parser.add_argument('-d','--debug',dest='debug',action='store_true',help='debug mode.')
+		parser.add_argument('-v','--version',action='version',version='%(prog)s 0.3')
+		parser.set_defaults(debug=False)
+
+		args=None
+		try:
+			args=parser.parse_args(argv[1:])
+		except:
+			pass
+
+		return args
+
+
+	errors=list()
+	args=parse_args()
+	if args is None:
+		errors.append(alarm_detector.ERROR_CODES["arg_parse"])
+	else:
+		if (args.socket=="")==(args.port==0):
+			errors.append(ERROR_CODES["address"])
+		if args.workers<=0:
+			errors.append(ERROR_CODES["workers"])
+
+	if len(errors)>0:
+		print json.dumps({"errors":errors})
+		return
+
+	if args.socket!="":
+		server=unix_server(args.socket,request_handler)
+	else:
+		server=tcp_server(("127.0.0.1",args.port),request_handler)
+	server.init_detector(args.workers,args.cache_size*1024*1024)
+	server.DEBUG=args.debug
+
+	#~ on termination the server is closed as on interruption
+	signal.signal(signal.SIGTERM,lambda signum,frame: sys.exit(0))
+
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+
+
+
+
+if __name__ == "__main__":
+	main(sys.argv)
@@ -0,0 +1,163 @@
+#   Copyright 2015 Adamo Ferro
+#
+#   This file is part of SLightliMon.
+#
+#   SLightliMon is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   SLightliMon is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
+
+
+import sys
+import json
+import importlib
+import alarm_detector
+import processing.stream_detector
+
+#~ the command line arguments are the same of the alarm detector: input files are used only to read the reference days
+cli=importlib.import_module("slightlimon_alarm-detector")
+
+
+ERROR_CODES=dict()
+ERROR_CODES["sample"]="Sample not valid, ignored: line "
+
+WARNING_CODES=dict()
+WARNING_CODES["ref_avail"]="Low reference availability, anomalies not detected for phase "
+
+
+def check_parameters(cfg):
+	#~ checks the parameters used by the streaming detector as the alarm detector does, making the average interval odd.
+	#~ Returns the lists of errors and warnings
+	errors=list()
+	warnings=list()
+	for name in cfg.missing():
+		errors.append(alarm_detector.ERROR_CODES["config_missing"]+name)
+	if len(errors)>0:
+		return errors,warnings
+	
+	if cfg.t_end<=cfg.t_start:
+		errors.append(alarm_detector.ERROR_CODES["period_general"])
+	if cfg.delta_t<=0:
+		errors.append(alarm_detector.ERROR_CODES["delta_t"])
+	if cfg.avg_t<=0:
+		errors.append(alarm_detector.ERROR_CODES["avg_t"])
+	elif cfg.avg_t%2==0:
+		cfg.avg_t+=1
+		warnings.append(alarm_detector.WARNING_CODES["avg_t"])
+	for i_phase,p_off_max in enumerate((cfg.poff_ph1,cfg.poff_ph2,cfg.poff_ph3)):
+		if p_off_max<=0:
+			errors.append(alarm_detector.ERROR_CODES["p_off"]+str(i_phase+1))
+	if cfg.v_min>=cfg.v_max or cfg.v_min<=0 or cfg.v_max<=0:
+		errors.append(alarm_detector.ERROR_CODES["v_thrs"])
+	if cfg.v_dt<=0:
+		errors.append(alarm_detector.ERROR_CODES["v_dt"])
+	if cfg.ref_days<0:
+		errors.append(alarm_detector.ERROR_CODES["ref_days"])
+	for name in ("anomaly_abs_p_shift","anomaly_rel_p_shift","anomaly_min_dt","anomaly_guard_dt","ref_min_avail"):
+		if getattr(cfg,name)<=0:
+			errors.append(alarm_detector.ERROR_CODES[name])
+	return errors,warnings
+
+
+def write(output_json):
+	#~ each output object is a line, written as soon as it is available
+	sys.stdout.write(json.dumps(output_json)+"\n")
+	sys.stdout.flush()
+
+
+def main(argv):
+
+	def parse_args():
+		parser=cli.create_parser(description='SLightliMon STREAM DETECTOR - Detects switch on/off events, voltage alarms and power anomalies while data are acquired. Samples are read from the standard input, one per line as "timestamp p1 v1" or "timestamp p1 v1 p2 v2 p3 v3" (timestamps in seconds, "nan" for no data), and alarms are written to the standard output as soon as they fire, one JSON object per line. Reference days are read from the input files.')
+
+		args=None
+		try:
+			args=parser.parse_args(argv[1:])
+		except:
+			pass
+
+		return args
+
+
+	args=parse_args()
+	if args is None:
+		write({"errors":[alarm_detector.ERROR_CODES["arg_parse"]],"warnings":[]})
+		return
+	
+	cfg=alarm_detector.config(**vars(args))
+	errors,warnings=check_parameters(cfg)
+	
+	#~ the reference profile of each phase is computed once, before the first sample
+	n_phases=(3 if "" not in (cfg.power_data_ph2,cfg.power_data_ph3,cfg.voltage_data_ph2,cfg.voltage_data_ph3) else 1)
+	profiles=None
+	if len(errors)==0 and cfg.ref_days>0:
+		profiles,reference_errors=alarm_detector.reference_profiles(cfg)
+		errors.extend(reference_errors)
+	
+	write({"errors":errors,"warnings":warnings})
+	if len(errors)>0:
+		return
+	
+	detectors=list()
+	for i_phase,p_off_max in enumerate((cfg.poff_ph1,cfg.poff_ph2,cfg.poff_ph3)[:n_phases]):
+		sd=processing.stream_detector.stream_detector(cfg.t_start,alarm_detector.SAMPLING_INT,cfg.delta_t,cfg.avg_t,cfg.anomaly_guard_dt,
+			cfg.v_min,cfg.v_max,cfg.v_dt*60,p_off_max)
+		sd.DEBUG=cfg.debug
+		if profiles is not None:
+			if profiles[i_phase]["p_avg"] is not None:
+				sd.set_reference(profiles[i_phase]["p_avg"],profiles[i_phase]["ctrl"],cfg.anomaly_abs_p_shift,cfg.anomaly_rel_p_shift/100.,cfg.anomaly_min_dt)
+			else:
+				write({"errors":[],"warnings":[WARNING_CODES["ref_avail"]+str(i_phase+1)]})
+		detectors.append(sd)
+	
+	def write_alarms(i_phase,alarms):
+		for alarm in alarms:
+			alarm["phase"]=i_phase+1
+			write(alarm)
+	
+	#~ samples are indexed by their data point in the analyzed period: missing samples are given as no data, while samples
+	#~ out of order, repeated or preceding the period are ignored. The stream ends with the period
+	n_data_points=int((cfg.t_end-cfg.t_start)/60/alarm_detector.SAMPLING_INT)+1
+	n_samples=0
+	i_line=0
+	for line in iter(sys.stdin.readline,""):
+		i_line+=1
+		fields=line.split()
+		try:
+			if len(fields)!=1+2*n_phases:
+				raise ValueError("wrong number of values")
+			ts=int(fields[0])
+			values=[float(field) for field in fields[1:]]
+		except ValueError:
+			write({"errors":[ERROR_CODES["sample"]+str(i_line)],"warnings":[]})
+			continue
+		
+		i_data=(ts-cfg.t_start)//(60*alarm_detector.SAMPLING_INT)
+		if i_data<n_samples:
+			continue
+		for i_sample in xrange(n_samples,min(i_data+1,n_data_points)):
+			for i_phase,sd in enumerate(detectors):
+				if i_sample==i_data:
+					write_alarms(i_phase,sd.add(values[2*i_phase],values[2*i_phase+1]))
+				else:
+					write_alarms(i_phase,sd.add(None,None))
+		n_samples=min(i_data+1,n_data_points)
+		if n_samples==n_data_points:
+			break
+	
+	for i_phase,sd in enumerate(detectors):
+		write_alarms(i_phase,sd.finish())
+
+
+
+
+if __name__ == "__main__":
+	main(sys.argv)
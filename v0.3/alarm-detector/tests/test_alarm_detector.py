@@ -0,0 +1,78 @@
+#   Copyright 2015 Adamo Ferro
+#
+#   This file is part of SLightliMon.
+#
+#   SLightliMon is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   SLightliMon is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
+
+
+import sys, os
+import unittest
+import numpy
+
+#~ the alarm detector modules are in the parent directory
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import alarm_detector
+
+
+class cosphi_test(unittest.TestCase):
+
+	TS_START=1420070400
+	N_DATA_POINTS=12*60
+
+	def setUp(self):
+		#~ lamps ON from the second to the eleventh hour, with low cosphi in the first hours
+		t=numpy.arange(self.N_DATA_POINTS)
+		self.p=numpy.where((t>60) & (t<self.N_DATA_POINTS-60),1000.,0.)
+		self.v=numpy.empty(self.N_DATA_POINTS)
+		self.v.fill(230.)
+		self.c=numpy.where(t<300,0.5,0.95)
+		self.no_data=numpy.empty(self.N_DATA_POINTS)
+		self.no_data.fill(numpy.nan)
+		self.cfg=alarm_detector.config(t_start=self.TS_START,t_end=self.TS_START+(self.N_DATA_POINTS-1)*60,
+			power_data_ph1="P1",voltage_data_ph1="V1",power_data_ph2="P2",voltage_data_ph2="V2",
+			power_data_ph3="P3",voltage_data_ph3="V3",cosphi_data="C",no_one_read_meas=True,delta_t=1,avg_t=1)
+
+
+	def run_phases(self,phases):
+		arrays={"C":(self.c,None)}
+		for i_phase in xrange(1,4):
+			if i_phase in phases:
+				arrays["P%d" %i_phase]=(self.p,None)
+				arrays["V%d" %i_phase]=(self.v,None)
+			else:
+				arrays["P%d" %i_phase]=(self.no_data,None)
+				arrays["V%d" %i_phase]=(self.no_data,None)
+		output=alarm_detector.run(self.cfg,arrays=arrays)
+		self.assertEqual(output["errors"],[])
+		return output["results"]
+
+
+	def test_all_phases(self):
+		results=self.run_phases((1,2,3))
+		self.assertEqual(results["cosphi"]["alarm"],1)
+		self.assertEqual(results["cosphi"]["low_avg"],0.5)
+
+
+	def test_phase_with_low_availability(self):
+		#~ with phases read separately, a phase not analyzed for its low availability has no ON periods,
+		#~ and so neither has their intersection
+		results=self.run_phases((1,3))
+		self.assertEqual(results["phases"][1]["availability"],0.)
+		self.assertEqual(results["cosphi"]["low_dt"],0)
+		self.assertEqual(results["cosphi"]["alarm"],0)
+
+
+if __name__=="__main__":
+	unittest.main()
@@ -0,0 +1,64 @@
+#   Copyright 2015 Adamo Ferro
+#
+#   This file is part of SLightliMon.
+#
+#   SLightliMon is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   SLightliMon is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
+
+
+import sys, os
+import unittest
+import numpy
+
+#~ the alarm detector modules are in the parent directory
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import alarm_detector
+import processing.profile_analyzer
+
+
+class moving_average_test(unittest.TestCase):
+
+	AVG_INTERVAL=5
+
+	def average(self,data):
+		pa=processing.profile_analyzer.profile_analyzer(1420070400,1,5,self.AVG_INTERVAL,0,210.,250.)
+		data_avg=numpy.zeros(len(data))
+		with numpy.errstate(all='raise'):
+			pa.moving_average(data,data_avg,self.AVG_INTERVAL//2,len(data)-self.AVG_INTERVAL//2)
+		return data_avg[self.AVG_INTERVAL//2:len(data)-self.AVG_INTERVAL//2]
+
+
+	def window_sums(self,data):
+		#~ averages as plain sums of each window
+		with numpy.errstate(invalid='ignore'):
+			return numpy.array([sum(data[i_data:i_data+self.AVG_INTERVAL])/self.AVG_INTERVAL
+				for i_data in xrange(0,len(data)-self.AVG_INTERVAL+1)])
+
+
+	def test_non_finite_values(self):
+		#~ non-finite values only affect the windows holding them
+		data=numpy.arange(40,dtype=numpy.float64)
+		data[5]=numpy.nan
+		data[15]=numpy.inf
+		data[25]=-numpy.inf
+		data[33]=numpy.inf
+		data[35]=-numpy.inf
+		data_avg=self.average(data)
+		numpy.testing.assert_allclose(data_avg,self.window_sums(data))
+		self.assertEqual(numpy.isnan(data_avg).sum(),5+3)
+		self.assertTrue(numpy.isfinite(data_avg[16:21]).all())
+
+
+if __name__=="__main__":
+	unittest.main()
@@ -0,0 +1,118 @@
+#   Copyright 2015 Adamo Ferro
+#
+#   This file is part of SLightliMon.
+#
+#   SLightliMon is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   SLightliMon is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
+
+
+import sys, os
+import unittest
+import numpy
+
+#~ the alarm detector modules are in the parent directory
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import alarm_detector
+import processing.profile_analyzer
+import processing.anomaly_detector
+import processing.stream_detector
+
+
+class stream_detector_test(unittest.TestCase):
+
+	TS_START=1420070400
+	N_DATA_POINTS=600
+	DELTA_T=5
+	AVG_INTERVAL=5
+	GUARD_DT=10
+	P_OFF_MAX=100
+	ANOMALY_DELTA_P=200
+	ANOMALY_DELTA_P_REL=0.02
+
+	def setUp(self):
+		#~ lamps ON after the first half hour, with the reference always ON at 1000 W
+		self.p=numpy.empty(self.N_DATA_POINTS)
+		self.p.fill(1000.)
+		self.p[:30]=0.
+		self.v=numpy.empty(self.N_DATA_POINTS)
+		self.v.fill(230.)
+		self.p_ref=numpy.empty(self.N_DATA_POINTS)
+		self.p_ref.fill(1000.)
+		self.ctrl_ref=numpy.ones(self.N_DATA_POINTS,dtype=int)
+
+
+	def batch_anomalies(self,anomaly_min_dt):
+		pa=processing.profile_analyzer.profile_analyzer(self.TS_START,1,self.DELTA_T,self.AVG_INTERVAL,self.GUARD_DT,210.,250.)
+		pa.set_data(self.p,self.v,self.P_OFF_MAX,False)
+		pa.estimate_availability()
+		p_avg,switch_markers,ctrl,n_high_v_points,n_low_v_points=pa.analyze_profile()
+		ad=processing.anomaly_detector.anomaly_detector(self.TS_START,1,self.DELTA_T,self.ANOMALY_DELTA_P,self.ANOMALY_DELTA_P_REL,
+			anomaly_min_dt)
+		ad.set_data(p_avg,ctrl,self.p_ref,self.ctrl_ref)
+		return ad.detect()
+
+
+	def stream_alarms(self,anomaly_min_dt):
+		#~ alarms of the stream, each with the index of the sample after which it fired (N_DATA_POINTS for finish)
+		sd=processing.stream_detector.stream_detector(self.TS_START,1,self.DELTA_T,self.AVG_INTERVAL,self.GUARD_DT,210.,250.,
+			180,self.P_OFF_MAX)
+		sd.set_reference(self.p_ref,self.ctrl_ref,self.ANOMALY_DELTA_P,self.ANOMALY_DELTA_P_REL,anomaly_min_dt)
+		alarms=list()
+		for i_data in xrange(0,self.N_DATA_POINTS):
+			alarms.extend((i_data,alarm) for alarm in sd.add(self.p[i_data],self.v[i_data]))
+		alarms.extend((self.N_DATA_POINTS,alarm) for alarm in sd.finish())
+		return alarms
+
+
+	def ended_anomalies(self,alarms,anomaly_type):
+		ended=[alarm for i_data,alarm in alarms if alarm["alarm"]=="anomaly_"+anomaly_type and alarm["ended"]]
+		return {'t': [alarm["t"] for alarm in ended],'dt': [alarm["dt"] for alarm in ended],'dp': [alarm["dp"] for alarm in ended]}
+
+
+	def test_anomaly_end(self):
+		#~ the averaged power exceeds the reference by more than 200 W from point 200 to point 219
+		self.p[200:220]=1500.
+		alarms=self.stream_alarms(7)
+		batch=self.batch_anomalies(7)
+		self.assertEqual(self.ended_anomalies(alarms,'on'),batch['on'])
+		self.assertEqual(self.ended_anomalies(alarms,'off'),batch['off'])
+		self.assertEqual(batch['on']['t'],[self.TS_START+200*60])
+		
+		#~ the event ends when the DELTA_T points after its last marker have been checked, that is GUARD_DT samples later,
+		#~ and their average AVG_INTERVAL//2 samples later still
+		i_ended=[i_data for i_data,alarm in alarms if alarm["alarm"]=="anomaly_on" and alarm["ended"]]
+		self.assertEqual(i_ended,[219+self.DELTA_T+self.GUARD_DT+self.AVG_INTERVAL//2])
+
+
+	def test_long_gap(self):
+		#~ the batch analysis keeps the value of the last point whose window ends just before a long gap, whereas the streaming
+		#~ detector averages it: a spike there is an anomaly for the batch analysis only
+		self.p[300:320]=numpy.nan
+		self.v[300:320]=numpy.nan
+		self.p[297]=1800.
+		alarms=self.stream_alarms(1)
+		batch=self.batch_anomalies(1)
+		self.assertEqual(batch['on'],{'t': [self.TS_START+297*60],'dt': [1],'dp': [800.]})
+		self.assertEqual(self.ended_anomalies(alarms,'on'),{'t': [],'dt': [],'dp': []})
+		
+		#~ the points after the gap are the same
+		self.p[340:350]=1500.
+		alarms=self.stream_alarms(1)
+		batch=self.batch_anomalies(1)
+		self.assertEqual(self.ended_anomalies(alarms,'on')['t'],batch['on']['t'][1:])
+		self.assertEqual(self.ended_anomalies(alarms,'on')['dt'],batch['on']['dt'][1:])
+
+
+if __name__=="__main__":
+	unittest.main()
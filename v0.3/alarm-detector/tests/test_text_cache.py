@@ -0,0 +1,76 @@
+#   Copyright 2015 Adamo Ferro
+#
+#   This file is part of SLightliMon.
+#
+#   SLightliMon is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   SLightliMon is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with SLightliMon. If not, see <http://www.gnu.org/licenses/>.
+
+
+import sys, os
+import shutil
+import tempfile
+import unittest
+import numpy
+
+#~ the alarm detector modules are in the parent directory
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_io.data_reader_txt
+import data_io.text_cache
+
+
+class text_cache_test(unittest.TestCase):
+
+	VALUES=(4.759292541837827,0.1,123.456789012345,float("nan"),2e-310)
+
+	def setUp(self):
+		self.directory=tempfile.mkdtemp()
+		self.filename=os.path.join(self.directory,"data.txt")
+		with open(self.filename,'w') as text_file:
+			text_file.write("".join(repr(value)+"\n" for value in self.VALUES))
+
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+
+	def read(self,dtype):
+		errors=list()
+		dr=data_io.data_reader_txt.data_reader(filename=self.filename,ts_start=0,ts_end=60*(len(self.VALUES)-1),s_int=1,
+			err=errors,dtype=dtype)
+		dr.read("")
+		self.assertEqual(errors,[])
+		return dr.data
+
+
+	def test_float32_then_float64(self):
+		#~ a single precision run must not leave rounded values in the cache for the following double precision runs
+		data=self.read(numpy.float32)
+		self.assertEqual(data.dtype,numpy.float32)
+		self.assertTrue(os.path.exists(self.filename+data_io.text_cache.text_cache.SUFFIX))
+
+		data=self.read(numpy.float64)
+		self.assertEqual(data.dtype,numpy.float64)
+		numpy.testing.assert_array_equal(data,numpy.array(self.VALUES,dtype=numpy.float64))
+
+
+	def test_cached_float32(self):
+		#~ single precision values taken from the cache are the same as those converted from the text
+		converted=self.read(numpy.float32)
+		cached=self.read(numpy.float32)
+		numpy.testing.assert_array_equal(cached,converted)
+		numpy.testing.assert_array_equal(cached,numpy.array(self.VALUES,dtype=numpy.float32))
+
+
+if __name__=="__main__":
+	unittest.main()